@@ -1,5 +1,10 @@
+import abc
 import asyncio
+import os
+import select
+import struct
 import subprocess
+import threading
 from typing import Optional
 import time
 
@@ -9,25 +14,475 @@ from av import AudioFrame
 import av
 from fractions import Fraction
 
-class FFmpegAlsaTrack(MediaStreamTrack):
-    kind = "audio"
+import metrics
+import startup
+from drift import stretch
+from dsp import deinterleave
 
-    def __init__(self, device: str, sample_rate: int = 16000, channels: int = 1):
-        super().__init__()
+
+class SampleRing:
+    """
+    Preallocated int16 ring buffer shared by one writer thread and one reader.
+
+    Positions are monotonically increasing byte counters, so no lock is needed:
+    the writer only ever advances ``write_pos`` and the reader only ever
+    advances ``read_pos``. When the writer laps the reader the oldest audio is
+    dropped (overrun) and the reader re-syncs to the newest ``capacity`` bytes.
+    The slot the writer has handed out but not yet committed counts as
+    written, since its bytes may already be overwritten.
+    """
+
+    def __init__(self, capacity_samples: int, bytes_per_sample: int = 2):
+        self.bytes_per_sample = bytes_per_sample
+        self.capacity = capacity_samples * bytes_per_sample
+        self.samples = np.zeros(capacity_samples, dtype=np.int16)
+        self._bytes = memoryview(self.samples).cast("B")
+        self.write_pos = 0
+        self.read_pos = 0
+        self.in_flight = 0  # Size of the write slot handed out and not yet committed
+        self.overruns = 0
+
+    def available(self) -> int:
+        """Bytes written but not yet consumed (capped at capacity)"""
+        return min(self.write_pos - self.read_pos, self.capacity)
+
+    def write_slot(self, max_bytes: int) -> memoryview:
+        """Contiguous writable region at the write position (for readinto)"""
+        offset = self.write_pos % self.capacity
+        slot = self._bytes[offset:min(offset + max_bytes, self.capacity)]
+        self.in_flight = len(slot)
+        return slot
+
+    def commit(self, nbytes: int):
+        """Publish ``nbytes`` that were written into the last write slot"""
+        self.write_pos += nbytes
+        self.in_flight = 0
+
+    def _written(self) -> int:
+        """End of the bytes the writer may have touched; in_flight is read first, see commit()"""
+        in_flight = self.in_flight
+        return self.write_pos + in_flight
+
+    def read(self, nbytes: int) -> np.ndarray:
+        """Copy out ``nbytes`` (caller must check available()) as int16 samples"""
+        out = np.empty(nbytes // self.bytes_per_sample, dtype=np.int16)
+        self.read_into(memoryview(out).cast("B"))
+        return out
+
+    def read_into(self, out_bytes: memoryview):
+        """Fill the writable byte buffer ``out_bytes`` from the ring (no allocation)"""
+        nbytes = len(out_bytes)
+        while True:
+            written = self._written()
+            if written - self.read_pos > self.capacity:
+                # Writer lapped us - skip to the oldest data still in the ring
+                self.overruns += 1
+                self.read_pos = written - self.capacity
+
+            start = self.read_pos
+            offset = start % self.capacity
+            first = min(nbytes, self.capacity - offset)
+            out_bytes[:first] = self._bytes[offset:offset + first]
+            if first < nbytes:
+                out_bytes[first:nbytes] = self._bytes[:nbytes - first]
+
+            # If the writer overwrote our region while we copied, or has a
+            # slot open over it, try again
+            if self._written() - start <= self.capacity:
+                self.read_pos = start + nbytes
+                return
+
+
+class CaptureEngine(abc.ABC):
+    """
+    Owns the capture device for the life of the process.
+
+    A reader thread fills a SampleRing from the source; subclasses open the
+    source in ``__init__`` and must implement ``_fill()``, which writes
+    interleaved s16 samples into ``self._ring`` until the source ends. Peer connections
+    read through lightweight ``track()`` views, so reconnecting never reopens
+    the device and audio captured while reconnecting is kept (up to
+    ``ring_ms``) for the next view.
+    """
+
+    def __init__(self, sample_rate: int = 16000, channels: int = 1, ring_ms: int = 2000, frame_ms: int = 20):
         self.sample_rate = sample_rate
         self.channels = channels
-        self._start = None  # Track start time for proper timestamps
 
         # 16-bit little-endian PCM
         self.bytes_per_sample = 2
-        self.frame_samples = 320  # 20ms @ 16k (safe). We can tune later.
+        self.frame_ms = frame_ms
+        self.frame_samples = sample_rate * frame_ms // 1000
         self.frame_bytes = self.frame_samples * self.channels * self.bytes_per_sample
 
+        # Ring buffer drained from the source by a dedicated reader thread
+        ring_samples = max(sample_rate * channels * ring_ms // 1000, self.frame_samples * channels * 2)
+        self._ring = SampleRing(ring_samples, self.bytes_per_sample)
+        self.underruns = 0
+        # Bound to the event loop by the first read, so an engine can be
+        # opened in a worker thread
+        self._loop = None
+        self._frame_ready = None
+        self._waiting = False
+        self._wanted = self.frame_bytes
+        self._eof = False
+        self._stopped = False
+        self._reader = None
+        self.first_audio = None  # monotonic time the source delivered its first samples
+        self._attached = False
+        self.views = 0
+
+        # Stages run on each frame's int16 samples before it becomes an AudioFrame;
+        # each has process(samples) -> samples (see dsp.py)
+        self.processors = []
+        # Multichannel captures: reduces each (channels, n) frame to mono
+        # before the processors (dsp.DelayAndSumBeamformer/ChannelSelector)
+        self.mixer = None
+        # Device clock drift correction (drift.DriftCompensator), shared by all views
+        self.drift = None
+        # Rolling record of the frames sent upstream (blackbox.BlackBox)
+        self.recorder = None
+
+        # Per-frame log lines: 0 = none, 1 = every ``log_every`` frames,
+        # 2 = also the first 10 frames of each track
+        self.log_level = 1
+        self.log_every = 500
+
+        metrics.CAPTURE_BUFFERED_SECONDS.set_function(lambda: self.occupancy / self.sample_rate)
+        metrics.CAPTURE_OVERRUNS.set_function(lambda: self._ring.overruns)
+        metrics.CAPTURE_QUEUED_SECONDS.set_function(lambda: self.drift.queued / self.sample_rate if self.drift else 0.0)
+        metrics.CAPTURE_CLOCK_SKEW_PPM.set_function(lambda: self.drift.skew * 1e6 if self.drift else 0.0)
+        metrics.CAPTURE_DRIFT_ADJUSTED_SAMPLES.set_function(lambda: self.drift.adjusted if self.drift else 0)
+
+    @abc.abstractmethod
+    def _fill(self):
+        """Reader thread body: write captured audio into the ring until EOF"""
+
+    def _check_alive(self):
+        """Raise if the capture source died before producing a full frame"""
+
+    def _error_output(self) -> str:
+        return "No error output"
+
+    def _start_reader(self):
+        """Start the long-lived thread that drains the source into the ring"""
+        self._reader = threading.Thread(target=self._read_loop, name="alsa-capture", daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        try:
+            self._fill()
+        except (OSError, ValueError):
+            pass  # Source closed by stop()
+        except Exception as e:
+            print(f"❌ Capture reader failed: {type(e).__name__}: {e}")
+        finally:
+            self._eof = True
+            if self._loop is not None:
+                try:
+                    self._loop.call_soon_threadsafe(self._frame_ready.set)
+                except RuntimeError:
+                    pass  # Event loop already closed
+
+    def _notify(self):
+        """Called by the reader thread after each commit to wake a waiting read"""
+        if self.first_audio is None:
+            self.first_audio = time.monotonic()
+            startup.mark("first_frame")
+        if self._waiting and self._ring.available() >= self._wanted:
+            self._waiting = False
+            self._loop.call_soon_threadsafe(self._frame_ready.set)
+
+    def _write(self, data):
+        """Copy a bytes-like chunk into the ring (for sources that can't readinto)"""
+        ring = self._ring
+        data = memoryview(data).cast("B")
+        while len(data):
+            slot = ring.write_slot(len(data))
+            n = len(slot)
+            slot[:] = data[:n]
+            ring.commit(n)
+            data = data[n:]
+        self._notify()
+
+    async def _wait_for_frame(self, nbytes: int):
+        """Wait until the reader thread has buffered ``nbytes``"""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._frame_ready = asyncio.Event()
+        self._wanted = nbytes
+        while self._ring.available() < nbytes:
+            if self._eof:
+                return False
+            self._frame_ready.clear()
+            self._waiting = True
+            # Re-check after publishing the flag so we can't miss a wakeup
+            if self._ring.available() >= nbytes:
+                break
+            await self._frame_ready.wait()
+        self._waiting = False
+        return True
+
+    def _attach(self):
+        """Position the read cursor for a view that is starting to read"""
+        if not self._attached:
+            # First view: start from live audio rather than whatever queued up before
+            self._attached = True
+            align = self.bytes_per_sample * self.channels
+            ring = self._ring
+            ring.read_pos = max(ring.read_pos, ring.write_pos - ring.write_pos % align)
+        # Later views continue where the previous one stopped, so nothing
+        # captured while reconnecting is lost
+
+    async def read_frame(self, due: Optional[float] = None, out=None):
+        """
+        Next frame of interleaved int16 samples, straight from the ring.
+
+        ``due`` is the monotonic time the frame was needed by; waiting past
+        it counts as an underrun. With ``out`` (a writable buffer, e.g. an
+        AudioFrame plane) as many samples as fit are copied into it and it
+        is returned; otherwise a new array of one frame is returned.
+        """
+        nbytes = self.frame_bytes if out is None else memoryview(out).nbytes
+        if self._ring.available() < nbytes:
+            # Check if the capture source has died
+            self._check_alive()
+            if due is not None and time.monotonic() > due:
+                self.underruns += 1
+                metrics.CAPTURE_SHORT_READS.inc()
+
+            if not await self._wait_for_frame(nbytes):
+                raise asyncio.CancelledError(f"Audio capture ended. stderr: {self._error_output()}")
+
+        if out is None:
+            return self._ring.read(self.frame_bytes)
+        self._ring.read_into(memoryview(out).cast("B"))
+        return out
+
+    @property
+    def output_channels(self) -> int:
+        """Channels of the frames tracks send: the mixer makes them mono"""
+        return self.channels if self.mixer is None else 1
+
+    def mix(self, samples: np.ndarray) -> np.ndarray:
+        """Reduce one interleaved multichannel frame to mono"""
+        return self.mixer.process(deinterleave(samples, self.channels))
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Run the capture processors over one frame"""
+        for processor in self.processors:
+            samples = processor.process(samples)
+        return samples
+
+    def track(self) -> "CaptureTrack":
+        """New track view onto this capture, with its own pts starting at 0"""
+        self.views += 1
+        return CaptureTrack(self)
+
+    @property
+    def occupancy(self) -> int:
+        """Samples currently buffered in the ring and not yet sent"""
+        return self._ring.available() // (self.bytes_per_sample * self.channels)
+
+    @property
+    def produced(self) -> int:
+        """Samples delivered by the source since it started"""
+        return self._ring.write_pos // (self.bytes_per_sample * self.channels)
+
+    @property
+    def overruns(self) -> int:
+        return self._ring.overruns
+
+    def stats(self) -> dict:
+        """Capture buffer statistics"""
+        occupancy = self.occupancy
+        stats = {
+            "occupancy_samples": occupancy,
+            "occupancy_ms": occupancy * 1000 / self.sample_rate,
+            "capacity_samples": self._ring.capacity // (self.bytes_per_sample * self.channels),
+            "overruns": self._ring.overruns,
+            "underruns": self.underruns,
+            "views": self.views,
+        }
+        if self.drift is not None:
+            stats["queued_ms"] = self.drift.queued * 1000 / self.sample_rate
+            stats["clock_skew_ppm"] = self.drift.skew * 1e6
+            stats["drift_adjusted_samples"] = self.drift.adjusted
+        return stats
+
+    def stop(self):
+        """Release the device (end of process)"""
+        self._stopped = True
+
+
+class CaptureTrack(MediaStreamTrack):
+    """
+    Per-connection audio track reading from a shared CaptureEngine.
+
+    Stopping the track (when a peer connection closes) leaves the engine and
+    the device running for the next connection.
+    """
+    kind = "audio"
+
+    def __init__(self, engine: CaptureEngine):
+        super().__init__()
+        self.engine = engine
+        self.sample_rate = engine.sample_rate
+        self.channels = engine.output_channels
+        self.frame_samples = engine.frame_samples
+        if self.channels > 2:
+            raise ValueError(f"{self.channels}-channel capture needs a mixer to send mono")
+        self._layout = "mono" if self.channels == 1 else "stereo"
+        self._time_base = Fraction(1, self.sample_rate)
+        self._values = self.frame_samples * self.channels
+        # Multichannel frames are read here and mixed down into the sent frame
+        self._captured = None
+        if engine.mixer is not None:
+            self._captured = np.empty(self.frame_samples * engine.channels, dtype=np.int16)
+        # Drift-corrected frames are read here and stretched into the frame
+        self._stretch_source = None
+        if engine.drift is not None:
+            self._stretch_source = np.empty(self.frame_samples * 5 // 4 * engine.channels, dtype=np.int16)
+
+        self._pts = 0
+        self._frames = 0
+        self._next_log = 0 if engine.log_level else -1
+        self._start_time = None
+
+    def stats(self) -> dict:
+        return self.engine.stats()
+
+    async def recv(self):
+        try:
+            engine = self.engine
+            if self._pts == 0:
+                engine._attach()
+                if engine.log_level:
+                    print(f"🎤 Starting audio capture: {self.frame_samples} samples/frame, "
+                          f"{self._layout}, {self.sample_rate}Hz")
+
+            # The capture is behind schedule if this frame was already due
+            due = None
+            if self._start_time is not None:
+                due = self._start_time + (self._pts + self.frame_samples) / self.sample_rate
+
+            # Read straight into the new frame's sample buffer. The frame has
+            # to be new each time: downstream may keep it (VAD pre-roll,
+            # on-demand backlog)
+            frame = AudioFrame(format="s16", layout=self._layout, samples=self.frame_samples)
+            plane = frame.planes[0]
+            destination = plane if self._captured is None else self._captured
+            drift = engine.drift
+            extra = drift.step() if drift is not None else 0
+            read_start = time.perf_counter()
+            if extra:
+                # Clock drift correction: a few samples more or fewer make up this frame
+                source = self._stretch_source[:(self.frame_samples + extra) * engine.channels]
+                await engine.read_frame(due, out=source)
+                captured = self.frame_samples * engine.channels
+                stretch(source, np.frombuffer(destination, dtype=np.int16, count=captured), engine.channels)
+            else:
+                await engine.read_frame(due, out=destination)
+            process_start = time.perf_counter()
+            metrics.CAPTURE_READ_SECONDS.observe(process_start - read_start)
+
+            if self._captured is not None:
+                samples = np.frombuffer(plane, dtype=np.int16, count=self._values)
+                mono = engine.mix(self._captured)
+                samples[:] = engine.process(mono) if engine.processors else mono
+            elif engine.processors:
+                samples = np.frombuffer(plane, dtype=np.int16, count=self._values)
+                samples[:] = engine.process(samples)
+
+            # Use proper timestamps based on sample count
+            frame.sample_rate = self.sample_rate
+            frame.pts = self._pts
+            frame.time_base = self._time_base
+            if drift is not None and drift.wants_quiet:
+                drift.check_quiet(np.frombuffer(plane, dtype=np.int16, count=self._values))
+            if engine.recorder is not None:
+                sent = np.frombuffer(plane, dtype=np.int16, count=self._values)
+                engine.recorder.capture(sent[::self.channels], self._pts)
+            metrics.CAPTURE_PROCESS_SECONDS.observe(time.perf_counter() - process_start)
+
+            # Pace frames to real-time (like MediaPlayer does) on the monotonic
+            # clock, which NTP can't step
+            now = time.monotonic()
+            on_schedule = False
+            if self._start_time is None:
+                # Audio still queued from before this view (e.g. captured while
+                # reconnecting) is already late, so let it go out back-to-back
+                self._start_time = now - engine.occupancy / self.sample_rate
+            else:
+                # Calculate when this frame should be sent based on sample count
+                wait_time = self._start_time + self._pts / self.sample_rate - now
+                on_schedule = wait_time > 0
+                if on_schedule:
+                    await asyncio.sleep(wait_time)
+                    metrics.CAPTURE_PACING_SECONDS.observe(wait_time)
+                else:
+                    metrics.CAPTURE_PACING_SECONDS.observe(0.0)
+
+            if drift is not None:
+                drift.observe(now, engine.produced, engine.occupancy, on_schedule)
+
+            # Sampled diagnostics - on most frames this is one comparison
+            if self._frames == self._next_log:
+                self._log(plane)
+
+            self._pts += self.frame_samples
+            self._frames += 1
+            metrics.CAPTURE_FRAMES.inc()
+
+            return frame
+        except Exception as e:
+            print(f"❌ Exception in recv(): {type(e).__name__}: {e}")
+            import traceback
+            traceback.print_exc()
+            raise
+
+    def _log(self, plane):
+        """Log the frame about to be returned and schedule the next log line"""
+        frame_num = self._frames
+        every = self.engine.log_every
+        samples = np.frombuffer(plane, dtype=np.int16, count=self._values)
+        print(f"🎤 Frame #{frame_num}: pts={self._pts}, amp={np.abs(samples).mean():.1f}, "
+              f"samples={self.frame_samples}")
+        if frame_num > 0 and frame_num % every == 0:
+            stats = self.stats()
+            print(f"🎤 Ring: {stats['occupancy_ms']:.0f}ms buffered, "
+                  f"overruns={stats['overruns']}, underruns={stats['underruns']}")
+            if "queued_ms" in stats:
+                print(f"🎤 Clock: {stats['clock_skew_ppm']:+.0f}ppm skew, {stats['queued_ms']:.0f}ms queued, "
+                      f"{stats['drift_adjusted_samples']:+d} samples adjusted")
+
+        if self.engine.log_level >= 2 and frame_num < 9:
+            self._next_log = frame_num + 1
+        else:
+            self._next_log = (frame_num // every + 1) * every
+
+
+class FFmpegAlsaCapture(CaptureEngine):
+    """Captures via an ``ffmpeg`` subprocess writing s16le to a pipe"""
+
+    def __init__(self, device: str, sample_rate: int = 16000, channels: int = 1, ring_ms: int = 2000,
+                 input_format: str = "alsa", frame_ms: int = 20):
+        super().__init__(sample_rate=sample_rate, channels=channels, ring_ms=ring_ms, frame_ms=frame_ms)
+
         cmd = [
             "ffmpeg",
             "-hide_banner",
             "-loglevel", "error",
-            "-f", "alsa",
+        ]
+        if input_format == "alsa":
+            # Ask ALSA for the capture rate directly (ffmpeg would otherwise open
+            # 48k stereo): at most one resample, in ALSA, and none if native
+            cmd += ["-sample_rate", str(sample_rate), "-channels", str(channels)]
+        else:
+            # Files would otherwise be dumped into the pipe as fast as possible
+            cmd.append("-re")
+        cmd += [
+            "-f", input_format,
             "-i", device,
             "-ac", str(channels),
             "-ar", str(sample_rate),
@@ -43,8 +498,12 @@ class FFmpegAlsaTrack(MediaStreamTrack):
 
         for attempt in range(max_retries):
             self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
-            # Give it a moment to start
-            time.sleep(0.5)
+            # Wait for the first audio (or for ffmpeg to exit) rather than a fixed pause
+            first = b""
+            if select.select([self.proc.stdout], [], [], 0.5)[0]:
+                first = os.read(self.proc.stdout.fileno(), self.frame_bytes)
+                if not first:
+                    self.proc.wait()
 
             # Check if it died immediately
             if self.proc.poll() is not None:
@@ -57,93 +516,200 @@ class FFmpegAlsaTrack(MediaStreamTrack):
                     raise RuntimeError(f"FFmpeg failed to start: {stderr}")
             else:
                 # Process started successfully
+                if first:
+                    self._write(first)
                 break
 
-        self._pts = 0
-        self._last_recv_time = None
-        self._recv_count = 0
-        self._start_time = None
+        self._start_reader()
 
-    async def recv(self):
-        try:
-            self._recv_count += 1
-            self._last_recv_time = time.time()
+    def _fill(self):
+        stdout = self.proc.stdout
+        ring = self._ring
+        while True:
+            nbytes = stdout.readinto(ring.write_slot(self.frame_bytes))
+            if not nbytes:
+                break
+            ring.commit(nbytes)
+            self._notify()
 
-            if self._pts == 0:
-                print(f"🎤 Starting audio capture: {self.frame_samples} samples/frame, mono, {self.sample_rate}Hz")
-                print(f"🎤 Track readyState: {self.readyState}")
+    def _check_alive(self):
+        if self.proc.poll() is not None:
+            raise RuntimeError(f"FFmpeg process died. stderr: {self._error_output()}")
 
-            # Check if FFmpeg process has died
-            if self.proc.poll() is not None:
-                stderr_output = self.proc.stderr.read().decode() if self.proc.stderr else "No error output"
-                raise RuntimeError(f"FFmpeg process died. stderr: {stderr_output}")
+    def _error_output(self) -> str:
+        return self.proc.stderr.read().decode() if self.proc.stderr else "No error output"
 
-            assert self.proc.stdout is not None
+    def stop(self):
+        super().stop()
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
 
-            # Read with explicit logging to detect blocking
-            if self._recv_count == 17:
-                print(f"🔍 About to read frame #{self._recv_count}, this should be frame #17...")
 
-            data = await asyncio.get_event_loop().run_in_executor(None, self.proc.stdout.read, self.frame_bytes)
+class PyAVAlsaCapture(CaptureEngine):
+    """
+    Captures in-process by opening the ALSA device with PyAV.
 
-            if self._recv_count == 17:
-                print(f"🔍 Read completed for frame #17, got {len(data) if data else 0} bytes")
+    Frames are decoded and resampled to s16 at ``sample_rate`` on the reader
+    thread, so there is no ffmpeg subprocess, no pipe and no startup sleep.
+    """
 
-            if not data or len(data) < self.frame_bytes:
-                stderr_output = self.proc.stderr.read().decode() if self.proc.stderr else "No error output"
-                raise asyncio.CancelledError(f"Audio capture ended. stderr: {stderr_output}")
+    def __init__(self, device: str, sample_rate: int = 16000, channels: int = 1, ring_ms: int = 2000,
+                 input_format: str = "alsa", frame_ms: int = 20):
+        super().__init__(sample_rate=sample_rate, channels=channels, ring_ms=ring_ms, frame_ms=frame_ms)
+        self._realtime_input = input_format != "alsa"
+        self._error = None
+        self.started = None  # monotonic time decoding started
 
-            # int16 mono samples, shape (samples,)
-            samples = np.frombuffer(data, dtype=np.int16)
+        options = {}
+        if input_format == "alsa":
+            options = {"sample_rate": str(sample_rate), "channels": str(channels)}
 
-            # IMPORTANT: PyAV expects shape (channels, samples) for packed formats
-            if self.channels == 1:
-                arr = samples.reshape(1, -1)  # (1, 320) for mono
-                layout = "mono"
-            else:
-                # For stereo, interleaved data needs to be split into channels
-                arr = samples.reshape(self.channels, -1)  # (2, samples)
-                layout = "stereo"
+        print(f"🎤 Opening PyAV {input_format} capture from {device}")
+        self.container = av.open(device, format=input_format, options=options)
+        self._stream = self.container.streams.audio[0]
+        self._resampler = av.AudioResampler(
+            format="s16",
+            # Arrays keep every channel in capture order, unlabelled so nothing is remixed
+            layout={1: "mono", 2: "stereo"}.get(channels, f"{channels} channels"),
+            rate=sample_rate,
+        )
+        self._start_reader()
 
-            frame = av.AudioFrame.from_ndarray(arr, format="s16", layout=layout)
-            frame.sample_rate = self.sample_rate
+    def _fill(self):
+        bytes_per_frame = self.bytes_per_sample * self.channels
+        period = self.sample_rate // 200 * bytes_per_frame
+        written = 0
+        started = self.started = time.monotonic()
+        try:
+            for decoded in self.container.decode(self._stream):
+                for frame in self._resampler.resample(decoded):
+                    data = memoryview(frame.planes[0])[:frame.samples * bytes_per_frame]
+                    if not self._realtime_input:
+                        self._write(data)
+                        continue
+                    # Files decode far faster than real time - pace like a device
+                    # would, releasing each 5ms period once it has been "recorded"
+                    for offset in range(0, len(data), period):
+                        chunk = data[offset:offset + period]
+                        written += len(chunk) // bytes_per_frame
+                        ahead = started + written / self.sample_rate - time.monotonic()
+                        if ahead > 0:
+                            time.sleep(ahead)
+                        self._write(chunk)
 
-            # Use proper timestamps based on sample count
-            frame.pts = self._pts
-            frame.time_base = Fraction(1, self.sample_rate)
+                if self._stopped:
+                    break
+        except av.error.FFmpegError as e:
+            self._error = str(e)
+            raise
+        finally:
+            self.container.close()
 
-            num_samples = arr.shape[1]  # shape is (channels, samples)
+    def _check_alive(self):
+        if self._error is not None:
+            raise RuntimeError(f"PyAV capture died: {self._error}")
 
-            # Pace frames to real-time (like MediaPlayer does)
-            if self._start_time is None:
-                self._start_time = time.time()
-            else:
-                # Calculate when this frame should be sent based on sample count
-                expected_time = self._start_time + (self._pts / self.sample_rate)
-                current_time = time.time()
-                wait_time = expected_time - current_time
+    def _error_output(self) -> str:
+        return self._error or "No error output"
 
-                if wait_time > 0:
-                    await asyncio.sleep(wait_time)
 
-            # Debug: log only first 10 frames, then every 10 seconds
-            frame_num = self._pts // self.frame_samples
-            avg_amplitude = np.abs(samples).mean()
+class FileCapture(CaptureEngine):
+    """
+    Plays a WAV file (or an in-memory signal) into the ring as if it were a
+    microphone: one ``period_ms`` chunk at a time, paced to real time and
+    looped. Lets the client and the benchmarks run without a sound card.
 
-            # Log first 10 frames, then every 500 frames (10 seconds at 50fps)
-            if frame_num < 10 or frame_num % 500 == 0:
-                print(f"🎤 Frame #{frame_num}: pts={self._pts}, amp={avg_amplitude:.1f}, samples={num_samples}")
+    ``started`` is the monotonic time the first chunk was written; chunk
+    ``i`` is written at ``started + i * period_ms / 1000``.
+    """
 
-            self._pts += num_samples
+    def __init__(self, path: Optional[str] = None, sample_rate: int = 16000, channels: int = 1,
+                 ring_ms: int = 2000, signal: Optional[np.ndarray] = None, loop: bool = True,
+                 period_ms: int = 20, frame_ms: int = 20):
+        super().__init__(sample_rate=sample_rate, channels=channels, ring_ms=ring_ms, frame_ms=frame_ms)
+        if signal is None:
+            print(f"🎤 Playing {path} as the microphone")
+            signal = read_wav(path, sample_rate, channels)
+        self._signal = signal.reshape(-1)
+        self._loop_file = loop
+        self._period = sample_rate * period_ms // 1000 * channels
+        self.started = None
+        self._start_reader()
 
-            return frame
-        except Exception as e:
-            print(f"❌ Exception in recv(): {type(e).__name__}: {e}")
-            import traceback
-            traceback.print_exc()
-            raise
+    def _fill(self):
+        signal = self._signal
+        period = self._period
+        pos = 0
+        chunks = 0
+        while not self._stopped:
+            if pos + period > signal.size:
+                if not self._loop_file:
+                    break
+                pos = 0
+            now = time.monotonic()
+            if self.started is None:
+                self.started = now
+            ahead = self.started + chunks * period / (self.sample_rate * self.channels) - now
+            if ahead > 0:
+                time.sleep(ahead)
+            self._write(signal[pos:pos + period])
+            pos += period
+            chunks += 1
 
-    def stop(self):
-        super().stop()
-        if self.proc and self.proc.poll() is None:
-            self.proc.terminate()
\ No newline at end of file
+
+def map_wav(path: str):
+    """
+    Memory-map the samples of a 16-bit PCM WAV file without reading them.
+
+    Returns ``(samples, sample_rate, channels)`` where ``samples`` is a
+    read-only interleaved int16 memmap; processes and tracks that map the
+    same file share its pages.
+    """
+    with open(path, "rb") as f:
+        riff, _, form = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or form != b"WAVE":
+            raise ValueError(f"{path}: not a WAV file")
+        sample_rate = channels = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path}: no data chunk")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = f.read(size + (size & 1))
+                tag, channels, sample_rate = struct.unpack("<HHI", fmt[:8])
+                bits = struct.unpack("<H", fmt[14:16])[0]
+                if tag not in (1, 0xFFFE) or bits != 16:
+                    raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+            elif chunk_id == b"data":
+                offset = f.tell()
+                break
+            else:
+                f.seek(size + (size & 1), 1)
+    if sample_rate is None:
+        raise ValueError(f"{path}: no fmt chunk before the data")
+    # Streamed WAVs may carry a placeholder data size
+    count = min(size, os.path.getsize(path) - offset) // 2
+    count -= count % channels
+    samples = np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(count,))
+    return samples, sample_rate, channels
+
+
+def read_wav(path: str, sample_rate: int, channels: int) -> np.ndarray:
+    """
+    16-bit WAV as interleaved int16 at ``sample_rate``/``channels``.
+
+    Files already in that format come back memory-mapped; others are
+    converted in memory (channel average, linear resampling).
+    """
+    samples, file_rate, file_channels = map_wav(path)
+    if file_rate == sample_rate and file_channels == channels:
+        return samples
+    audio = samples.reshape(-1, file_channels).astype(np.float32)
+    if file_channels != channels:
+        audio = np.repeat(audio.mean(axis=1, keepdims=True), channels, axis=1)
+    if file_rate != sample_rate:
+        positions = np.arange(0, audio.shape[0], file_rate / sample_rate)
+        audio = np.stack([np.interp(positions, np.arange(audio.shape[0]), audio[:, c])
+                          for c in range(channels)], axis=1)
+    return np.clip(np.rint(audio), -32768, 32767).astype(np.int16).reshape(-1)
@@ -0,0 +1,289 @@
+"""
+Rolling black-box recording of the last few minutes of audio.
+
+A fixed-size file is memory-mapped and holds two circular streams: the
+captured mic audio as sent upstream, and the assistant's audio received
+from the server. Each stream has an index of its frames (pts, position in
+the stream and wall-clock time) so a time window can be cut out again,
+and an event ring records connection-state markers.
+
+Recording a frame is a copy into the mapping plus a few counter updates:
+no system calls, no allocation that grows. The kernel writes dirty pages
+back on its own schedule; keep the file on tmpfs (the default path is in
+/dev/shm) to spare an SD card. The counters are updated after the data, so
+the file stays readable if the process dies, e.g. to look at after a
+crash:
+
+    python blackbox.py events
+    python blackbox.py dump --last 60 --out incident.wav
+    python blackbox.py dump --stream bot --since 14:02:10 --until 14:02:40 --out bot.wav
+"""
+import argparse
+import datetime
+import mmap
+import os
+import struct
+import time
+import wave
+
+import numpy as np
+
+MAGIC = b"VBLKBOX1"
+HEADER = struct.Struct("<8sIIIqqq")  # magic, mic rate, bot rate, frames/s, samples per stream, index, events
+HEADER_SIZE = 4096
+COUNTERS = 5  # mic position, mic frames, bot position, bot frames, events
+FRAME_INDEX = np.dtype([("pts", "<i8"), ("pos", "<i8"), ("wall", "<f8")])
+EVENT = np.dtype([("wall", "<f8"), ("mic_pos", "<i8"), ("bot_pos", "<i8"), ("label", "S40")])
+STREAMS = ("mic", "bot")
+
+
+def _page_align(n: int) -> int:
+    return -(-n // mmap.PAGESIZE) * mmap.PAGESIZE
+
+
+class _Stream:
+    """One circular int16 stream and its frame index inside the mapping"""
+
+    def __init__(self, buf, offset: int, rate: int, capacity: int, index_capacity: int, counters, slot: int):
+        self.rate = rate
+        self.samples = np.ndarray(capacity, dtype="<i2", buffer=buf, offset=offset)
+        offset += _page_align(capacity * 2)
+        self.index = np.ndarray(index_capacity, dtype=FRAME_INDEX, buffer=buf, offset=offset)
+        self.size = offset + _page_align(index_capacity * FRAME_INDEX.itemsize)
+        self._counters = counters
+        self._slot = slot
+
+    @property
+    def position(self) -> int:
+        """Samples written since the file was created"""
+        return int(self._counters[self._slot])
+
+    @property
+    def frames(self) -> int:
+        return int(self._counters[self._slot + 1])
+
+    def write(self, samples: np.ndarray, pts: int, wall: float):
+        counters, slot = self._counters, self._slot
+        pos = int(counters[slot])
+        frames = int(counters[slot + 1])
+        capacity = self.samples.size
+        n = min(samples.size, capacity)
+        offset = pos % capacity
+        first = min(n, capacity - offset)
+        self.samples[offset:offset + first] = samples[:first]
+        if first < n:
+            self.samples[:n - first] = samples[first:n]
+        self.index[frames % self.index.size] = (pts, pos, wall)
+        # Publish after the data so a reader never sees unwritten samples
+        counters[slot] = pos + n
+        counters[slot + 1] = frames + 1
+
+    def entries(self) -> np.ndarray:
+        """Index entries whose samples are still in the ring, oldest first"""
+        frames, size = self.frames, self.index.size
+        if frames <= size:
+            entries = self.index[:frames]
+        else:
+            split = frames % size
+            entries = np.concatenate([self.index[split:], self.index[:split]])
+        return entries[entries["pos"] >= self.position - self.samples.size]
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """Samples at stream positions [start, end)"""
+        capacity = self.samples.size
+        idx = np.arange(start, end) % capacity
+        return self.samples[idx]
+
+
+class BlackBox:
+    """
+    Memory-mapped rolling recorder holding the last ``minutes`` of audio.
+
+    An existing file with the same geometry is reopened and appended to, so
+    a restarted client keeps the audio from before the restart.
+    """
+
+    def __init__(self, path: str, minutes: float = 5.0, mic_rate: int = 16000, bot_rate: int = 16000,
+                 readonly: bool = False):
+        self.path = path
+        if readonly:
+            with open(path, "rb") as f:
+                header = f.read(HEADER.size)
+            magic, mic_rate, bot_rate, frames_per_s, capacity, index_capacity, event_capacity = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"{path}: not a black-box recording")
+        else:
+            frames_per_s = 100  # room for 10ms frames
+            capacity = int(minutes * 60 * max(mic_rate, bot_rate))
+            index_capacity = int(minutes * 60 * frames_per_s)
+            event_capacity = 4096
+        header = HEADER.pack(MAGIC, mic_rate, bot_rate, frames_per_s, capacity, index_capacity, event_capacity)
+
+        stream_size = _page_align(capacity * 2) + _page_align(index_capacity * FRAME_INDEX.itemsize)
+        size = HEADER_SIZE + 2 * stream_size + _page_align(event_capacity * EVENT.itemsize)
+
+        if readonly:
+            with open(path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        else:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fresh = os.fstat(fd).st_size != size or os.pread(fd, HEADER.size, 0) != header
+                if fresh:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, header, 0)
+                self._mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            if hasattr(self._mm, "madvise"):
+                self._mm.madvise(mmap.MADV_WILLNEED)  # Fault the pages in now, not from the audio path
+
+        self._counters = np.ndarray(COUNTERS, dtype="<i8", buffer=self._mm, offset=HEADER.size)
+        offset = HEADER_SIZE
+        self.mic = _Stream(self._mm, offset, mic_rate, capacity, index_capacity, self._counters, 0)
+        offset += stream_size
+        self.bot = _Stream(self._mm, offset, bot_rate, capacity, index_capacity, self._counters, 2)
+        offset += stream_size
+        self._events = np.ndarray(event_capacity, dtype=EVENT, buffer=self._mm, offset=offset)
+        self.size = size
+
+    def capture(self, samples: np.ndarray, pts: int):
+        """Record one captured mono frame (int16) about to be sent upstream"""
+        self.mic.write(samples, pts, time.time())
+
+    def received(self, frame):
+        """Record one decoded frame of the assistant's audio (channel 0, at the stream rate)"""
+        channels = frame.layout.nb_channels
+        if frame.format.name == "s16":
+            samples = np.frombuffer(frame.planes[0], dtype=np.int16, count=frame.samples * channels)
+        else:
+            samples = frame.to_ndarray().astype(np.int16).reshape(-1)
+        step = frame.sample_rate // self.bot.rate
+        if step > 1:
+            # Average each run of ``step`` samples: decimation with a little anti-aliasing
+            stride = step * channels
+            samples = samples[:samples.size - samples.size % stride]
+            total = samples[0::stride].astype(np.int32)
+            for k in range(1, step):
+                total += samples[k * channels::stride]
+            samples = total // step
+        elif channels > 1:
+            samples = samples[::channels]
+        # Decoded frames count pts in samples at their own rate
+        self.bot.write(samples, (frame.pts or 0) * self.bot.rate // frame.sample_rate, time.time())
+
+    def mark(self, label: str):
+        """Record a connection-state (or any other) marker"""
+        count = int(self._counters[4])
+        self._events[count % self._events.size] = (
+            time.time(), self.mic.position, self.bot.position, label.encode()[:EVENT["label"].itemsize])
+        self._counters[4] = count + 1
+
+    def events(self) -> np.ndarray:
+        """Markers still in the ring, oldest first"""
+        count, size = int(self._counters[4]), self._events.size
+        if count <= size:
+            return self._events[:count].copy()
+        split = count % size
+        return np.concatenate([self._events[split:], self._events[:split]])
+
+    def dump(self, stream: str, since: float, until: float) -> np.ndarray:
+        """
+        Audio of ``stream`` between two wall-clock times. Time the stream was
+        not recording (between connections) comes back as silence, so the
+        result lines up with the clock.
+        """
+        ring = getattr(self, stream)
+        entries = ring.entries()
+        entries = entries[(entries["wall"] >= since) & (entries["wall"] < until)]
+        if entries.size == 0:
+            return np.zeros(0, dtype=np.int16)
+
+        ends = np.append(entries["pos"][1:], ring.position)
+        chunks = []
+        written = 0
+        for entry, end in zip(entries, ends):
+            # Frames are recorded as they are sent, so a frame's wall time is its end
+            n = int(min(end - entry["pos"], ring.rate))
+            due = int(round((entry["wall"] - since) * ring.rate)) - n
+            if due > written + ring.rate // 50:
+                chunks.append(np.zeros(due - written, dtype=np.int16))
+                written = due
+            chunks.append(ring.read(int(entry["pos"]), int(entry["pos"]) + n))
+            written += n
+        return np.concatenate(chunks)
+
+    def close(self):
+        self._mm.close()
+
+
+def write_wav(path: str, samples: np.ndarray, rate: int):
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(samples.astype("<i2").tobytes())
+
+
+def _parse_time(value: str) -> float:
+    """Wall-clock time from epoch seconds, an ISO timestamp or today's HH:MM[:SS]"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        clock = datetime.time.fromisoformat(value)
+        return datetime.datetime.combine(datetime.date.today(), clock).timestamp()
+
+
+def _clock(wall: float) -> str:
+    return datetime.datetime.fromtimestamp(wall).strftime("%H:%M:%S.%f")[:-3]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the audio black-box recording")
+    parser.add_argument("command", choices=["info", "events", "dump"])
+    parser.add_argument("--path", default=os.environ.get("BLACKBOX_PATH", "/dev/shm/voice-blackbox"))
+    parser.add_argument("--stream", choices=STREAMS, default="mic")
+    parser.add_argument("--last", type=float, help="dump the last N seconds")
+    parser.add_argument("--since", help="start of the window: epoch seconds, ISO time or HH:MM:SS today")
+    parser.add_argument("--until", help="end of the window (default: now)")
+    parser.add_argument("--out", default="blackbox.wav")
+    args = parser.parse_args()
+
+    box = BlackBox(args.path, readonly=True)
+    if args.command == "info":
+        for name in STREAMS:
+            ring = getattr(box, name)
+            entries = ring.entries()
+            span = f"{_clock(entries['wall'][0])} - {_clock(entries['wall'][-1])}" if entries.size else "empty"
+            print(f"{name}: {ring.rate}Hz, {ring.samples.size / ring.rate / 60:.1f} min ring, "
+                  f"{ring.frames} frames recorded, holding {span}")
+        print(f"{len(box.events())} events, {box.size / 2 ** 20:.1f}MB")
+    elif args.command == "events":
+        for event in box.events():
+            print(f"{_clock(event['wall'])}  {event['label'].decode()}")
+    else:
+        until = _parse_time(args.until) if args.until else time.time()
+        if args.last is not None:
+            since = until - args.last
+        elif args.since:
+            since = _parse_time(args.since)
+        else:
+            parser.error("dump needs --last or --since")
+        ring = getattr(box, args.stream)
+        samples = box.dump(args.stream, since, until)
+        write_wav(args.out, samples, ring.rate)
+        print(f"💾 {samples.size / ring.rate:.1f}s of {args.stream} audio "
+              f"({_clock(since)} - {_clock(until)}) written to {args.out}")
+        for event in box.events():
+            if since <= event["wall"] < until:
+                print(f"   {_clock(event['wall'])}  {event['label'].decode()}")
+    box.close()
+
+
+if __name__ == "__main__":
+    main()
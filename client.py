@@ -2,229 +2,611 @@ import os
 import json
 import asyncio
 import platform
-import aiohttp
 import time
 
-from aiortc import RTCPeerConnection, RTCSessionDescription
-from aiortc.contrib.media import MediaPlayer
+import metrics
+import startup
+from liveness import LivenessMonitor, RttEstimator
+from failover import ServerPool
+from reconnect import Backoff, PeerPreparer, RecoveryTimer, get_http_session, post_offer
 
 ROOM = os.environ.get("ROOM", "bedroom")
-SERVER = os.environ.get("PIPECAT_SERVER", "http://pi-voice.local:7860").rstrip("/")
+# One server, or several comma-separated: the fastest healthy one is used and the others are standbys
+SERVERS = [s.strip().rstrip("/") for s in os.environ.get("PIPECAT_SERVER", "http://pi-voice.local:7860").split(",")
+           if s.strip()]
+SERVER = SERVERS[0]
 OFFER_URL = f"{SERVER}/api/offer"
-HEALTHCHECK_INTERVAL = int(os.environ.get("HEALTHCHECK_INTERVAL", "5"))
-HEALTHCHECK_TIMEOUT = int(os.environ.get("HEALTHCHECK_TIMEOUT", "30"))
+SERVER_PROBE_INTERVAL = float(os.environ.get("SERVER_PROBE_INTERVAL", "10"))  # with several servers
+SERVER_HOLD = float(os.environ.get("SERVER_HOLD", "30"))  # seconds a server is avoided after losing it
+HEALTHCHECK_INTERVAL = float(os.environ.get("HEALTHCHECK_INTERVAL", "1"))
+HEALTHCHECK_TIMEOUT = float(os.environ.get("HEALTHCHECK_TIMEOUT", "30"))  # Upper bound for the adaptive pong timeout
+HEALTHCHECK_MIN_TIMEOUT = float(os.environ.get("HEALTHCHECK_MIN_TIMEOUT", "0.2"))  # Lower bound for it
+HEALTHCHECK_PROBES = int(os.environ.get("HEALTHCHECK_PROBES", "2"))
+AUDIO_INACTIVITY_TIMEOUT = float(os.environ.get("AUDIO_INACTIVITY_TIMEOUT", "0.3"))
+RECONNECT_MAX_DELAY = float(os.environ.get("RECONNECT_MAX_DELAY", "30"))
+ALSA_DEVICE = os.environ.get("ALSA_DEVICE", "auto")  # "auto" picks a capture device and caches the choice
+DEVICE_CACHE = os.environ.get("DEVICE_CACHE", os.path.expanduser("~/.cache/voice-assistant-client/devices.json"))
+CAPTURE_BACKEND = os.environ.get("CAPTURE_BACKEND", "ffmpeg").lower()  # "ffmpeg", "pyav" or "file"
+CAPTURE_FILE = os.environ.get("CAPTURE_FILE", "")  # WAV played as the mic with CAPTURE_BACKEND=file
+CAPTURE_BUFFER_MS = int(os.environ.get("CAPTURE_BUFFER_MS", "2000"))
+CAPTURE_SAMPLE_RATE = int(os.environ.get("CAPTURE_SAMPLE_RATE", "16000"))  # 48000 is Opus-native
+CAPTURE_FRAME_MS = int(os.environ.get("CAPTURE_FRAME_MS", "20"))  # 10, 20 or 40; also the Opus packet duration
+CAPTURE_CHANNELS = int(os.environ.get("CAPTURE_CHANNELS", "1"))  # e.g. 6 for a ReSpeaker 4-mic USB array
+CAPTURE_MIC_CHANNELS = os.environ.get("CAPTURE_MIC_CHANNELS", "")  # raw mic channels, e.g. "1,2,3,4" (default: all)
+ARRAY_MODE = os.environ.get("ARRAY_MODE", "beamform").lower()  # multichannel to mono: "beamform" or "select"
+CAPTURE_LATENCY_TARGET_MS = int(os.environ.get("CAPTURE_LATENCY_TARGET_MS", "60"))  # backlog drift correction aims for
+CAPTURE_LATENCY_CEILING_MS = int(os.environ.get("CAPTURE_LATENCY_CEILING_MS", "200"))  # 0 disables drift correction
+CAPTURE_LOG_LEVEL = int(os.environ.get("CAPTURE_LOG_LEVEL", "1"))  # 0 = off, 1 = sampled, 2 = verbose
+CAPTURE_LOG_EVERY = int(os.environ.get("CAPTURE_LOG_EVERY", "500"))  # frames between sampled log lines
+VAD_MODE = os.environ.get("VAD_MODE", "off").lower()  # "off", "silence" or "hold"
+VAD_PREROLL_MS = int(os.environ.get("VAD_PREROLL_MS", "300"))
+SESSION_MODE = os.environ.get("SESSION_MODE", "always-on").lower()  # "always-on" or "on-demand"
+ON_DEMAND_IDLE_TIMEOUT = float(os.environ.get("ON_DEMAND_IDLE_TIMEOUT", "30"))
+ON_DEMAND_BUFFER_MS = int(os.environ.get("ON_DEMAND_BUFFER_MS", "5000"))
+PLAYBACK_SINK = os.environ.get("PLAYBACK_SINK", "none")  # "none", "null", "file:<path>", "aplay" or "ffmpeg"
+PLAYBACK_DEVICE = os.environ.get("PLAYBACK_DEVICE", "default")
+PLAYBACK_MIN_DELAY_MS = float(os.environ.get("PLAYBACK_MIN_DELAY_MS", "20"))
+PLAYBACK_MAX_DELAY_MS = float(os.environ.get("PLAYBACK_MAX_DELAY_MS", "200"))
+PLAYBACK_BUFFER_MS = int(os.environ.get("PLAYBACK_BUFFER_MS", "60"))  # aplay's ALSA buffer
+ECHO_SUPPRESSION = os.environ.get("ECHO_SUPPRESSION", "0") == "1"
+NOISE_SUPPRESSION = os.environ.get("NOISE_SUPPRESSION", "0") == "1"
+AGC = os.environ.get("AGC", "0") == "1"
+AGC_TARGET_DBFS = float(os.environ.get("AGC_TARGET_DBFS", "-20"))
+AGC_MAX_GAIN_DB = float(os.environ.get("AGC_MAX_GAIN_DB", "24"))
+OPUS_PROFILE = os.environ.get("OPUS_PROFILE", "default").lower()  # "default" (aiortc's) or "speech"
+OPUS_BITRATE = int(os.environ.get("OPUS_BITRATE", "0"))  # bits per second for the mic stream; 0 = the profile's
+OPUS_CHANNELS = int(os.environ.get("OPUS_CHANNELS", "0"))  # 0 = the profile's
+OPUS_FEC = os.environ.get("OPUS_FEC", "0") == "1"  # in-band forward error correction
+OPUS_DTX = os.environ.get("OPUS_DTX", "0") == "1"  # send almost nothing between utterances
+OPUS_ADAPTIVE = os.environ.get("OPUS_ADAPTIVE", "0") == "1"  # follow reported loss with bitrate and FEC
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))  # 0 disables the endpoint
+BLACKBOX_MINUTES = float(os.environ.get("BLACKBOX_MINUTES", "0"))  # rolling audio record; 0 disables
+BLACKBOX_PATH = os.environ.get("BLACKBOX_PATH", "/dev/shm/voice-blackbox")
+TELEMETRY = os.environ.get("TELEMETRY", "0") == "1"  # binary per-frame energy/VAD/clipping/latency to the server
+TELEMETRY_BATCH_MS = int(os.environ.get("TELEMETRY_BATCH_MS", "100"))
 
 def build_mic_track():
+    track = open_capture_track()
+
+    if VAD_MODE != "off":
+        # Only stream speech (plus pre-roll) upstream
+        from vad import VadGatedTrack
+        print(f"🗣️  VAD gating enabled (mode={VAD_MODE}, pre-roll={VAD_PREROLL_MS}ms)")
+        track = VadGatedTrack(track, vad=make_vad(), mode=VAD_MODE, preroll_ms=VAD_PREROLL_MS)
+
+    return track
+
+def make_vad():
+    """EnergyVad with its frame counts and ZCR threshold scaled to the capture format"""
+    from vad import EnergyVad
+    return EnergyVad(
+        zcr_threshold=0.25 * 16000 / CAPTURE_SAMPLE_RATE,
+        attack_frames=max(1, 40 // CAPTURE_FRAME_MS),
+        hangover_frames=300 // CAPTURE_FRAME_MS,
+    )
+
+def open_capture_track():
     sys = platform.system().lower()
 
-    if sys == "darwin":
+    if sys == "darwin" and CAPTURE_BACKEND != "file":
+        from aiortc.contrib.media import MediaPlayer
         audio_index = os.environ.get("MAC_AUDIO_INDEX", "0")
         player = MediaPlayer(
             f":{audio_index}",
             format="avfoundation",
-            options={"sample_rate": "16000", "channels": "1"},
+            options={"sample_rate": str(CAPTURE_SAMPLE_RATE), "channels": "1"},
         )
         if not player.audio:
             raise RuntimeError("No audio track from macOS microphone")
+        startup.mark("device_open")
         return player.audio
 
-    # Linux - fall back to custom ALSA track with proper timing
-    print("🎤 Using custom FFmpegAlsaTrack with real-time pacing")
-    from audio_linux import FFmpegAlsaTrack
-    alsa_dev = os.environ.get("ALSA_DEVICE", "plughw:1,0")
-    return FFmpegAlsaTrack(
-        device=alsa_dev,
-        sample_rate=16000,
-        channels=1,
-    )
-
-async def connect_to_server():
-    """Attempt to connect to the server and maintain the connection"""
-    pc = RTCPeerConnection()
-    connection_closed = asyncio.Event()
-    last_pong_time = {"time": time.time()}
-
-    # Data channel for metadata (room, etc.)
-    dc = pc.createDataChannel("meta")
-
-    @dc.on("open")
-    def on_open():
-        print(f"📡 Data channel opened, sending room={ROOM}")
-        dc.send(json.dumps({"room": ROOM, "client": "python-room-client"}))
-        # Reset pong timer on channel open
-        last_pong_time["time"] = time.time()
-
-    audio_track = build_mic_track()
+    # Linux - a fresh view onto the long-lived capture engine
+    return get_capture_engine().track()
+
+_capture_engine = None
+
+def get_capture_engine(opened=None):
+    """
+    Process-wide ALSA capture; opened once and shared by every connection.
+    ``opened`` is an engine already made by ``open_capture_device()``.
+    """
+    global _capture_engine
+    if _capture_engine is not None:
+        return _capture_engine
+
+    engine = opened or open_capture_device()
+    echo = get_echo_suppressor()
+    if echo:
+        engine.processors.append(echo)
+    engine.processors.extend(get_voice_processors())
+    engine.recorder = get_blackbox()
+    get_telemetry(engine)
+
+    _capture_engine = engine
+    return engine
+
+def open_capture_device():
+    """Open the capture device; blocking, so startup runs it in a worker thread"""
+    if CAPTURE_BACKEND == "file":
+        # No sound card: loop a WAV file in real time (tests and benchmarks)
+        from audio_linux import FileCapture
+        engine = FileCapture(CAPTURE_FILE, sample_rate=CAPTURE_SAMPLE_RATE, channels=CAPTURE_CHANNELS,
+                             ring_ms=CAPTURE_BUFFER_MS, frame_ms=CAPTURE_FRAME_MS)
+        return _configure_engine(engine)
+    if ALSA_DEVICE != "auto":
+        return _open_alsa_capture(ALSA_DEVICE)
+
+    import devices
+    try:
+        return _open_alsa_capture(devices.select_device(CAPTURE_SAMPLE_RATE, CAPTURE_CHANNELS, DEVICE_CACHE))
+    except Exception:
+        # Probe again on the next attempt: the cached choice no longer works
+        devices.forget(DEVICE_CACHE)
+        raise
+
+def _open_alsa_capture(alsa_dev):
+    """Capture engine for an ALSA device with the configured backend"""
+    if CAPTURE_BACKEND == "pyav":
+        # In-process capture: no ffmpeg subprocess, pipe or startup sleep
+        print("🎤 Using in-process PyAVAlsaCapture")
+        from audio_linux import PyAVAlsaCapture
+        engine = PyAVAlsaCapture(
+            device=alsa_dev,
+            sample_rate=CAPTURE_SAMPLE_RATE,
+            channels=CAPTURE_CHANNELS,
+            ring_ms=CAPTURE_BUFFER_MS,
+            frame_ms=CAPTURE_FRAME_MS,
+        )
+    else:
+        # Linux - fall back to custom ALSA capture with proper timing
+        print("🎤 Using custom FFmpegAlsaCapture with real-time pacing")
+        from audio_linux import FFmpegAlsaCapture
+        engine = FFmpegAlsaCapture(
+            device=alsa_dev,
+            sample_rate=CAPTURE_SAMPLE_RATE,
+            channels=CAPTURE_CHANNELS,
+            ring_ms=CAPTURE_BUFFER_MS,
+            frame_ms=CAPTURE_FRAME_MS,
+        )
+    return _configure_engine(engine)
+
+def _configure_engine(engine):
+    engine.log_level = CAPTURE_LOG_LEVEL
+    engine.log_every = CAPTURE_LOG_EVERY
+    if CAPTURE_CHANNELS > 1:
+        engine.mixer = make_array_mixer(engine)
+    if CAPTURE_LATENCY_CEILING_MS > 0:
+        from drift import DriftCompensator
+        engine.drift = DriftCompensator(engine.sample_rate, engine.frame_samples,
+                                        target_ms=CAPTURE_LATENCY_TARGET_MS, ceiling_ms=CAPTURE_LATENCY_CEILING_MS)
+    startup.mark("device_open")
+    return engine
+
+def make_array_mixer(engine):
+    """Mic-array stage that turns the captured channels into the mono frame sent upstream"""
+    from dsp import ChannelSelector, DelayAndSumBeamformer
+    mics = [int(c) for c in CAPTURE_MIC_CHANNELS.split(",")] if CAPTURE_MIC_CHANNELS else None
+    print(f"🎙️  {CAPTURE_CHANNELS}-channel capture, mics {mics or 'all'}, {ARRAY_MODE}")
+    if ARRAY_MODE == "select":
+        return ChannelSelector(mics=mics)
+    if ARRAY_MODE != "beamform":
+        raise ValueError(f"ARRAY_MODE must be 'beamform' or 'select', got {ARRAY_MODE!r}")
+    return DelayAndSumBeamformer(CAPTURE_CHANNELS, sample_rate=engine.sample_rate,
+                                 frame_samples=engine.frame_samples, mics=mics)
+
+_player = None
+
+def get_player():
+    """Process-wide bot-audio player (None when PLAYBACK_SINK=none)"""
+    global _player
+    if _player is None and PLAYBACK_SINK != "none":
+        from playback import AudioPlayer, open_sink
+        sink = open_sink(PLAYBACK_SINK, device=PLAYBACK_DEVICE, buffer_ms=PLAYBACK_BUFFER_MS)
+        _player = AudioPlayer(sink, min_delay_ms=PLAYBACK_MIN_DELAY_MS, max_delay_ms=PLAYBACK_MAX_DELAY_MS)
+    return _player
+
+_echo_suppressor = None
+
+def get_echo_suppressor():
+    """Process-wide echo suppressor fed from the player (None unless enabled)"""
+    global _echo_suppressor
+    player = get_player()
+    if _echo_suppressor is None and ECHO_SUPPRESSION and player:
+        from dsp import EchoSuppressor
+        print("🔇 Echo suppression enabled (reference: bot playback)")
+        _echo_suppressor = EchoSuppressor(
+            sample_rate=CAPTURE_SAMPLE_RATE,
+            frame_samples=CAPTURE_SAMPLE_RATE * CAPTURE_FRAME_MS // 1000,
+            playout_delay_ms=player.sink.latency_ms,
+        )
+        player.playout_listeners.append(_echo_suppressor.add_reference)
+    return _echo_suppressor
+
+def get_voice_processors():
+    """Noise suppression then AGC, as enabled; they run after echo suppression"""
+    frame_samples = CAPTURE_SAMPLE_RATE * CAPTURE_FRAME_MS // 1000
+    processors = []
+    if NOISE_SUPPRESSION:
+        from dsp import NoiseSuppressor
+        print("🔇 Noise suppression enabled")
+        processors.append(NoiseSuppressor(sample_rate=CAPTURE_SAMPLE_RATE, frame_samples=frame_samples))
+    if AGC:
+        from dsp import AutomaticGainControl
+        print(f"🔊 Automatic gain control enabled (target {AGC_TARGET_DBFS:.0f} dBFS, up to +{AGC_MAX_GAIN_DB:.0f} dB)")
+        processors.append(AutomaticGainControl(sample_rate=CAPTURE_SAMPLE_RATE, frame_samples=frame_samples,
+                                               target_dbfs=AGC_TARGET_DBFS, max_gain_db=AGC_MAX_GAIN_DB))
+    return processors
+
+_blackbox = None
+
+def get_blackbox():
+    """Process-wide rolling audio recorder (None unless BLACKBOX_MINUTES is set)"""
+    global _blackbox
+    if _blackbox is None and BLACKBOX_MINUTES > 0:
+        from blackbox import BlackBox
+        _blackbox = BlackBox(BLACKBOX_PATH, minutes=BLACKBOX_MINUTES, mic_rate=CAPTURE_SAMPLE_RATE)
+        print(f"📼 Black box: last {BLACKBOX_MINUTES:g} min of audio in {BLACKBOX_PATH}")
+    return _blackbox
+
+_telemetry = None
+
+def get_telemetry(engine=None):
+    """Process-wide capture telemetry (None unless TELEMETRY=1 and capturing through the engine)"""
+    global _telemetry
+    if _telemetry is None and TELEMETRY and engine is not None:
+        from telemetry import Telemetry
+        _telemetry = Telemetry(engine.sample_rate, engine.frame_samples, batch_ms=TELEMETRY_BATCH_MS)
+        print(f"📊 Telemetry: every {TELEMETRY_BATCH_MS}ms on the data channel")
+    return _telemetry
+
+def record_event(label: str):
+    """Mark a connection event in the black box, if it is recording"""
+    if _blackbox is not None:
+        _blackbox.mark(label)
+
+_peers = PeerPreparer()
+_recovery = RecoveryTimer()
+
+async def connect_to_server(audio_track=None, stop_event=None, room=None, peers=None, recovery=None,
+                            session_stats=None, server=None):
+    """
+    Attempt to connect to the server and maintain the connection.
+
+    ``audio_track`` defaults to a freshly built mic track; setting
+    ``stop_event`` tears the session down from outside (on-demand mode).
+    ``room``, ``peers`` and ``recovery`` default to this process's room and
+    shared state; the room simulator passes its own per virtual room. If
+    ``session_stats`` is a dict it receives ``connect_ms`` and ``rtt`` samples,
+    ``first_packet_time`` (monotonic) once the sender has sent RTP, and
+    ``dead`` with the reason if the liveness check ended the session.
+    ``server`` is the base URL to use instead of ``OFFER_URL``'s.
+    Returns True if the connection was established before it closed.
+    """
+    from aiortc import RTCSessionDescription
+
+    room = room or ROOM
+    offer_url = ServerPool.offer_url(server) if server else OFFER_URL
+    peers = peers or _peers
+    recovery = recovery or _recovery
+    started = time.monotonic()
+
+    if audio_track is None:
+        audio_track = build_mic_track()
     if not audio_track:
         raise RuntimeError("No audio track from microphone capture")
+    telemetry = get_telemetry()
+    if telemetry:
+        # Recorded as the frames leave, so records carry the pts the server sees
+        from telemetry import TelemetryTrack
+        audio_track = TelemetryTrack(audio_track, telemetry, queued=lambda: _capture_engine.occupancy)
+
+    # Everything after take() is torn down below, whether the connection
+    # failed to come up or ran its course
+    pc = dc = liveness = stop_task = adapter_task = first_packet_task = None
+    try:
+        # Peer connection, data channel and offer were normally prepared while
+        # the previous connection was still healthy
+        peer = await peers.take()
+        pc = peer.pc
+        connection_closed = asyncio.Event()
+        connected = {"ok": False}
+
+        def send_ping(timestamp):
+            if dc.readyState == "open":
+                dc.send(json.dumps({"type": "ping", "timestamp": timestamp}))
+
+        def on_dead(reason):
+            if not connection_closed.is_set():
+                print(f"⚠️  Watchdog: {reason} - reconnecting")
+                metrics.WATCHDOG_TRIPS.inc()
+                record_event(f"watchdog: {reason}")
+                if session_stats is not None:
+                    session_stats["dead"] = reason
+                connection_closed.set()
 
-    sender = pc.addTrack(audio_track)
-    print(f"🎵 Audio track added to peer connection: {audio_track}")
-
-    @pc.on("track")
-    def on_track(track):
-        print(f"📥 Received track from server: {track.kind}")
-
-        @track.on("ended")
-        async def on_ended():
-            print(f"📥 Track ended: {track.kind}")
-
-        # Start consuming the incoming audio track (bot voice)
-        async def consume_audio():
-            try:
-                while True:
-                    frame = await track.recv()
-                    # Update last activity time on incoming audio
-                    last_activity["time"] = time.time()
-                    # For now, just discard (you could play this through speakers later)
-                    if hasattr(frame, 'pts'):
-                        pass  # Silently consume
-            except Exception as e:
-                print(f"📥 Incoming audio ended: {e}")
-
-        asyncio.create_task(consume_audio())
-
-    last_activity = {"time": time.time()}
-
-    @dc.on("message")
-    def on_dc_message(message):
-        # Update last activity time on any message
-        last_activity["time"] = time.time()
-
-        # Handle pong responses
-        try:
-            data = json.loads(message)
-            if isinstance(data, dict) and data.get("type") == "pong":
-                last_pong_time["time"] = time.time()
-                print(f"🏓 Pong received")
-        except (json.JSONDecodeError, TypeError):
-            # Not JSON or not a pong, ignore
-            pass
-
-    @pc.on("connectionstatechange")
-    async def on_connectionstatechange():
-        print(f"🔗 Connection state: {pc.connectionState}")
-        if pc.connectionState in ["failed", "closed", "disconnected"]:
-            print("⚠️  Connection failed/closed/disconnected, will reconnect...")
-            connection_closed.set()
-
-    @pc.on("iceconnectionstatechange")
-    async def on_iceconnectionstatechange():
-        print(f"🧊 ICE connection state: {pc.iceConnectionState}")
-        if pc.iceConnectionState in ["failed", "closed", "disconnected"]:
-            print("⚠️  ICE connection failed/closed/disconnected, will reconnect...")
-            connection_closed.set()
-
-    offer = await pc.createOffer()
-    await pc.setLocalDescription(offer)
-
-    # Debug: check if audio is in the SDP
-    if "m=audio" in pc.localDescription.sdp:
-        print("✅ Audio media in SDP offer")
-    else:
-        print("⚠️  WARNING: No audio media in SDP offer!")
-
-    payload = {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
-
-    async with aiohttp.ClientSession() as session:
-        async with session.post(OFFER_URL, json=payload) as resp:
-            # If server returns non-JSON errors, we want to see them clearly
-            text = await resp.text()
-            if resp.status >= 400:
-                raise RuntimeError(f"Offer failed ({resp.status}): {text}")
-            answer = json.loads(text)
-
-    await pc.setRemoteDescription(RTCSessionDescription(answer["sdp"], answer["type"]))
-
-    print(f"✅ Connected via WebRTC to {OFFER_URL} (room={ROOM})")
-
-    # Ping task - send pings every HEALTHCHECK_INTERVAL seconds
-    async def ping_task():
-        print(f"🏓 Ping task started (interval: {HEALTHCHECK_INTERVAL}s)")
-        await asyncio.sleep(2)  # Wait for data channel to be ready
-
-        while not connection_closed.is_set():
+        # Pong timeout follows the measured RTT (like TCP's RTO) instead of a constant
+        liveness = LivenessMonitor(
+            send_ping,
+            on_dead,
+            interval=HEALTHCHECK_INTERVAL,
+            probes=HEALTHCHECK_PROBES,
+            audio_timeout=AUDIO_INACTIVITY_TIMEOUT,
+            estimator=RttEstimator(min_rto=HEALTHCHECK_MIN_TIMEOUT, max_rto=HEALTHCHECK_TIMEOUT),
+        )
+        # One series per room: the room simulator runs many connections in one process
+        metrics.PING_SRTT_SECONDS.set_function(lambda: liveness.rtt.srtt or 0.0, room=room)
+        metrics.PING_RTO_SECONDS.set_function(lambda: liveness.rtt.rto, room=room)
+
+        # Data channel for metadata (room, etc.)
+        dc = peer.dc
+
+        @dc.on("open")
+        def on_open():
+            print(f"📡 Data channel opened, sending room={room}")
+            telemetry = get_telemetry()
+            hello = {"room": room, "client": "python-room-client"}
+            if telemetry:
+                hello["telemetry"] = telemetry.describe()
+            dc.send(json.dumps(hello))
+            if telemetry:
+                telemetry.attach(dc)
+            # Pings start once the channel can carry them
+            liveness.ready.set()
+
+        sender = peer.transceiver.sender
+        sender.replaceTrack(audio_track)
+        print(f"🎵 Audio track added to peer connection: {audio_track}")
+
+        @pc.on("track")
+        def on_track(track):
+            print(f"📥 Received track from server: {track.kind}")
+
+            @track.on("ended")
+            async def on_ended():
+                print(f"📥 Track ended: {track.kind}")
+
+            # Start consuming the incoming audio track (bot voice)
+            player = get_player()
+            if player:
+                player.new_stream()
+            recorder = get_blackbox()
+
+            async def consume_audio():
+                try:
+                    while True:
+                        frame = await track.recv()
+                        # Inbound audio going quiet triggers an immediate ping
+                        liveness.audio_activity()
+                        if player:
+                            player.feed(frame)
+                        if recorder is not None:
+                            recorder.received(frame)
+                except Exception as e:
+                    print(f"📥 Incoming audio ended: {e}")
+
+            asyncio.create_task(consume_audio())
+
+        @dc.on("message")
+        def on_dc_message(message):
+            # Handle pong responses
             try:
-                if dc.readyState == "open":
-                    ping_msg = json.dumps({"type": "ping", "timestamp": time.time()})
-                    dc.send(ping_msg)
-                    print(f"🏓 Ping sent")
-                else:
-                    print(f"⚠️  Data channel not open (state: {dc.readyState})")
-            except Exception as e:
-                print(f"⚠️  Failed to send ping: {e}")
-
-            await asyncio.sleep(HEALTHCHECK_INTERVAL)
-
-    # Watchdog to detect dead connections
-    async def watchdog():
-        print(f"🐕 Watchdog started (checking every 5s, pong timeout: {HEALTHCHECK_TIMEOUT}s)")
-        await asyncio.sleep(5)  # Initial delay
-
-        while not connection_closed.is_set():
-            await asyncio.sleep(5)
-
-            if connection_closed.is_set():
-                break
-
-            time_since_pong = time.time() - last_pong_time["time"]
-
-            # Check connection state
+                data = json.loads(message)
+                if isinstance(data, dict) and data.get("type") == "pong":
+                    rtt = liveness.pong(data.get("timestamp"))
+                    if rtt is not None:
+                        startup.mark("first_pong")
+                        metrics.PING_RTT_SECONDS.observe(rtt)
+                        if session_stats is not None:
+                            session_stats.setdefault("rtt", []).append(rtt)
+            except (json.JSONDecodeError, TypeError):
+                # Not JSON or not a pong, ignore
+                pass
+
+        @pc.on("connectionstatechange")
+        async def on_connectionstatechange():
+            print(f"🔗 Connection state: {pc.connectionState}")
+            metrics.CONNECTION_STATE.set(pc.connectionState)
+            record_event(f"connection {pc.connectionState}")
+            if pc.connectionState == "connected":
+                connected["ok"] = True
+                if session_stats is not None:
+                    session_stats["connect_ms"] = (time.monotonic() - started) * 1000
+                recovery_ms = recovery.connected()
+                if recovery_ms is not None:
+                    metrics.RECOVERY_SECONDS.observe(recovery_ms / 1000)
+                    print(f"⏱️  Recovered {recovery_ms:.0f}ms after the disconnect was detected")
+                # Get the next connection ready while this one is healthy
+                peers.prepare_next()
             if pc.connectionState in ["failed", "closed", "disconnected"]:
-                print(f"⚠️  Watchdog: Connection state is {pc.connectionState}")
+                print("⚠️  Connection failed/closed/disconnected, will reconnect...")
                 connection_closed.set()
-                break
 
+        @pc.on("iceconnectionstatechange")
+        async def on_iceconnectionstatechange():
+            print(f"🧊 ICE connection state: {pc.iceConnectionState}")
+            metrics.ICE_STATE.set(pc.iceConnectionState)
+            record_event(f"ice {pc.iceConnectionState}")
+            if pc.iceConnectionState in ("connected", "completed"):
+                startup.mark("ice_connected")
             if pc.iceConnectionState in ["failed", "closed", "disconnected"]:
-                print(f"⚠️  Watchdog: ICE state is {pc.iceConnectionState}")
+                print("⚠️  ICE connection failed/closed/disconnected, will reconnect...")
                 connection_closed.set()
-                break
 
-            # Check pong timeout
-            if time_since_pong > HEALTHCHECK_TIMEOUT:
-                print(f"⚠️  Watchdog: No pong for {time_since_pong:.1f}s (timeout: {HEALTHCHECK_TIMEOUT}s) - reconnecting")
-                connection_closed.set()
-                break
-
-    ping_task_handle = asyncio.create_task(ping_task())
-    watchdog_task = asyncio.create_task(watchdog())
-
-    # Wait for connection to close
-    await connection_closed.wait()
+        # Debug: check if audio is in the SDP
+        if "m=audio" in pc.localDescription.sdp:
+            print("✅ Audio media in SDP offer")
+        else:
+            print("⚠️  WARNING: No audio media in SDP offer!")
+
+        # aiortc ignores fmtp parameters, so a room's own Opus settings go into the offer here
+        import codec
+        sdp = pc.localDescription.sdp
+        payload = {"sdp": codec.munge_offer(sdp) if codec.customized() else sdp, "type": pc.localDescription.type}
+
+        answer = await post_offer(offer_url, payload)
+        startup.mark("offer_posted")
+        await pc.setRemoteDescription(RTCSessionDescription(answer["sdp"], answer["type"]))
+
+        print(f"✅ Connected via WebRTC to {offer_url} (room={room})")
+
+        async def first_packet():
+            # The sender's own packet count: the track being read is not the audio leaving
+            while True:
+                for stats in (await sender.getStats()).values():
+                    if stats.type == "outbound-rtp" and stats.packetsSent:
+                        session_stats["first_packet_time"] = time.monotonic()
+                        return
+                await asyncio.sleep(0.005)
+
+        # Tear the session down when asked to from outside
+        async def stop_watcher():
+            await stop_event.wait()
+            print("💤 Session stop requested")
+            connection_closed.set()
 
-    # Cancel tasks
-    ping_task_handle.cancel()
-    watchdog_task.cancel()
-    try:
-        await ping_task_handle
-    except asyncio.CancelledError:
-        pass
-    try:
-        await watchdog_task
-    except asyncio.CancelledError:
-        pass
+        print(f"🐕 Liveness: ping every {HEALTHCHECK_INTERVAL}s, {HEALTHCHECK_PROBES} probes, "
+              f"audio inactivity {AUDIO_INACTIVITY_TIMEOUT}s")
+        liveness.start()
+        stop_task = asyncio.create_task(stop_watcher()) if stop_event else None
+        if session_stats is not None:
+            first_packet_task = asyncio.create_task(first_packet())
+        if OPUS_ADAPTIVE:
+            adapter_task = asyncio.create_task(codec.LossAdapter(codec.current()).run(pc, sender))
+
+        # Wait for connection to close
+        await connection_closed.wait()
+        recovery.disconnected()
+    finally:
+        telemetry = get_telemetry()
+        if telemetry and dc is not None:
+            telemetry.detach(dc)
+        if liveness is not None:
+            await liveness.stop()
+            metrics.PING_SRTT_SECONDS.remove(room=room)
+            metrics.PING_RTO_SECONDS.remove(room=room)
+        if stop_task:
+            stop_task.cancel()
+        if adapter_task:
+            adapter_task.cancel()
+        if first_packet_task:
+            first_packet_task.cancel()
+        if pc is not None:
+            await pc.close()
+        if hasattr(audio_track, 'stop'):
+            audio_track.stop()
+
+    return connected["ok"]
 
-    # Clean up
-    await pc.close()
 
-    # Stop audio track
-    if hasattr(audio_track, 'stop'):
-        audio_track.stop()
+async def main():
+    startup.mark("imports")
+    # Cold start: the microphone opens in a worker thread while this thread
+    # loads WebRTC and builds the first peer connection and offer
+    opening = None
+    if platform.system().lower() != "darwin" or CAPTURE_BACKEND == "file":
+        opening = asyncio.get_running_loop().run_in_executor(None, open_capture_device)
+
+    # One capture frame per Opus packet, at the room's bitrate; set before
+    # the first peer is prepared, which offers Opus only if the room opted in
+    import codec
+    codec.configure(codec.profile(OPUS_PROFILE, bitrate=OPUS_BITRATE or None, channels=OPUS_CHANNELS or None,
+                                  ptime=CAPTURE_FRAME_MS, fec=OPUS_FEC, dtx=OPUS_DTX))
+    print(f"🎼 Opus: {codec.current().describe()}{', adaptive' if OPUS_ADAPTIVE else ''}")
+
+    _peers.prepare_next()
+    get_http_session()
+    pool = ServerPool(SERVERS, interval=SERVER_PROBE_INTERVAL, hold=SERVER_HOLD)
+    probing = asyncio.ensure_future(pool.probe()) if len(SERVERS) > 1 else None
+
+    if METRICS_PORT:
+        await metrics.start_metrics_server(METRICS_PORT)
+
+    if opening is not None:
+        try:
+            get_capture_engine(await opening)
+        except Exception as e:
+            # The connect loop below retries and reports it
+            print(f"❌ Could not open the microphone: {e}")
 
+    if probing is not None:
+        await probing
+        print(f"🌐 Servers: {pool.describe()}")
+        pool.start()
 
-async def main():
-    retry_delay = 5  # seconds
+    try:
+        if SESSION_MODE == "on-demand":
+            from on_demand import run_on_demand
+
+            async def connect(session_stats, **kwargs):
+                server = pool.pick()
+                connected = False
+                try:
+                    connected = await connect_to_server(server=server, session_stats=session_stats, **kwargs)
+                finally:
+                    settle_session(pool, server, connected, session_stats)
+                return connected
+
+            await run_on_demand(
+                open_capture_track(),
+                connect,
+                idle_timeout=ON_DEMAND_IDLE_TIMEOUT,
+                buffer_ms=ON_DEMAND_BUFFER_MS,
+                preroll_ms=VAD_PREROLL_MS,
+                vad=make_vad(),
+            )
+        else:
+            await stay_connected(pool)
+    finally:
+        # The player's aplay/ffmpeg child and writer thread would outlive us
+        if _player is not None:
+            _player.close()
+
+def settle_session(pool, server, connected, session) -> bool:
+    """
+    Tell ``pool`` how a session on ``server`` ended; True if it was lost.
+    Only a failed connect or a liveness timeout holds the server down; a
+    session that connected and then closed leaves it first in line.
+    """
+    if connected and "dead" not in session:
+        pool.ok(server)
+        return False
+    pool.lost(server)
+    return True
+
+async def stay_connected(pool, connect=connect_to_server):
+    """Always-on mode: reconnect for ever, failing over to a standby server at once when there is one"""
+    backoff = Backoff(cap=RECONNECT_MAX_DELAY)
+    attempts = 0
+    server = None
 
     while True:
+        previous, server = server, pool.pick()
+        if previous is not None and server != previous:
+            print(f"↪️  Failing over from {previous} to {server}")
+            metrics.FAILOVERS.inc()
+            record_event(f"failover to {server}")
+        session = {}
         try:
-            print(f"🔌 Connecting to {SERVER}...")
-            await connect_to_server()
+            print(f"🔌 Connecting to {server}...")
+            if attempts:
+                metrics.RECONNECTS.inc()
+            record_event(f"connect attempt {attempts + 1}")
+            attempts += 1
+            connected = await connect(server=server, session_stats=session)
+            if connected:
+                backoff.reset()
         except Exception as e:
+            connected = False
             print(f"❌ Connection error: {e}")
             import traceback
             traceback.print_exc()
 
-        print(f"⏳ Waiting {retry_delay}s before reconnecting...")
+        if settle_session(pool, server, connected, session) and pool.standby(server):
+            continue  # A healthy standby is ready: no backoff
+
+        retry_delay = backoff.next_delay()
+        print(f"⏳ Waiting {retry_delay:.2f}s before reconnecting...")
         await asyncio.sleep(retry_delay)
 
 if __name__ == "__main__":
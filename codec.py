@@ -0,0 +1,357 @@
+"""
+Opus encoder settings that aiortc does not expose.
+
+aiortc encodes 20ms of stereo audio at 96 kbps into every Opus packet and
+ignores the session's fmtp parameters. ``configure(settings)`` installs an
+encoder that follows an ``OpusSettings`` for peer connections created
+afterwards:
+
+- ``ptime``: one capture frame becomes one packet. 10ms halves the audio
+  held in the encoder, and 40ms halves the packet rate.
+- ``bitrate`` and ``channels``: speech from one mic needs far less than
+  96 kbps stereo.
+- ``fec``: libopus in-band FEC, tuned for ``packet_loss`` percent loss. A
+  receiver that decodes it (libwebrtc does, aiortc doesn't) rebuilds a lost
+  packet from the next one.
+- ``dtx``: FFmpeg's libopus wrapper has no DTX switch, so the encoder drops
+  packets itself while the VAD hears no speech. Like Opus DTX, it keeps one
+  every 400ms. The receiver sees the same timestamp jump as with real DTX.
+
+A room opts in by choosing a profile other than ``default`` (aiortc's own
+settings) or by changing one of them; ``customized()`` tells. Only then is
+the offer Opus only and ``munge_offer()`` writes the settings into its Opus
+fmtp line and ``a=ptime``. Those fmtp parameters say what we want to
+*receive* (RFC 7587): ``maxaveragebitrate``, ``useinbandfec`` and ``usedtx``
+are requests to the server's encoder, which it may ignore, and bind nothing
+we send. What the client sends is set only by the ``OpusEncoder`` installed
+here. ``LossAdapter`` moves the bitrate and FEC of a live connection with
+the loss the server reports in RTCP.
+
+Two aiortc internals make this work, both behind ``_aiortc_hooks()``: the
+module-level ``aiortc.codecs.OpusEncoder`` that ``get_encoder()``
+instantiates, and the encoder ``RTCRtpSender`` keeps in a private
+attribute. They were checked against aiortc 1.13.0; on another version
+they are verified once and the overrides switched off if they are gone.
+"""
+import asyncio
+import math
+import re
+
+import aiortc.codecs
+from aiortc.codecs import opus
+from av import AudioResampler, CodecContext
+
+import metrics
+
+FRAME_DURATIONS_MS = (10, 20, 40)
+DTX_KEEPALIVE_MS = 400
+TESTED_AIORTC = "1.13.0"
+
+
+class OpusSettings:
+    def __init__(self, bitrate: int = 96000, channels: int = 2, ptime: int = 20, fec: bool = False,
+                 packet_loss: int = 10, dtx: bool = False):
+        if ptime not in FRAME_DURATIONS_MS:
+            raise ValueError(f"Opus frame duration must be one of {FRAME_DURATIONS_MS}, got {ptime}")
+        if channels not in (1, 2):
+            raise ValueError(f"Opus channels must be 1 or 2, got {channels}")
+        self.bitrate = bitrate
+        self.channels = channels
+        self.ptime = ptime
+        self.fec = fec
+        self.packet_loss = packet_loss  # expected loss in percent, only used with FEC
+        self.dtx = dtx
+
+    def copy(self) -> "OpusSettings":
+        return OpusSettings(**vars(self))
+
+    def fmtp(self) -> dict:
+        stereo = "1" if self.channels == 2 else "0"
+        return {"minptime": "10", "useinbandfec": str(int(self.fec)), "usedtx": str(int(self.dtx)),
+                "maxaveragebitrate": str(self.bitrate), "stereo": stereo, "sprop-stereo": stereo}
+
+    def describe(self) -> str:
+        parts = [f"{self.bitrate / 1000:g} kbps {'stereo' if self.channels == 2 else 'mono'}", f"{self.ptime}ms"]
+        if self.fec:
+            parts.append(f"FEC for {self.packet_loss}% loss")
+        if self.dtx:
+            parts.append("DTX")
+        return ", ".join(parts)
+
+
+_settings = OpusSettings()
+
+# Starting points for a room's settings. "default" is what aiortc sends on
+# its own; "speech" is one mic's speech at a third of the bytes
+# (scripts/bench_opus.py)
+PROFILES = {
+    "default": {},
+    "speech": {"bitrate": 32000, "channels": 1},
+}
+
+
+def profile(name: str, **overrides) -> OpusSettings:
+    """The settings of profile ``name``, with the ``overrides`` that are not None"""
+    if name not in PROFILES:
+        raise ValueError(f"Unknown Opus profile {name!r}, expected one of {', '.join(PROFILES)}")
+    return OpusSettings(**{**PROFILES[name], **{k: v for k, v in overrides.items() if v is not None}})
+
+
+def customized(settings: OpusSettings = None) -> bool:
+    """Whether ``settings`` (default: the configured ones) differ from aiortc's own, ptime aside"""
+    settings = settings or _settings
+    return {**vars(settings), "ptime": 20} != vars(OpusSettings())
+
+
+class OpusEncoder(opus.OpusEncoder):
+    """
+    aiortc's encoder following an ``OpusSettings``. ``reconfigure()`` takes
+    effect at the next frame; a live encoder can change bitrate, FEC and
+    DTX, while ptime and channels stay as they were when it was created.
+
+    FFmpeg only hands libopus its options when the codec is opened, so a
+    change opens a fresh libopus context. That drops the old one's state
+    (lookahead, prediction), which can be heard as a faint click at the
+    switch; settings equal to the current ones are skipped, and
+    ``LossAdapter`` changes them at most once per interval.
+    """
+
+    def __init__(self):
+        self.first_packet_pts = None
+        self.settings = None
+        self.dropped = 0
+        self._pending = None
+        self._vad = None
+        self._since_sent_ms = DTX_KEEPALIVE_MS  # The first packet always goes out
+        self._apply(_settings.copy())
+
+    def reconfigure(self, settings: OpusSettings):
+        self._pending = settings.copy()
+
+    def _apply(self, settings: OpusSettings):
+        if self.settings is not None:
+            settings.ptime, settings.channels = self.settings.ptime, self.settings.channels
+        layout = "stereo" if settings.channels == 2 else "mono"
+        # A fresh context: libopus reads its options when it is opened. Its
+        # packets keep following the frame pts, so RTP timestamps carry on.
+        codec = CodecContext.create("libopus", "w")
+        codec.bit_rate = settings.bitrate
+        codec.format = "s16"
+        codec.layout = layout
+        codec.sample_rate = opus.SAMPLE_RATE
+        codec.time_base = opus.TIME_BASE
+        codec.options = {
+            "application": "voip",
+            "frame_duration": str(settings.ptime),
+            "fec": "1" if settings.fec else "0",
+            "packet_loss": str(settings.packet_loss if settings.fec else 0),
+        }
+        if self.settings is None:
+            self.resampler = AudioResampler(
+                format="s16",
+                layout=layout,
+                rate=opus.SAMPLE_RATE,
+                frame_size=opus.SAMPLE_RATE * settings.ptime // 1000,
+            )
+        if settings.dtx and self._vad is None:
+            from vad import EnergyVad
+            self._vad = EnergyVad(attack_frames=1)
+        elif not settings.dtx:
+            self._vad = None
+        self.codec = codec
+        self.settings = settings
+
+    def encode(self, frame, force_keyframe: bool = False):
+        pending, self._pending = self._pending, None
+        if pending is not None and vars(pending) != vars(self.settings):
+            self._apply(pending)
+        vad = self._vad
+        speech = True
+        if vad is not None:
+            samples = frame.to_ndarray().reshape(-1)[::frame.layout.nb_channels]
+            speech = vad.update(samples)
+
+        payloads, timestamp = super().encode(frame, force_keyframe)
+        if payloads and vad is not None:
+            if speech or self._since_sent_ms >= DTX_KEEPALIVE_MS:
+                self._since_sent_ms = 0
+            else:
+                self._since_sent_ms += self.settings.ptime * len(payloads)
+                self.dropped += len(payloads)
+                return [], None
+        return payloads, timestamp
+
+
+_hooks_ok = None
+
+
+def _aiortc_hooks() -> bool:
+    """
+    Whether the aiortc internals used here are there. Checked once: trusted
+    on the tested version, otherwise verified by building an encoder
+    through ``get_encoder()`` and looking for the sender's encoder slot.
+    """
+    global _hooks_ok
+    if _hooks_ok is None:
+        version = getattr(aiortc, "__version__", "?")
+        if version == TESTED_AIORTC:
+            _hooks_ok = True
+        else:
+            from aiortc import RTCRtpCodecParameters, RTCRtpSender
+
+            original = aiortc.codecs.OpusEncoder
+            try:
+                aiortc.codecs.OpusEncoder = OpusEncoder
+                params = RTCRtpCodecParameters(mimeType="audio/opus", clockRate=48000, channels=2)
+                _hooks_ok = (isinstance(aiortc.codecs.get_encoder(params), OpusEncoder)
+                             and "_RTCRtpSender__encoder" in RTCRtpSender.__init__.__code__.co_names)
+            except Exception:
+                _hooks_ok = False
+            finally:
+                aiortc.codecs.OpusEncoder = original
+            if not _hooks_ok:
+                print(f"⚠️  aiortc {version} has changed its encoder internals (tested with {TESTED_AIORTC}); "
+                      f"using aiortc's default Opus settings")
+    return _hooks_ok
+
+
+def _live_encoder(sender):
+    """The encoder ``sender`` created on its first frame, or None"""
+    if not _aiortc_hooks():
+        return None
+    return getattr(sender, "_RTCRtpSender__encoder", None)
+
+
+def configure(settings: OpusSettings):
+    """Opus settings for peer connections created from now on"""
+    global _settings
+    _settings = settings.copy()
+    if _aiortc_hooks():
+        aiortc.codecs.OpusEncoder = OpusEncoder  # get_encoder() looks the class up here
+
+
+def current() -> OpusSettings:
+    return _settings.copy()
+
+
+def set_frame_duration(ms: int):
+    """Opus packet duration for peer connections created from now on"""
+    settings = current()
+    configure(OpusSettings(**{**vars(settings), "ptime": ms}))
+
+
+def prefer_opus(transceiver):
+    """Offer Opus only, so the mic is never sent as G.722 or G.711"""
+    from aiortc import RTCRtpSender
+
+    codecs = [c for c in RTCRtpSender.getCapabilities("audio").codecs if c.mimeType.lower() == "audio/opus"]
+    transceiver.setCodecPreferences(codecs)
+
+
+def munge_offer(sdp: str, settings: OpusSettings = None) -> str:
+    """
+    ``sdp`` with ``settings`` in its Opus fmtp line and a matching
+    ``a=ptime``. These ask the server what to send us; they don't change
+    what our encoder sends.
+    """
+    settings = settings or _settings
+    match = re.search(r"^a=rtpmap:(\d+) opus/48000", sdp, re.MULTILINE | re.IGNORECASE)
+    if not match:
+        return sdp
+    pt = match.group(1)
+    lines = sdp.split("\r\n")
+    rtpmap = next(i for i, line in enumerate(lines) if line.startswith(f"a=rtpmap:{pt} "))
+    params = {}
+    fmtp = next((i for i, line in enumerate(lines) if line.startswith(f"a=fmtp:{pt} ")), None)
+    if fmtp is not None:
+        for param in lines[fmtp].split(" ", 1)[1].split(";"):
+            key, _, value = param.strip().partition("=")
+            params[key] = value
+    params.update(settings.fmtp())
+    line = f"a=fmtp:{pt} " + ";".join(f"{key}={value}" for key, value in params.items())
+    if fmtp is None:
+        lines.insert(rtpmap + 1, line)
+        fmtp = rtpmap + 1
+    else:
+        lines[fmtp] = line
+
+    # a=ptime belongs to the audio m-section
+    start = max(i for i in range(fmtp + 1) if lines[i].startswith("m="))
+    end = next((i for i in range(fmtp + 1, len(lines)) if lines[i].startswith("m=")), len(lines))
+    section = [i for i in range(start, end) if lines[i].startswith("a=ptime:")]
+    if section:
+        lines[section[0]] = f"a=ptime:{settings.ptime}"
+    else:
+        lines.insert(fmtp + 1, f"a=ptime:{settings.ptime}")
+    return "\r\n".join(lines)
+
+
+class LossAdapter:
+    """
+    Bitrate and FEC follow the loss reported in RTCP receiver reports.
+
+    Loss is usually a congested link, so an interval at or above
+    ``high_loss`` switches FEC on (tuned for the measured loss) and steps the
+    bitrate down towards ``min_bitrate``. After ``calm`` intervals in a row
+    below ``low_loss`` the bitrate steps back up, and once it is back at the
+    configured rate FEC returns to its configured state too.
+    """
+
+    def __init__(self, settings: OpusSettings, min_bitrate: int = 16000, high_loss: float = 0.03,
+                 low_loss: float = 0.01, interval: float = 2.0, calm: int = 3):
+        self.base = settings.copy()
+        self.settings = settings.copy()
+        self.min_bitrate = min(min_bitrate, settings.bitrate)
+        self.high_loss = high_loss
+        self.low_loss = low_loss
+        self.interval = interval
+        self.calm = calm
+        self.loss = 0.0
+        self._expected = None
+        self._lost = None
+        self._quiet = 0
+
+    def update(self, expected: int, lost: int) -> bool:
+        """Cumulative packets the receiver expected and lost; True if the settings changed"""
+        if self._expected is None or expected <= self._expected:
+            self._expected, self._lost = expected, lost
+            return False
+        self.loss = max(lost - self._lost, 0) / (expected - self._expected)
+        self._expected, self._lost = expected, lost
+
+        settings = self.settings
+        before = vars(settings).copy()
+        if self.loss >= self.high_loss:
+            self._quiet = 0
+            settings.fec = True
+            settings.packet_loss = max(self.base.packet_loss if self.base.fec else 0, math.ceil(self.loss * 100))
+            settings.bitrate = max(self.min_bitrate, int(settings.bitrate * 0.8))
+        elif self.loss < self.low_loss:
+            self._quiet += 1
+            if self._quiet >= self.calm and settings.bitrate < self.base.bitrate:
+                settings.bitrate = min(self.base.bitrate, int(settings.bitrate * 1.25))
+            if settings.bitrate == self.base.bitrate:
+                settings.fec, settings.packet_loss = self.base.fec, self.base.packet_loss
+        else:
+            self._quiet = 0
+        return vars(settings) != before
+
+    async def run(self, pc, sender):
+        """Poll ``pc.getStats()`` and reconfigure ``sender``'s encoder until cancelled"""
+        encoder = None
+        metrics.OPUS_BITRATE.set(self.settings.bitrate)
+        while True:
+            await asyncio.sleep(self.interval)
+            report = await pc.getStats()
+            changed = False
+            for stats in report.values():
+                if stats.type == "remote-inbound-rtp" and stats.kind == "audio":
+                    changed = self.update(stats.packetsReceived + stats.packetsLost, stats.packetsLost)
+                    metrics.UPLINK_LOSS_RATIO.set(self.loss)
+            live = _live_encoder(sender)
+            if isinstance(live, OpusEncoder) and (changed or live is not encoder):
+                encoder = live
+                encoder.reconfigure(self.settings)
+            if changed:
+                metrics.OPUS_BITRATE.set(self.settings.bitrate)
+                print(f"📶 Uplink loss {self.loss:.1%}: Opus now {self.settings.describe()}")
@@ -0,0 +1,240 @@
+"""
+Capture device discovery with a cache, so ``ALSA_DEVICE=auto`` opens the
+right microphone at boot whatever order USB enumerated the cards in.
+
+Cards and their capture PCMs are read from /proc/asound (a few small file
+reads), including a USB card's native capture formats. Each card gets an
+identity that survives renumbering: USB vendor:product and the USB port it
+is plugged into, or the driver and card id for built-in cards. The first
+time a card is seen it is probed with a short ffmpeg capture; all new cards
+are probed in parallel. Results and the chosen card are cached as JSON, so
+on later boots the device is picked from the cache without any probing.
+
+The device is returned by card name (``plughw:CARD=ArrayUAC10,DEV=0``), not
+number, so it stays right when another card takes its number.
+
+    python devices.py            # list capture devices (probing new ones)
+    python devices.py --refresh  # probe them all again
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import subprocess
+import time
+from typing import Optional
+
+import numpy as np
+
+ASOUND = "/proc/asound"
+CACHE_PATH = os.path.expanduser("~/.cache/voice-assistant-client/devices.json")
+FALLBACK = "plughw:1,0"
+PROBE_SECONDS = 0.3
+
+_CARD_LINE = re.compile(r"^\s*(\d+) \[(\S+)\s*\]: (\S+) - (.*)$")
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def _capture_formats(stream: str) -> dict:
+    """Native format, channels and rates from the Capture section of a USB stream file"""
+    formats = {"formats": [], "channels": [], "rates": []}
+    section = stream.split("\nCapture:", 1)
+    if len(section) < 2:
+        return formats
+    for line in section[1].splitlines():
+        if line and not line.startswith(" "):
+            break  # Next section
+        key, _, value = line.strip().partition(": ")
+        if key == "Format" and value not in formats["formats"]:
+            formats["formats"].append(value)
+        elif key == "Channels" and int(value) not in formats["channels"]:
+            formats["channels"].append(int(value))
+        elif key == "Rates":
+            for rate in re.findall(r"\d+", value):
+                if int(rate) not in formats["rates"]:
+                    formats["rates"].append(int(rate))
+    return formats
+
+
+def enumerate_devices(root: str = ASOUND) -> list:
+    """Capture PCMs of all sound cards, as dicts with an ``identity`` and ``device``"""
+    lines = _read(os.path.join(root, "cards")).splitlines()
+    devices = []
+    for i, line in enumerate(lines):
+        match = _CARD_LINE.match(line)
+        if not match:
+            continue
+        number, card_id, driver, name = match.groups()
+        long_name = lines[i + 1].strip() if i + 1 < len(lines) else ""
+        card_dir = os.path.join(root, f"card{number}")
+        usbid = _read(os.path.join(card_dir, "usbid")).strip()
+        if usbid:
+            port = long_name.rsplit(" at ", 1)[-1].split(",")[0] if " at " in long_name else ""
+            identity = f"usb:{usbid}@{port}"
+        else:
+            identity = f"{driver}:{card_id}"
+        for pcm in sorted(glob.glob(os.path.join(card_dir, "pcm*c"))):
+            dev = int(re.search(r"pcm(\d+)c$", pcm).group(1))
+            stream = _read(os.path.join(card_dir, f"stream{dev}"))
+            devices.append({
+                "identity": f"{identity}/{dev}",
+                "card": int(number),
+                "card_id": card_id,
+                "name": name.strip(),
+                "usb": bool(usbid),
+                "device": f"plughw:CARD={card_id},DEV={dev}",
+                "hw": f"hw:CARD={card_id},DEV={dev}",
+                **_capture_formats(stream),
+            })
+    return devices
+
+
+def probe_devices(devices: list, sample_rate: int = 16000, channels: int = 1,
+                  seconds: float = PROBE_SECONDS) -> dict:
+    """
+    Capture ``seconds`` from every device at once; returns identity -> result
+    with ``ok``, ``peak`` (0 means digital silence: nothing connected) and ``error``.
+    """
+    procs = {}
+    for device in devices:
+        # Native format where /proc/asound knows it, so the probe also proves the hw device opens
+        native = device["channels"] and device["rates"]
+        rate = sample_rate if not native or sample_rate in device["rates"] else device["rates"][0]
+        ch = device["channels"][0] if native else channels
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error",
+               "-f", "alsa", "-sample_rate", str(rate), "-channels", str(ch),
+               "-i", device["hw"] if native else device["device"],
+               "-t", str(seconds), "-f", "s16le", "pipe:1"]
+        try:
+            procs[device["identity"]] = (subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE),
+                                         rate * ch * seconds)
+        except FileNotFoundError:
+            return {}  # No ffmpeg: selection falls back to what /proc/asound says
+
+    results = {}
+    for identity, (proc, expected) in procs.items():
+        try:
+            out, err = proc.communicate(timeout=seconds + 3)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            out, err = proc.communicate()
+        samples = np.frombuffer(out[:len(out) // 2 * 2], dtype=np.int16)
+        results[identity] = {
+            "ok": samples.size >= expected / 2,
+            "peak": int(np.abs(samples.astype(np.int32)).max()) if samples.size else 0,
+            "error": err.decode(errors="replace").strip().splitlines()[-1] if err.strip() else "",
+            "probed_at": time.time(),
+        }
+    return results
+
+
+def _rank(device: dict, channels: int):
+    probe = device.get("probe") or {}
+    return (
+        probe.get("ok", True),           # Opens and delivers audio (or not probed)
+        probe.get("peak", 1) > 0,        # Not digital silence
+        not device["channels"] or max(device["channels"]) >= channels,
+        device["usb"],                   # USB mic arrays over on-board codecs
+        -device["card"],
+    )
+
+
+def load_cache(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(path: str, cache: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp, path)
+
+
+def discover(sample_rate: int = 16000, channels: int = 1, cache_path: str = CACHE_PATH, root: str = ASOUND,
+             refresh: bool = False, probe=probe_devices) -> Optional[dict]:
+    """
+    The capture device to use: the cached choice if that card is still
+    present, otherwise the best device after probing the ones not seen before.
+    Returns None when there are no capture devices.
+    """
+    devices = enumerate_devices(root)
+    cache = {} if refresh else load_cache(cache_path)
+    known = cache.get("devices", {})
+    present = {device["identity"]: device for device in devices}
+
+    selected = present.get(cache.get("selected"))
+    if selected is not None and cache.get("wanted") == [sample_rate, channels]:
+        selected["probe"] = known[selected["identity"]].get("probe")
+        return selected
+
+    # Probe cards not seen before, and again the ones that failed last time (e.g. busy)
+    new = [device for device in devices
+           if not (known.get(device["identity"], {}).get("probe") or {}).get("ok")]
+    results = probe(new, sample_rate=sample_rate, channels=channels) if new else {}
+    for device in devices:
+        device["probe"] = results.get(device["identity"], known.get(device["identity"], {}).get("probe"))
+        known[device["identity"]] = device
+    if not devices:
+        return None
+
+    best = max(devices, key=lambda device: _rank(device, channels))
+    save_cache(cache_path, {"selected": best["identity"], "wanted": [sample_rate, channels], "devices": known})
+    return best
+
+
+def forget(cache_path: str = CACHE_PATH):
+    """Drop the cached choice and probe results after the chosen device failed to open"""
+    cache = load_cache(cache_path)
+    if cache.get("selected"):
+        cache.get("devices", {}).pop(cache.pop("selected"), None)
+        save_cache(cache_path, cache)
+
+
+def select_device(sample_rate: int = 16000, channels: int = 1, cache_path: str = CACHE_PATH) -> str:
+    """ALSA device name for ``ALSA_DEVICE=auto``"""
+    started = time.monotonic()
+    device = discover(sample_rate=sample_rate, channels=channels, cache_path=cache_path)
+    if device is None:
+        print(f"⚠️  No capture devices found in {ASOUND}, trying {FALLBACK}")
+        return FALLBACK
+    print(f"🎤 Capture device: {device['name']} ({device['device']}, {device['identity']}) "
+          f"picked in {(time.monotonic() - started) * 1000:.0f}ms")
+    return device["device"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List capture devices and the one ALSA_DEVICE=auto picks")
+    parser.add_argument("--refresh", action="store_true", help="probe every device again")
+    parser.add_argument("--rate", type=int, default=int(os.environ.get("CAPTURE_SAMPLE_RATE", "16000")))
+    parser.add_argument("--channels", type=int, default=int(os.environ.get("CAPTURE_CHANNELS", "1")))
+    parser.add_argument("--cache", default=os.environ.get("DEVICE_CACHE", CACHE_PATH))
+    args = parser.parse_args()
+
+    best = discover(args.rate, args.channels, cache_path=args.cache, refresh=args.refresh)
+    if best is None:
+        print(f"❌ No capture devices in {ASOUND}")
+        return
+    for device in load_cache(args.cache)["devices"].values():
+        probe = device.get("probe") or {}
+        status = "✅" if probe.get("ok") else "❌" if probe else "❔"
+        native = f"{device['formats']} {device['channels']}ch {device['rates']}Hz" if device["channels"] else ""
+        print(f"{status} {device['device']:<32} {device['name']}  {native}")
+        print(f"   {device['identity']}  peak={probe.get('peak', '-')} {probe.get('error', '')}")
+    print(f"\n👉 ALSA_DEVICE=auto uses {best['device']}")
+
+
+if __name__ == "__main__":
+    main()
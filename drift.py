@@ -0,0 +1,123 @@
+"""
+Capture clock drift compensation.
+
+A sound card's sample clock never runs at exactly the nominal rate of the
+host clock. Frames are paced (and sent) at the host rate, so a device that
+runs 0.1% fast adds 1ms of backlog every second - about a minute and a half
+of latency per day, until the ring overflows. A slow device starves the
+reader instead.
+
+``DriftCompensator`` estimates the skew from how fast the device's samples
+arrive against the host's monotonic clock, and tells the track how many
+samples more (or fewer) than a frame to consume for each frame it sends.
+The track resamples those into one frame (``stretch``): one sample per
+frame during speech, which is an inaudible 0.3% pitch change at 16kHz, and
+up to a quarter frame per frame during silence.
+"""
+import collections
+
+import numpy as np
+
+
+class DriftCompensator:
+    """
+    Keeps the capture backlog at or below ``target_ms``.
+
+    ``observe()`` is called for every frame. The device's delivered sample
+    count (the ring's write position) is sampled once a second and fitted
+    over ``window_s`` to estimate ``skew``, which is corrected continuously.
+    On top of that, backlog that has persisted for a whole second
+    (``queued``, its minimum over the second, so bursty delivery doesn't
+    count) above the target is worked off over ``catchup_s``. Fits beyond
+    ``max_skew`` come from a stalled source, not a clock, and are ignored. Above
+    ``ceiling_ms`` corrections of up to an eighth of a frame are made even
+    during speech.
+    """
+
+    def __init__(self, sample_rate: int, frame_samples: int, target_ms: int = 60, ceiling_ms: int = 200,
+                 window_s: float = 30.0, catchup_s: float = 5.0, quiet_level: float = 300.0,
+                 max_skew: float = 0.005):
+        self.sample_rate = sample_rate
+        self.frame_samples = frame_samples
+        self.target = sample_rate * target_ms // 1000
+        self.ceiling = sample_rate * ceiling_ms // 1000
+        self.window_s = window_s
+        self.catchup_frames = catchup_s * sample_rate / frame_samples
+        self.quiet_level = quiet_level
+        self.max_skew = max_skew
+
+        self.skew = 0.0  # device rate / nominal rate - 1
+        self.queued = 0  # backlog that persisted through the last second, in samples
+        self.adjusted = 0  # net samples dropped (positive) or repeated (negative)
+        self.quiet = False  # the last frame was silence: bigger steps are inaudible
+        self._points = collections.deque()
+        self._floor = None
+        self._floor_start = None
+        self._debt = 0.0
+
+    @property
+    def wants_quiet(self) -> bool:
+        """Whether knowing if the frame is silent would allow a bigger step"""
+        return abs(self._debt) >= 2
+
+    def check_quiet(self, samples: np.ndarray):
+        self.quiet = float(np.abs(samples).mean()) < self.quiet_level
+
+    def observe(self, now: float, produced: int, backlog: int, on_schedule: bool):
+        """
+        Account one sent frame: ``produced`` samples delivered by the device
+        so far, ``backlog`` of them not yet sent, at monotonic time ``now``.
+        ``on_schedule`` is False while a backlog from a reconnect is being
+        sent back-to-back, which is not latency to correct.
+        """
+        if self._floor_start is None or now - self._floor_start >= 1.0:
+            if self._floor is not None:
+                self.queued = self._floor
+                self._add_point(now, produced)
+            self._floor, self._floor_start = backlog, now
+        elif backlog < self._floor:
+            self._floor = backlog
+
+        self._debt += self.skew * self.frame_samples
+        if on_schedule and self.queued > self.target:
+            self._debt += (self.queued - self.target) / self.catchup_frames
+        limit = self.frame_samples // 4
+        if not -limit <= self._debt <= limit:
+            self._debt = limit if self._debt > 0 else -limit
+
+    def _add_point(self, now: float, produced: int):
+        points = self._points
+        points.append((now, produced))
+        while now - points[0][0] > self.window_s:
+            points.popleft()
+        if len(points) >= 5:
+            t, n = np.array(points, dtype=np.float64).T
+            skew = np.polyfit(t - t[0], n - n[0], 1)[0] / self.sample_rate - 1
+            # Crystals are off by parts per million; more means the source stalled
+            if abs(skew) <= self.max_skew:
+                self.skew = float(skew)
+
+    def step(self) -> int:
+        """Samples to consume beyond one frame for the next frame (negative: fewer)"""
+        if -1 < self._debt < 1:
+            return 0
+        if self.quiet:
+            limit = self.frame_samples // 4
+        elif self.queued > self.ceiling:
+            limit = self.frame_samples // 8
+        else:
+            limit = 1
+        extra = int(min(max(self._debt, -limit), limit))
+        self._debt -= extra
+        self.adjusted += extra
+        return extra
+
+
+def stretch(source: np.ndarray, out: np.ndarray, channels: int):
+    """Linearly resample interleaved int16 ``source`` to fill ``out``"""
+    src = source.reshape(-1, channels)
+    dst = out.reshape(-1, channels)
+    positions = np.arange(dst.shape[0]) * (src.shape[0] / dst.shape[0])
+    index = np.arange(src.shape[0])
+    for c in range(channels):
+        dst[:, c] = np.rint(np.interp(positions, index, src[:, c]))
@@ -0,0 +1,480 @@
+import collections
+import time
+
+import numpy as np
+
+
+class StftBlock:
+    """
+    Streaming STFT with 50% overlap (window = 2 frames, hop = 1 frame).
+
+    ``analyze()`` takes one new frame and returns the spectrum of the last two
+    frames; ``synthesize()`` overlap-adds the processed spectrum and returns
+    the finished previous frame. Output therefore lags input by one frame, and
+    a unity gain reconstructs the input exactly (sqrt-Hann analysis/synthesis).
+    """
+
+    def __init__(self, frame_samples: int):
+        self.n = frame_samples
+        self.window = np.sqrt(np.hanning(2 * frame_samples + 1)[:-1]).astype(np.float32)
+        self._block = np.zeros(2 * frame_samples, dtype=np.float32)
+        self._tail = np.zeros(frame_samples, dtype=np.float32)
+        self._windowed = np.empty(2 * frame_samples, dtype=np.float32)
+
+    def analyze(self, frame: np.ndarray) -> np.ndarray:
+        n = self.n
+        self._block[:n] = self._block[n:]
+        self._block[n:] = frame
+        np.multiply(self._block, self.window, out=self._windowed)
+        return np.fft.rfft(self._windowed)
+
+    def synthesize(self, spectrum: np.ndarray) -> np.ndarray:
+        n = self.n
+        y = np.fft.irfft(spectrum, 2 * n).astype(np.float32)
+        y *= self.window
+        out = self._tail + y[:n]
+        self._tail[:] = y[n:]
+        return out
+
+
+def to_int16(x: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(x), -32768, 32767).astype(np.int16)
+
+
+class EchoSuppressor:
+    """
+    Suppresses the assistant's own voice in the mic signal.
+
+    The played-out audio is fed in with ``add_reference()``. The echo delay is
+    estimated periodically with GCC-PHAT over the last ``window_ms`` of mic and
+    reference; each frame then gets a per-bin spectral-subtraction gain from a
+    Wiener estimate of the echo path applied to the aligned reference.
+    Processing adds one frame of latency (see StftBlock).
+
+    The reference is taken when audio is handed to the sink, which plays it
+    ``playout_delay_ms`` later (its buffer), so the delay search covers
+    ``max_delay_ms`` of acoustic and capture path on top of that.
+
+    Double talk (the user speaking over the assistant) is detected by the
+    coherence between mic and aligned reference, weighted towards the bins
+    the reference occupies: an echo is a linear copy of the reference, near
+    speech is not. While it drops below ``double_talk_coherence`` (and for
+    ``double_talk_hold`` frames after) the echo path estimate is frozen, so
+    near speech does not corrupt it, and the gain switches to a gentler
+    power subtraction that keeps more of the near speech.
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_samples: int = 320, max_delay_ms: int = 500,
+                 window_ms: int = 500, estimate_every: int = 10, over_subtraction: float = 1.5,
+                 gain_floor: float = 0.05, smoothing: float = 0.1, playout_delay_ms: int = 0,
+                 double_talk_coherence: float = 0.5, double_talk_over_subtraction: float = 2.0,
+                 double_talk_hold: int = 5, coherence_smoothing: float = 0.3):
+        self.sample_rate = sample_rate
+        self.n = frame_samples
+        self.max_delay = sample_rate * (max_delay_ms + playout_delay_ms) // 1000
+        self.window = sample_rate * window_ms // 1000
+        self.estimate_every = estimate_every
+        self.over_subtraction = over_subtraction
+        self.gain_floor = gain_floor
+        self.smoothing = smoothing
+        self.double_talk_coherence = double_talk_coherence
+        self.double_talk_over_subtraction = double_talk_over_subtraction
+        self.double_talk_hold = double_talk_hold
+        self.coherence_smoothing = coherence_smoothing
+
+        self._ref = np.zeros(self.max_delay + self.window + 2 * frame_samples, dtype=np.float32)
+        self._mic = np.zeros(self.window, dtype=np.float32)
+        self._ref_stft = StftBlock(frame_samples)
+        self._mic_stft = StftBlock(frame_samples)
+        bins = frame_samples + 1
+        # Echo path estimate (frozen in double talk)
+        self._sxy = np.zeros(bins, dtype=np.complex64)
+        self._syy = np.full(bins, 1e-3, dtype=np.float32)
+        # Faster statistics for the double-talk detector (always updated)
+        self._cxy = np.zeros(bins, dtype=np.complex64)
+        self._cxx = np.full(bins, 1e-3, dtype=np.float32)
+        self._cyy = np.full(bins, 1e-3, dtype=np.float32)
+        self.gain = np.ones(bins, dtype=np.float32)  # Per-bin gain applied to the last frame
+        self._nfft = 1 << int(np.ceil(np.log2(2 * self.window + self.max_delay)))
+        self._frames = 0
+        self._hold = 0
+
+        self.delay = 0
+        self.delay_confidence = 0.0
+        self.coherence = 1.0
+        self.double_talk = False
+        self.double_talk_frames = 0
+
+    def add_reference(self, samples: np.ndarray, sample_rate: int):
+        """Append audio that was just played to the speaker"""
+        x = samples.astype(np.float32)
+        if sample_rate != self.sample_rate:
+            ratio = sample_rate / self.sample_rate
+            if ratio == int(ratio):
+                x = x[:x.size - x.size % int(ratio)].reshape(-1, int(ratio)).mean(axis=1)
+            else:
+                positions = np.arange(0, x.size, ratio)
+                x = np.interp(positions, np.arange(x.size), x).astype(np.float32)
+        n = min(x.size, self._ref.size)
+        self._ref[:-n] = self._ref[n:]
+        self._ref[-n:] = x[-n:]
+
+    def _estimate_delay(self):
+        """GCC-PHAT lag between the mic window and the reference history"""
+        ref = self._ref[-(self.window + self.max_delay):]
+        if float(np.dot(ref, ref)) < 1e3 * ref.size:
+            return  # Nothing has been played recently
+        mic_spec = np.fft.rfft(self._mic, self._nfft)
+        ref_spec = np.fft.rfft(ref, self._nfft)
+        cross = ref_spec * np.conj(mic_spec)
+        magnitude = np.abs(cross)
+        # PHAT weighting, regularized so empty bands do not add noise
+        cross /= magnitude + 1e-2 * magnitude.max()
+        corr = np.fft.irfft(cross, self._nfft)[:self.max_delay + 1]
+        peak = int(np.argmax(corr))
+        confidence = float(corr[peak] / (np.abs(corr).mean() + 1e-9))
+        if confidence > 8:
+            self.delay = self.max_delay - peak
+            self.delay_confidence = confidence
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Suppress echo in one frame of int16 mono mic samples"""
+        n = self.n
+        x = samples.astype(np.float32)
+        self._mic[:-n] = self._mic[n:]
+        self._mic[-n:] = x
+
+        self._frames += 1
+        if self._frames % self.estimate_every == 0:
+            self._estimate_delay()
+
+        # Reference frame aligned with this mic frame
+        end = self._ref.size - self.delay
+        mic_spec = self._mic_stft.analyze(x)
+        ref_spec = self._ref_stft.analyze(self._ref[end - n:end])
+
+        ref_power = (ref_spec.real ** 2 + ref_spec.imag ** 2).astype(np.float32)
+        mic_power = (mic_spec.real ** 2 + mic_spec.imag ** 2).astype(np.float32)
+        cross = mic_spec * np.conj(ref_spec)
+
+        # Double talk: mic and reference stop being coherent where the reference has energy
+        c = self.coherence_smoothing
+        self._cxy += c * (cross - self._cxy)
+        self._cxx += c * (mic_power - self._cxx)
+        self._cyy += c * (ref_power - self._cyy)
+        coherence = (self._cxy.real ** 2 + self._cxy.imag ** 2) / (self._cxx * self._cyy)
+        self.coherence = float(np.dot(coherence, self._cyy) / float(self._cyy.sum()))
+        if self.coherence < self.double_talk_coherence:
+            self._hold = self.double_talk_hold
+        elif self._hold:
+            self._hold -= 1
+        self.double_talk = self._hold > 0
+
+        if not self.double_talk:
+            a = self.smoothing
+            self._sxy += a * (cross - self._sxy)
+            self._syy += a * (ref_power - self._syy)
+        else:
+            self.double_talk_frames += 1
+
+        # |H| per bin, then subtract the predicted echo
+        echo_mag = np.abs(self._sxy) / (self._syy + 1e-3) * np.sqrt(ref_power)
+        ratio = echo_mag / (np.abs(mic_spec) + 1e-3)
+        if self.double_talk:
+            gain = np.sqrt(np.maximum(1.0 - self.double_talk_over_subtraction * ratio ** 2, self.gain_floor ** 2))
+        else:
+            gain = np.maximum(1.0 - self.over_subtraction * ratio, self.gain_floor)
+        self.gain += 0.5 * (gain - self.gain)
+
+        return to_int16(self._mic_stft.synthesize(mic_spec * self.gain))
+
+
+def deinterleave(samples: np.ndarray, channels: int) -> np.ndarray:
+    """(channels, n) strided view of interleaved samples - no copy"""
+    return samples.reshape(-1, channels).T
+
+
+def _frame_db(x: np.ndarray) -> np.ndarray:
+    """Per-channel frame power in dB for a (channels, n) float32 block"""
+    return 10 * np.log10(np.einsum("ij,ij->i", x, x) / x.shape[1] + 1e-3)
+
+
+class ChannelSelector:
+    """
+    Sends the microphone with the best SNR.
+
+    Each channel's noise floor follows its frame power down quickly and up
+    slowly; the channel with the largest power above its floor wins once it
+    has led by ``switch_db`` for ``hold_frames`` frames, so the choice does
+    not flap between mics. ``mics`` picks the raw mic channels out of the
+    captured ones (e.g. skip a ReSpeaker's processed and playback channels).
+    """
+
+    def __init__(self, mics=None, switch_db: float = 3.0, hold_frames: int = 10):
+        self.mics = None if mics is None else np.asarray(mics)
+        self.switch_db = switch_db
+        self.hold_frames = hold_frames
+        self.current = 0
+        self.snr_db = None
+        self._floor = None
+        self._pending = 0
+
+    def process(self, frames: np.ndarray) -> np.ndarray:
+        """(channels, n) int16 frames -> int16 mono frame"""
+        if self.mics is not None:
+            frames = frames[self.mics]
+        power = _frame_db(frames.astype(np.float32))
+        if self._floor is None:
+            self._floor = power.copy()
+        rate = np.where(power < self._floor, 0.2, 0.005)
+        self._floor += rate * (power - self._floor)
+        self.snr_db = power - self._floor
+
+        best = int(np.argmax(self.snr_db))
+        if best != self.current and self.snr_db[best] > self.snr_db[self.current] + self.switch_db:
+            self._pending += 1
+            if self._pending >= self.hold_frames:
+                self.current = best
+                self._pending = 0
+        else:
+            self._pending = 0
+        return np.ascontiguousarray(frames[self.current])
+
+
+class DelayAndSumBeamformer:
+    """
+    Steers a microphone array at the loudest source and averages the mics.
+
+    Each channel's delay relative to ``reference`` is estimated with GCC-PHAT
+    over the last ``window_frames`` frames, for all channels in one batch of
+    FFTs; a channel keeps its previous delay unless the correlation peak
+    clearly stands out (noise alone is not correlated across mics). Channels
+    are then aligned by integer-sample shifts and averaged, which keeps the
+    source and averages down uncorrelated noise (up to 10*log10(mics) dB).
+    Output lags input by ``max_delay_ms``.
+
+    Delay estimation is the expensive part. Its cost is averaged per frame,
+    and if that exceeds ``budget`` of the frame duration the estimation
+    interval doubles (up to every ``max_estimate_every`` frames), so the
+    beamformer stays real-time on slow hardware.
+    """
+
+    def __init__(self, channels: int, sample_rate: int = 16000, frame_samples: int = 320, mics=None,
+                 reference: int = 0, max_delay_ms: float = 1.0, window_frames: int = 8,
+                 estimate_every: int = 10, budget: float = 0.2, max_estimate_every: int = 640):
+        self.mics = None if mics is None else np.asarray(mics)
+        self.channels = channels if mics is None else len(mics)
+        self.n = frame_samples
+        self.reference = reference
+        self.max_delay = int(np.ceil(sample_rate * max_delay_ms / 1000))
+        self.estimate_every = estimate_every
+        self.max_estimate_every = max_estimate_every
+        self.budget_seconds = budget * frame_samples / sample_rate
+
+        d = self.max_delay
+        self.delays = np.zeros(self.channels, dtype=np.int64)
+        self._block = np.zeros((self.channels, 2 * d + frame_samples), dtype=np.float32)
+        self._window = np.zeros((self.channels, window_frames * frame_samples), dtype=np.float32)
+        self._nfft = 1 << int(np.ceil(np.log2(2 * self._window.shape[1])))
+        self._columns = np.arange(frame_samples)
+        self._frames = 0
+        self.cost_per_frame = 0.0
+        self.over_budget = 0
+
+    def _estimate_delays(self):
+        spectra = np.fft.rfft(self._window, self._nfft, axis=1)
+        cross = spectra * np.conj(spectra[self.reference])
+        magnitude = np.abs(cross)
+        cross /= magnitude + 1e-2 * magnitude.max(axis=1, keepdims=True)
+        corr = np.fft.irfft(cross, self._nfft, axis=1)
+        d = self.max_delay
+        lags = np.concatenate([corr[:, -d:], corr[:, :d + 1]], axis=1)  # lag -d .. +d
+        peaks = np.argmax(lags, axis=1)
+        confidence = lags[np.arange(self.channels), peaks] / (np.abs(corr).mean(axis=1) + 1e-9)
+        confident = confidence > 8
+        self.delays[confident] = peaks[confident] - d
+
+    def process(self, frames: np.ndarray) -> np.ndarray:
+        """(channels, n) int16 frames -> int16 mono frame"""
+        if self.mics is not None:
+            frames = frames[self.mics]
+        n, d = self.n, self.max_delay
+        block = self._block
+        block[:, :2 * d] = block[:, n:]
+        block[:, 2 * d:] = frames
+        self._window[:, :-n] = self._window[:, n:]
+        self._window[:, -n:] = block[:, 2 * d:]
+
+        self._frames += 1
+        if self._frames % self.estimate_every == 0:
+            start = time.perf_counter()
+            self._estimate_delays()
+            self._charge(time.perf_counter() - start)
+
+        # Channel i lags the reference by delays[i]: read it delays[i] later
+        index = (d + self.delays)[:, None] + self._columns
+        aligned = np.take_along_axis(block, index, axis=1)
+        return to_int16(aligned.mean(axis=0))
+
+    def _charge(self, seconds: float):
+        """Account an estimation's cost over the frames it serves; back off if over budget"""
+        self.cost_per_frame = seconds / self.estimate_every
+        if self.cost_per_frame > self.budget_seconds and self.estimate_every < self.max_estimate_every:
+            self.over_budget += 1
+            self.estimate_every *= 2
+            print(f"⚠️  Beamformer over CPU budget ({self.cost_per_frame * 1e6:.0f}us/frame), "
+                  f"re-steering every {self.estimate_every} frames")
+
+
+class NoiseSuppressor:
+    """
+    Removes stationary noise (HVAC, fans, hum) with a per-bin Wiener gain.
+
+    The noise spectrum is learned from frames whose power is within
+    ``speech_db`` of the noise estimate, i.e. during silence, and can only
+    creep upwards during speech. Each bin's gain comes from a
+    decision-directed a-priori SNR (Ephraim-Malah), which keeps the
+    "musical noise" of plain spectral subtraction down, and never drops
+    below ``floor_db`` so the residual noise sounds natural. All work
+    buffers are preallocated; processing adds one frame of latency (see
+    StftBlock).
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_samples: int = 320, floor_db: float = -18.0,
+                 speech_db: float = 3.0, noise_rate: float = 0.02, smoothing: float = 0.9):
+        self.sample_rate = sample_rate
+        self.n = frame_samples
+        self.floor = 10 ** (floor_db / 20)
+        self.speech_ratio = 10 ** (speech_db / 10)
+        self.noise_rate = noise_rate
+        self.smoothing = smoothing
+        self.speech = False
+
+        bins = frame_samples + 1
+        self._stft = StftBlock(frame_samples)
+        self._noise = None
+        self._power = np.empty(bins, dtype=np.float32)
+        self._posterior = np.empty(bins, dtype=np.float32)
+        self._prior = np.empty(bins, dtype=np.float32)
+        self._clean = np.zeros(bins, dtype=np.float32)  # Previous frame's clean power / noise
+        self._gain = np.ones(bins, dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Denoise one frame of int16 mono samples"""
+        spectrum = self._stft.analyze(samples)
+        power = self._power
+        np.multiply(spectrum.real, spectrum.real, out=power)
+        power += spectrum.imag ** 2
+        if self._noise is None:
+            self._noise = power + 1.0  # First frame: assume it is noise
+
+        noise = self._noise
+        self.speech = float(power.sum()) > self.speech_ratio * float(noise.sum())
+        if self.speech:
+            noise *= 1.0005  # Lets a rising noise floor be followed even while someone talks
+        else:
+            noise += self.noise_rate * (power - noise)
+        np.maximum(noise, 1.0, out=noise)
+
+        # Decision-directed a-priori SNR, then the Wiener gain
+        posterior, prior, gain = self._posterior, self._prior, self._gain
+        np.divide(power, noise, out=posterior)
+        np.subtract(posterior, 1.0, out=prior)
+        np.maximum(prior, 0.0, out=prior)
+        prior *= 1.0 - self.smoothing
+        prior += self.smoothing * self._clean
+        np.add(prior, 1.0, out=gain)
+        np.divide(prior, gain, out=gain)
+        np.maximum(gain, self.floor, out=gain)
+        np.multiply(posterior, gain, out=self._clean)
+        self._clean *= gain
+
+        spectrum *= gain
+        return to_int16(self._stft.synthesize(spectrum))
+
+
+class AutomaticGainControl:
+    """
+    Brings speech to ``target_dbfs`` and keeps peaks under ``limit_dbfs``.
+
+    The noise floor is the quietest frame of roughly the last
+    ``noise_window_frames`` (minimum statistics), whatever the speech
+    decision, so steady noise is measured even when it never looks like a
+    pause. The speech level is measured on frames at least ``speech_db``
+    above that floor; between words the gain holds. Gain moves at most
+    ``rise_db_per_s`` upwards and ``fall_db_per_s`` downwards, ramped per
+    sample within each frame, and is capped at ``max_gain_db`` and so that
+    the amplified noise stays ``min_snr_db`` below the target (a noisy room
+    gets little or no gain). A frame whose peak would exceed the limit
+    has its gain lowered at once (the limiter), and the slower release
+    takes it from there.
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_samples: int = 320, target_dbfs: float = -20.0,
+                 max_gain_db: float = 24.0, limit_dbfs: float = -1.0, speech_db: float = 10.0,
+                 rise_db_per_s: float = 6.0, fall_db_per_s: float = 40.0, min_snr_db: float = 25.0,
+                 noise_window_frames: int = 150):
+        self.n = frame_samples
+        self.target_dbfs = target_dbfs
+        self.max_gain_db = max_gain_db
+        self.limit = 32768 * 10 ** (limit_dbfs / 20)
+        self.speech_db = speech_db
+        self.min_snr_db = min_snr_db
+        frame_s = frame_samples / sample_rate
+        self.rise_db = rise_db_per_s * frame_s
+        self.fall_db = fall_db_per_s * frame_s
+
+        self.gain_db = 0.0
+        self.level_dbfs = -90.0
+        self.noise_dbfs = -60.0
+        self.limited = 0
+        # Running minimum over noise_window_frames, kept as the minima of 6 blocks
+        self._block_frames = max(1, noise_window_frames // 6)
+        self._block_min = np.inf
+        self._block_count = 0
+        self._minima = collections.deque(maxlen=6)
+        self._gain = 1.0
+        self._ramp = (np.arange(1, frame_samples + 1) / frame_samples).astype(np.float32)
+        self._curve = np.empty(frame_samples, dtype=np.float32)
+        self._out = np.empty(frame_samples, dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Level one frame of int16 mono samples"""
+        x = self._out
+        x[:] = samples
+        level = 10 * np.log10(float(np.dot(x, x)) / x.size / 32768 ** 2 + 1e-10)
+
+        self._block_min = min(self._block_min, level)
+        self._block_count += 1
+        if self._block_count == self._block_frames:
+            self._minima.append(self._block_min)
+            self._block_min = np.inf
+            self._block_count = 0
+        self.noise_dbfs = min(self._block_min, min(self._minima, default=np.inf))
+
+        noise_cap = max(self.target_dbfs - self.min_snr_db - self.noise_dbfs, 0.0)
+        if level > self.noise_dbfs + self.speech_db:
+            # Speech: steer the gain towards the target at the allowed rate
+            self.level_dbfs = level
+            wanted = min(self.target_dbfs - level, self.max_gain_db, noise_cap)
+            step = wanted - self.gain_db
+            self.gain_db += min(step, self.rise_db) if step > 0 else max(step, -self.fall_db)
+        elif self.gain_db > noise_cap:
+            # The room got noisier between words: don't keep amplifying it
+            self.gain_db = max(noise_cap, self.gain_db - self.fall_db)
+
+        start, end = self._gain, 10 ** (self.gain_db / 20)
+        peak = float(np.abs(x).max()) * max(start, end)
+        if peak > self.limit:
+            # Limiter: whatever the level says, this frame must not clip
+            scale = self.limit / peak
+            start *= scale
+            end *= scale
+            self.gain_db = 20 * np.log10(end)
+            self.limited += 1
+        curve = self._curve
+        np.multiply(self._ramp, end - start, out=curve)
+        curve += start
+        x *= curve
+        self._gain = end
+        return to_int16(x)
@@ -0,0 +1,119 @@
+"""
+Several servers: pick the fastest healthy one and fail over without waiting.
+
+Each server's offer endpoint is probed with a GET, all at once. A server
+that answers at all (the endpoint only takes POST, so 405 is healthy) is up,
+and the answer time ranks it. The probes go through the shared keep-alive
+HTTP session, so repeating them every ``interval`` seconds also keeps a warm
+connection to the standby servers. The client stays on a server until its
+connection is lost (it could not connect, or the liveness check gave
+up on it); the server is then held down for ``hold`` seconds, and
+if another healthy server is known the client fails over to it straight
+away, using the peer connection ``PeerPreparer`` already has ready. A
+failover then costs one offer POST plus the ICE/DTLS handshake.
+"""
+import asyncio
+import time
+
+from reconnect import get_http_session
+
+
+class ServerPool:
+    def __init__(self, servers, probe_timeout: float = 1.0, interval: float = 10.0, hold: float = 30.0):
+        self.servers = [server.rstrip("/") for server in servers]
+        self.probe_timeout = probe_timeout
+        self.interval = interval
+        self.hold = hold
+        self.healthy = {server: None for server in self.servers}  # None until probed
+        self.rtt = {server: None for server in self.servers}
+        self.current = None
+        self._held_until = {server: 0.0 for server in self.servers}
+        self._task = None
+
+    @staticmethod
+    def offer_url(server: str) -> str:
+        return f"{server}/api/offer"
+
+    async def _probe_one(self, server: str):
+        import aiohttp
+
+        start = time.monotonic()
+        try:
+            timeout = aiohttp.ClientTimeout(total=self.probe_timeout)
+            async with get_http_session().get(self.offer_url(server), timeout=timeout) as resp:
+                await resp.read()
+                healthy = resp.status < 500 and resp.status != 404
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            healthy = False
+        rtt = time.monotonic() - start
+        self.healthy[server] = healthy
+        if healthy:
+            previous = self.rtt[server]
+            self.rtt[server] = rtt if previous is None else 0.5 * previous + 0.5 * rtt
+
+    async def probe(self):
+        """Probe every server concurrently"""
+        await asyncio.gather(*(self._probe_one(server) for server in self.servers))
+
+    def describe(self) -> str:
+        parts = []
+        for server in self.servers:
+            if self.healthy[server]:
+                parts.append(f"{server} {self.rtt[server] * 1000:.0f}ms")
+            else:
+                parts.append(f"{server} down")
+        return ", ".join(parts)
+
+    def start(self):
+        """Keep probing in the background (only worth it with a standby)"""
+        if len(self.servers) > 1 and self._task is None:
+            self._task = asyncio.ensure_future(self._monitor())
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.probe()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _rank(self, server: str):
+        rtt = self.rtt[server]
+        return (server != self.current, rtt if rtt is not None else float("inf"), self.servers.index(server))
+
+    def pick(self) -> str:
+        """
+        The server to connect to: the current one while it works, else the
+        fastest healthy one that isn't held down after losing a connection.
+        """
+        now = time.monotonic()
+        available = [server for server in self.servers if self._held_until[server] <= now]
+        candidates = [server for server in available if self.healthy[server] is not False] or available
+        if not candidates:
+            # Everything was lost recently: the one held longest ago comes back first
+            candidates = [min(self.servers, key=self._held_until.get)]
+        self.current = min(candidates, key=self._rank)
+        return self.current
+
+    def lost(self, server: str):
+        """The connection to ``server`` failed or its liveness check gave up"""
+        if len(self.servers) > 1:
+            self._held_until[server] = time.monotonic() + self.hold
+
+    def ok(self, server: str):
+        """A session on ``server`` connected and ended for another reason: it is fine to go back to"""
+        self._held_until[server] = 0.0
+        self.healthy[server] = True
+
+    def standby(self, server: str):
+        """A healthy server other than ``server`` that can be tried at once, if any"""
+        now = time.monotonic()
+        ready = [other for other in self.servers
+                 if other != server and self.healthy[other] and self._held_until[other] <= now]
+        return min(ready, key=self._rank) if ready else None
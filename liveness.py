@@ -0,0 +1,167 @@
+import asyncio
+import time
+
+
+class RttEstimator:
+    """
+    Smoothed RTT and retransmission-style timeout, as in TCP (RFC 6298).
+
+    ``rto`` starts at ``initial`` and, once samples arrive, is
+    ``srtt + 4 * rttvar`` clamped to [min_rto, max_rto].
+    """
+
+    def __init__(self, min_rto: float = 0.2, max_rto: float = 30.0, initial: float = 1.0):
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial
+        self.samples = 0
+
+    def sample(self, rtt: float):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.samples += 1
+        self.rto = min(max(self.srtt + 4 * self.rttvar, self.min_rto), self.max_rto)
+
+
+class LivenessMonitor:
+    """
+    Event-driven ping/pong liveness for one connection.
+
+    A ping is sent every ``interval`` seconds and waits at most one RTO for
+    its pong. A missed pong is re-probed immediately with the timeout
+    doubled; after ``probes`` misses in a row ``on_dead(reason)`` is called,
+    unless inbound audio is still arriving (a slow data channel path is not
+    a dead link). Inbound audio that stops for ``audio_timeout`` seconds
+    triggers a probe straight away instead of waiting for the next interval,
+    so a dead server is noticed within about a second of its audio stopping.
+
+    The ping's ``timestamp`` on the wire is wall-clock time, which the server
+    echoes and may log. RTTs are measured from the monotonic send time kept
+    here for each timestamp sent, so an NTP step can't distort them.
+    """
+
+    def __init__(self, send_ping, on_dead, interval: float = 1.0, probes: int = 2,
+                 audio_timeout: float = 0.5, estimator: RttEstimator = None):
+        self.send_ping = send_ping
+        self.on_dead = on_dead
+        self.interval = interval
+        self.probes = probes
+        self.audio_timeout = audio_timeout
+        self.rtt = estimator or RttEstimator()
+        self.ready = asyncio.Event()
+        self._pong = asyncio.Event()
+        self._outstanding = None
+        self._sent = {}  # wire timestamp -> monotonic send time, for the current probe
+        self._last_audio = None
+        self._audio_stalled = False
+        self._task = None
+        self.pings = 0
+        self.missed = 0
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def pong(self, timestamp=None):
+        """
+        A pong arrived; ``timestamp`` is the echoed ping time if the server
+        sent it. Returns the RTT sample, or None if it was not usable.
+        """
+        if self._outstanding is None:
+            return None  # Late answer to a ping we already gave up on
+        # The echoed timestamp identifies the ping (a re-probe may be answered
+        # by the earlier ping's pong); without it the pong belongs to the
+        # latest ping
+        rtt = time.monotonic() - self._sent.get(timestamp, self._outstanding)
+        self._outstanding = None
+        self._sent.clear()
+        self._pong.set()
+        if not 0 <= rtt < self.rtt.max_rto:
+            return None
+        self.rtt.sample(rtt)
+        return rtt
+
+    def audio_activity(self):
+        """Call for every inbound media frame"""
+        self._last_audio = time.monotonic()
+        if self._audio_stalled:
+            self._audio_stalled = False
+            print("📥 Inbound audio resumed")
+
+    def _audio_flowing(self) -> bool:
+        return self._last_audio is not None and time.monotonic() - self._last_audio < self.audio_timeout
+
+    def _audio_deadline(self):
+        if self._last_audio is None or self._audio_stalled:
+            return None
+        return self._last_audio + self.audio_timeout
+
+    async def _idle(self, seconds: float):
+        """Sleep until the next ping is due or inbound audio stalls"""
+        wake_at = time.monotonic() + seconds
+        while True:
+            now = time.monotonic()
+            deadline = self._audio_deadline()
+            if deadline is not None and deadline <= now:
+                self._audio_stalled = True
+                print(f"📥 No inbound audio for {now - self._last_audio:.2f}s - probing server")
+                return
+            if now >= wake_at:
+                return
+            until = wake_at if deadline is None else min(wake_at, deadline)
+            await asyncio.sleep(until - now)
+
+    async def _probe(self) -> bool:
+        """Ping and wait for the pong, re-probing with a doubled timeout"""
+        timeout = self.rtt.rto
+        for attempt in range(self.probes):
+            self._pong.clear()
+            self._outstanding = time.monotonic()
+            timestamp = time.time()
+            self._sent[timestamp] = self._outstanding
+            self.pings += 1
+            self.send_ping(timestamp)
+            try:
+                await asyncio.wait_for(self._pong.wait(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                self.missed += 1
+                print(f"⚠️  No pong within {timeout * 1000:.0f}ms (probe {attempt + 1}/{self.probes})")
+                timeout = min(timeout * 2, self.rtt.max_rto)
+        self._outstanding = None
+        self._sent.clear()
+        return False
+
+    async def _run(self):
+        try:
+            await asyncio.wait_for(self.ready.wait(), self.rtt.max_rto)
+        except asyncio.TimeoutError:
+            self.on_dead(f"data channel did not open within {self.rtt.max_rto:.0f}s")
+            return
+
+        while True:
+            started = time.monotonic()
+            if not await self._probe():
+                if self._audio_flowing():
+                    print(f"⚠️  No pong after {self.probes} probes, but audio is still arriving - staying connected")
+                else:
+                    self.on_dead(f"no pong after {self.probes} probes and no inbound audio "
+                                 f"(srtt={self._srtt_ms()}, rto={self.rtt.rto * 1000:.0f}ms)")
+                    return
+            await self._idle(self.interval - (time.monotonic() - started))
+
+    def _srtt_ms(self):
+        return "n/a" if self.rtt.srtt is None else f"{self.rtt.srtt * 1000:.1f}ms"
@@ -0,0 +1,211 @@
+"""
+Minimal Prometheus-style metrics for the audio and connection hot paths.
+
+Updating a metric is a couple of attribute operations (plus a bisect for
+histograms), so instrumenting the 50 Hz capture loop costs a few
+microseconds per frame - see scripts/bench_metrics.py. The text endpoint is
+only started when METRICS_PORT is set, and aiohttp's server is only
+imported then.
+"""
+import bisect
+import math
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        yield f"{self.name} {self.value}"
+
+
+class Gauge:
+    """
+    A value that is set directly, or read from ``set_function()`` at scrape
+    time. Functions given labels (e.g. ``room=...``) are separate series, so
+    several connections in one process each report their own.
+    """
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+        self._fn = None
+        self._series = {}
+        self._labelled = False
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, fn, **labels):
+        if labels:
+            self._labelled = True
+            self._series[tuple(sorted(labels.items()))] = fn
+        else:
+            self._fn = fn
+
+    def remove(self, **labels):
+        """Drop the series with these labels, e.g. when its connection ends"""
+        self._series.pop(tuple(sorted(labels.items())), None)
+
+    @staticmethod
+    def _read(fn):
+        try:
+            return fn()
+        except Exception:
+            return math.nan
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        if not self._labelled:
+            yield f"{self.name} {self.value if self._fn is None else self._read(self._fn)}"
+        for labels, fn in list(self._series.items()):
+            label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+            yield f"{self.name}{{{label_text}}} {self._read(fn)}"
+
+
+class StateGauge:
+    """One 0/1 series per known state, e.g. for ICE and connection state"""
+
+    def __init__(self, name: str, help: str, states):
+        self.name = name
+        self.help = help
+        self.states = list(states)
+        self.state = None
+
+    def set(self, state: str):
+        self.state = state
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for state in self.states:
+            yield f'{self.name}{{state="{state}"}} {1 if state == self.state else 0}'
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets):
+        self.name = name
+        self.help = help
+        self.bounds = sorted(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        cumulative = 0
+        for bound, n in zip(self.bounds, self.counts):
+            cumulative += n
+            yield f'{self.name}_bucket{{le="{bound}"}} {cumulative}'
+        yield f'{self.name}_bucket{{le="+Inf"}} {self.count}'
+        yield f"{self.name}_sum {self.sum}"
+        yield f"{self.name}_count {self.count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help):
+        return self._add(Counter(name, help))
+
+    def gauge(self, name, help):
+        return self._add(Gauge(name, help))
+
+    def state_gauge(self, name, help, states):
+        return self._add(StateGauge(name, help, states))
+
+    def histogram(self, name, help, buckets):
+        return self._add(Histogram(name, help, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Seconds, from 0.1 ms to 1 s - spans both "instant" and a whole frame late
+FRAME_BUCKETS = (0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.04, 0.1, 0.25, 1.0)
+RTT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONNECTION_STATES = ("new", "connecting", "connected", "disconnected", "failed", "closed")
+ICE_STATES = ("new", "checking", "connected", "completed", "disconnected", "failed", "closed")
+
+# Capture
+CAPTURE_READ_SECONDS = REGISTRY.histogram(
+    "voice_capture_read_seconds", "Time recv() waited for the next captured frame", FRAME_BUCKETS)
+CAPTURE_PACING_SECONDS = REGISTRY.histogram(
+    "voice_capture_pacing_sleep_seconds", "Time recv() slept to pace frames to real time", FRAME_BUCKETS)
+CAPTURE_PROCESS_SECONDS = REGISTRY.histogram(
+    "voice_capture_process_seconds", "Time spent in capture processors and building the AudioFrame",
+    FRAME_BUCKETS)
+CAPTURE_FRAMES = REGISTRY.counter("voice_capture_frames_total", "Frames sent upstream")
+CAPTURE_SHORT_READS = REGISTRY.counter(
+    "voice_capture_short_reads_total", "Frames that were not fully captured when they were due")
+CAPTURE_OVERRUNS = REGISTRY.gauge(
+    "voice_capture_overruns", "Times the capture ring overflowed and dropped the oldest audio")
+CAPTURE_BUFFERED_SECONDS = REGISTRY.gauge(
+    "voice_capture_buffered_seconds", "Audio captured but not yet sent (pipe/ring backlog)")
+CAPTURE_QUEUED_SECONDS = REGISTRY.gauge(
+    "voice_capture_queued_seconds", "Capture latency: the smallest backlog over the last second")
+CAPTURE_CLOCK_SKEW_PPM = REGISTRY.gauge(
+    "voice_capture_clock_skew_ppm", "Estimated capture device clock rate error against the host clock")
+CAPTURE_DRIFT_ADJUSTED_SAMPLES = REGISTRY.gauge(
+    "voice_capture_drift_adjusted_samples", "Net samples dropped (positive) or repeated to correct clock drift")
+
+# Connection
+CONNECTION_STATE = REGISTRY.state_gauge(
+    "voice_connection_state", "Peer connection state", CONNECTION_STATES)
+ICE_STATE = REGISTRY.state_gauge("voice_ice_state", "ICE connection state", ICE_STATES)
+RECONNECTS = REGISTRY.counter("voice_reconnects_total", "Connection attempts after the first")
+FAILOVERS = REGISTRY.counter("voice_failovers_total", "Reconnects that switched to another server")
+WATCHDOG_TRIPS = REGISTRY.counter("voice_watchdog_trips_total", "Connections torn down by the watchdog")
+RECOVERY_SECONDS = REGISTRY.histogram(
+    "voice_recovery_seconds", "Time from detecting a dead connection to being connected again",
+    (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+PING_RTT_SECONDS = REGISTRY.histogram("voice_ping_rtt_seconds", "Data channel ping/pong round trip", RTT_BUCKETS)
+PING_SRTT_SECONDS = REGISTRY.gauge(
+    "voice_ping_srtt_seconds", "Smoothed ping round trip of each room's current connection")
+PING_RTO_SECONDS = REGISTRY.gauge("voice_ping_rto_seconds", "Current adaptive pong timeout of each room's connection")
+UPLINK_LOSS_RATIO = REGISTRY.gauge(
+    "voice_uplink_loss_ratio", "Mic packet loss the server reported over the last adaptation interval")
+OPUS_BITRATE = REGISTRY.gauge("voice_opus_bitrate_bps", "Opus target bitrate of the mic stream")
+
+
+async def handle_metrics(request):
+    from aiohttp import web
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(port: int, host: str = "0.0.0.0"):
+    """Serve /metrics in the running event loop; returns the runner for cleanup"""
+    from aiohttp import web
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"📈 Metrics on http://{host}:{port}/metrics")
+    return runner
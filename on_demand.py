@@ -0,0 +1,193 @@
+import asyncio
+import collections
+import statistics
+import time
+from fractions import Fraction
+
+from aiortc import MediaStreamTrack
+
+from vad import EnergyVad
+
+
+class ReplayTrack(MediaStreamTrack):
+    """
+    Track handed to an on-demand peer connection.
+
+    It starts with the audio buffered since just before the speech onset and
+    then follows the live capture. Buffered frames are returned as fast as the
+    sender pulls them, so the backlog drains faster than real time.
+    ``speaking`` is the capture VAD's decision for the frame ``recv()`` last
+    returned; the pre-onset backlog counts as part of the utterance.
+    ``unsent()`` is what is still queued, for a retry if the session fails.
+    """
+    kind = "audio"
+
+    def __init__(self, backlog, max_frames: int, onset_time: float):
+        super().__init__()
+        self._frames = collections.deque((frame, True) for frame in backlog)
+        self._max_frames = max_frames
+        self._available = asyncio.Event()
+        if self._frames:
+            self._available.set()
+        self._pts = 0
+        self.onset_time = onset_time
+        self.dropped = 0
+        self.speaking = False
+
+    def push(self, frame, speech: bool = True):
+        """Feed one live frame and its VAD decision (called by the local capture pump)"""
+        if len(self._frames) >= self._max_frames:
+            # Session is taking too long to come up - keep the newest audio
+            self._frames.popleft()
+            self.dropped += 1
+        self._frames.append((frame, speech))
+        self._available.set()
+
+    @property
+    def backlog(self) -> int:
+        return len(self._frames)
+
+    def unsent(self) -> list:
+        return [frame for frame, _ in self._frames]
+
+    async def recv(self):
+        while not self._frames:
+            self._available.clear()
+            await self._available.wait()
+
+        frame, self.speaking = self._frames.popleft()
+        frame.pts = self._pts
+        frame.time_base = Fraction(1, frame.sample_rate)
+        self._pts += frame.samples
+        return frame
+
+
+class OnDemandCapture:
+    """
+    Keeps the mic running locally and decides when a session is needed.
+
+    Every frame goes through a VAD and into a bounded buffer. ``onset`` is
+    set when speech starts; while a session is live its ReplayTrack gets
+    every new frame. If a session fails while the user is still talking the
+    onset stays set, so it is retried with the audio it did not send.
+    """
+
+    def __init__(self, mic_track: MediaStreamTrack, buffer_ms: int, preroll_ms: int, vad=None):
+        self.mic_track = mic_track
+        self.vad = vad or EnergyVad()
+        self.buffer_ms = buffer_ms
+        self.preroll_ms = preroll_ms
+        self._recent = collections.deque()
+        self._unsent = []
+        self.onset = asyncio.Event()
+        self.onset_time = None
+        self.last_speech_time = time.monotonic()
+        self.speaking = False
+        self.replay = None
+
+    def _frames_for(self, ms, frame):
+        return max(1, ms * frame.sample_rate // (1000 * frame.samples))
+
+    async def run(self):
+        """Pull frames from the mic forever"""
+        while True:
+            frame = await self.mic_track.recv()
+            speech = self.vad.update(frame.to_ndarray().reshape(-1))
+            now = time.monotonic()
+
+            if self.replay is not None:
+                self.replay.push(frame, speech)
+            else:
+                self._recent.append(frame)
+                while len(self._recent) > self._frames_for(self.preroll_ms, frame) + 1:
+                    self._recent.popleft()
+
+            if speech:
+                self.last_speech_time = now
+                if not self.speaking and self.replay is None:
+                    self.onset_time = now
+                    self.onset.set()
+            self.speaking = speech
+
+    def start_session(self) -> ReplayTrack:
+        """Create the track for a new session, seeded with the pre-onset audio"""
+        frame_ms = 20
+        if self._recent:
+            frame_ms = 1000 * self._recent[0].samples // self._recent[0].sample_rate
+        max_frames = max(self.buffer_ms // frame_ms, 1)
+        backlog = self._unsent + list(self._recent)
+        self.replay = ReplayTrack(backlog[-max_frames:], max_frames, self.onset_time)
+        self._recent = collections.deque()
+        self._unsent = []
+        return self.replay
+
+    def end_session(self, failed: bool = False):
+        """
+        The session is over. A failed one while speech is still going on
+        keeps the onset set, and its unsent audio is replayed by the retry.
+        """
+        if failed and self.speaking:
+            print("🗣️  Still talking after the failed session, retrying")
+            self._unsent = self.replay.unsent()
+        else:
+            self.onset.clear()
+        self.replay = None
+
+
+async def run_on_demand(mic_track, connect, idle_timeout: float, buffer_ms: int, preroll_ms: int, vad=None):
+    """
+    Connect only while someone is talking.
+
+    ``connect(audio_track=..., stop_event=..., session_stats=...)`` runs one
+    WebRTC session and returns False if it never connected; we set
+    ``stop_event`` once no speech has been heard for ``idle_timeout``. The
+    session puts the monotonic time its first RTP packet left in
+    ``session_stats["first_packet_time"]``.
+    """
+    capture = OnDemandCapture(mic_track, buffer_ms=buffer_ms, preroll_ms=preroll_ms, vad=vad)
+    pump = asyncio.create_task(capture.run())
+    latencies = []
+
+    print(f"💤 On-demand mode: listening locally (idle timeout {idle_timeout:.0f}s)")
+    try:
+        while True:
+            onset = asyncio.ensure_future(capture.onset.wait())
+            await asyncio.wait({onset, pump}, return_when=asyncio.FIRST_COMPLETED)
+            if pump.done():
+                onset.cancel()
+                pump.result()  # Surface mic failures
+            print("🗣️  Speech detected, connecting...")
+            replay = capture.start_session()
+            stop_event = asyncio.Event()
+            session = {}
+
+            async def idle_watcher():
+                while True:
+                    idle = time.monotonic() - capture.last_speech_time
+                    if idle >= idle_timeout:
+                        print(f"💤 No speech for {idle:.0f}s, closing session")
+                        stop_event.set()
+                        return
+                    await asyncio.sleep(idle_timeout - idle)
+
+            watcher = asyncio.create_task(idle_watcher())
+            failed = True
+            try:
+                failed = await connect(audio_track=replay, stop_event=stop_event, session_stats=session) is False
+            except Exception as e:
+                print(f"❌ On-demand session error: {e}")
+            finally:
+                watcher.cancel()
+            if failed:
+                # Don't hammer a dead server on every utterance
+                await asyncio.sleep(1)
+            capture.end_session(failed)
+
+            if "first_packet_time" in session:
+                latency = (session["first_packet_time"] - replay.onset_time) * 1000
+                latencies.append(latency)
+                print(f"⏱️  Speech onset → first packet: {latency:.0f}ms "
+                      f"(median {statistics.median(latencies):.0f}ms over {len(latencies)} sessions, "
+                      f"{replay.dropped} frames dropped)")
+    finally:
+        pump.cancel()
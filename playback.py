@@ -0,0 +1,310 @@
+import asyncio
+import collections
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+import wave
+from typing import Optional
+
+import av
+import numpy as np
+
+
+class NullSink:
+    """
+    Discards audio, counting what was written. ``latency_ms`` is how long a
+    sink holds audio before it is heard (the echo suppressor's delay search
+    starts there).
+    """
+
+    def __init__(self, sample_rate: int = 48000):
+        self.sample_rate = sample_rate
+        self.samples_written = 0
+        self.latency_ms = 0
+
+    def write(self, samples: np.ndarray, silent: bool = False):
+        self.samples_written += samples.size
+
+    def close(self):
+        pass
+
+
+class WavFileSink(NullSink):
+    """Writes the played-out audio (including inserted silence) to a WAV file"""
+
+    def __init__(self, path: str, sample_rate: int = 48000):
+        super().__init__(sample_rate)
+        self._wav = wave.open(path, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(sample_rate)
+
+    def write(self, samples: np.ndarray, silent: bool = False):
+        super().write(samples, silent)
+        self._wav.writeframes(samples.tobytes())
+
+    def close(self):
+        self._wav.close()
+
+
+class PipeSink(NullSink):
+    """
+    Streams s16le mono into the stdin of ``aplay`` or ``ffmpeg`` playing to ALSA.
+
+    A full pipe blocks the writer, so writes go through one worker thread
+    (in order) and the playout loop never waits on the player. If the player
+    stops reading, at most ``max_pending`` frames queue up before frames are
+    dropped.
+    """
+
+    def __init__(self, cmd, sample_rate: int = 48000, max_pending: int = 50, latency_ms: int = 0):
+        super().__init__(sample_rate)
+        self.latency_ms = latency_ms
+        print(f"🔊 Starting playback: {' '.join(cmd)}")
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playback")
+        self._pending = collections.deque()
+
+    @classmethod
+    def aplay(cls, device: str, sample_rate: int = 48000, buffer_ms: int = 60):
+        # aplay's default ALSA buffer can be 500ms of audio; keep it to a few periods
+        return cls(["aplay", "-q", "-D", device, "-t", "raw", "-f", "S16_LE",
+                    "-c", "1", "-r", str(sample_rate),
+                    f"--buffer-time={buffer_ms * 1000}", f"--period-time={buffer_ms * 1000 // 3}"],
+                   sample_rate, latency_ms=buffer_ms)
+
+    @classmethod
+    def ffmpeg(cls, device: str, sample_rate: int = 48000):
+        return cls(["ffmpeg", "-hide_banner", "-loglevel", "error",
+                    "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+                    "-f", "alsa", device], sample_rate)
+
+    def write(self, samples: np.ndarray, silent: bool = False):
+        super().write(samples, silent)
+        pending = self._pending
+        while pending and pending[0].done():
+            if isinstance(pending.popleft().exception(), BrokenPipeError):
+                raise RuntimeError("Playback process exited")
+        if len(pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        pending.append(self._writer.submit(self.proc.stdin.write, samples.tobytes()))
+
+    def close(self):
+        self._writer.shutdown(wait=False, cancel_futures=True)
+        if self.proc.poll() is None:
+            # A write blocked on the player fails once it exits, freeing the writer thread
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc.stdin.close()
+
+
+def open_sink(spec: str, device: str = "default", sample_rate: int = 48000, buffer_ms: int = 60):
+    """
+    Build a sink from a PLAYBACK_SINK value: null, file:<path>, aplay or
+    ffmpeg. ``buffer_ms`` is aplay's ALSA buffer.
+    """
+    if spec == "null":
+        return NullSink(sample_rate)
+    if spec.startswith("file:"):
+        return WavFileSink(spec[len("file:"):], sample_rate)
+    if spec == "aplay":
+        return PipeSink.aplay(device, sample_rate, buffer_ms)
+    if spec == "ffmpeg":
+        return PipeSink.ffmpeg(device, sample_rate)
+    raise ValueError(f"Unknown playback sink: {spec}")
+
+
+class JitterBuffer:
+    """
+    Adaptive playout buffer for fixed-size frames keyed by pts (in samples).
+
+    The target delay follows the RFC 3550 interarrival jitter estimate, so it
+    stays as small as the network allows. When the buffer runs dry playout
+    stalls (which grows the delay); when it holds more than the target plus a
+    frame, a frame is skipped to shrink it again.
+    """
+
+    def __init__(self, sample_rate: int, frame_samples: int, min_delay_ms: float = 20,
+                 max_delay_ms: float = 200, jitter_factor: float = 3.0):
+        self.sample_rate = sample_rate
+        self.frame_samples = frame_samples
+        self.frame_ms = 1000 * frame_samples / sample_rate
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.jitter_factor = jitter_factor
+
+        self._frames = {}
+        self.play_pts = None
+        self._last_transit = None
+        self.jitter_ms = 0.0
+        self._started = False
+
+        self.underruns = 0
+        self.late_drops = 0
+        self.concealed = 0
+        self.shrinks = 0
+        self.frames_played = 0
+
+    @property
+    def target_delay_ms(self) -> float:
+        target = self.frame_ms + self.jitter_factor * self.jitter_ms
+        return min(max(target, self.min_delay_ms), self.max_delay_ms)
+
+    @property
+    def buffered_ms(self) -> float:
+        """Audio queued ahead of the playout point (the current playout delay)"""
+        return len(self._frames) * self.frame_ms
+
+    def put(self, pts: int, samples: np.ndarray, arrival: float):
+        """Queue a frame that arrived at ``arrival`` (monotonic seconds)"""
+        transit = arrival * 1000 - pts * 1000 / self.sample_rate
+        if self._last_transit is not None:
+            d = abs(transit - self._last_transit)
+            self.jitter_ms += (d - self.jitter_ms) / 16
+        self._last_transit = transit
+
+        if self.play_pts is None:
+            self.play_pts = pts
+        elif pts < self.play_pts:
+            self.late_drops += 1
+            return
+        self._frames[pts] = samples
+
+    def pop(self) -> Optional[np.ndarray]:
+        """Next frame to play, or None to play silence"""
+        if not self._started:
+            # Build up the initial delay before starting playout
+            if self.play_pts is None or self.buffered_ms < self.target_delay_ms:
+                return None
+            self._started = True
+
+        if not self._frames:
+            # Ran dry: hold the playout point so the delay grows
+            self.underruns += 1
+            return None
+
+        if self.buffered_ms > self.target_delay_ms + self.frame_ms and len(self._frames) > 1:
+            # More buffered than needed: skip the oldest frame
+            self._frames.pop(min(self._frames))
+            self.shrinks += 1
+            self.play_pts = min(self._frames)
+
+        samples = self._frames.pop(self.play_pts, None)
+        if samples is None:
+            # Frame lost or still in flight while later ones are here
+            self.concealed += 1
+        else:
+            self.frames_played += 1
+        self.play_pts += self.frame_samples
+        return samples
+
+
+class AudioPlayer:
+    """
+    Plays the bot's audio track through a sink with a jitter buffer.
+
+    ``feed(frame)`` queues frames as they arrive; a separate playout task
+    writes one frame per period on the monotonic clock, inserting silence
+    when the jitter buffer has nothing to play.
+    """
+
+    def __init__(self, sink, min_delay_ms: float = 20, max_delay_ms: float = 200):
+        self.sink = sink
+        self.sample_rate = sink.sample_rate
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.jitter = None
+        self._resampler = av.AudioResampler(format="s16", layout="mono", rate=self.sample_rate)
+        self._playout_task = None
+        self._frames_fed = 0
+        # Called with (samples, sample_rate) for everything written to the sink,
+        # e.g. as the echo suppressor's reference
+        self.playout_listeners = []
+
+    def stats(self) -> dict:
+        jb = self.jitter
+        if jb is None:
+            return {}
+        return {
+            "playout_delay_ms": jb.buffered_ms,
+            "target_delay_ms": jb.target_delay_ms,
+            "jitter_ms": jb.jitter_ms,
+            "underruns": jb.underruns,
+            "late_drops": jb.late_drops,
+            "concealed": jb.concealed,
+            "shrinks": jb.shrinks,
+            "frames_played": jb.frames_played,
+        }
+
+    def _to_mono(self, frame):
+        """Convert a decoded frame to (pts in samples, int16 mono) at the sink rate"""
+        pts = int(frame.pts * frame.time_base * self.sample_rate)
+        if frame.format.name == "s16" and frame.layout.name == "mono" and frame.sample_rate == self.sample_rate:
+            return pts, frame.to_ndarray().reshape(-1)
+        chunks = [f.to_ndarray().reshape(-1) for f in self._resampler.resample(frame)]
+        return pts, np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+
+    def new_stream(self):
+        """Call when a new incoming track starts (pts restart from a new origin)"""
+        self._frames_fed = 0
+
+    def feed(self, frame):
+        """Queue one received frame for playout"""
+        arrival = time.monotonic()
+        pts, samples = self._to_mono(frame)
+        if samples.size == 0:
+            return
+
+        if self.jitter is None or self._frames_fed == 0:
+            self.jitter = JitterBuffer(self.sample_rate, samples.size,
+                                       self.min_delay_ms, self.max_delay_ms)
+            self._ensure_playout()
+        self._frames_fed += 1
+        self.jitter.put(pts, samples, arrival)
+
+        if self._frames_fed % 500 == 0:
+            s = self.stats()
+            print(f"🔊 Playout: delay={s['playout_delay_ms']:.0f}ms (target {s['target_delay_ms']:.0f}ms), "
+                  f"underruns={s['underruns']}, late={s['late_drops']}, concealed={s['concealed']}")
+
+    def _ensure_playout(self):
+        if self._playout_task is None or self._playout_task.done():
+            self._playout_task = asyncio.create_task(self._playout())
+
+    async def _playout(self):
+        due = time.monotonic()
+        silence = np.zeros(0, dtype=np.int16)
+        while True:
+            # Each new stream gets a new buffer, possibly with another frame size
+            jitter = self.jitter
+            period = jitter.frame_samples / self.sample_rate
+            if silence.size != jitter.frame_samples:
+                silence = np.zeros(jitter.frame_samples, dtype=np.int16)
+
+            samples = jitter.pop()
+            if samples is None:
+                samples = silence
+                self.sink.write(silence, silent=True)
+            else:
+                self.sink.write(samples)
+            for listener in self.playout_listeners:
+                listener(samples, self.sample_rate)
+
+            due += period
+            wait = due - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            elif wait < -10 * period:
+                # Event loop stalled: don't try to catch up in a burst
+                due = time.monotonic()
+
+    def close(self):
+        if self._playout_task:
+            self._playout_task.cancel()
+        self.sink.close()
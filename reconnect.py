@@ -0,0 +1,169 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import aiohttp
+    from aiortc import RTCPeerConnection
+
+# aiohttp and aiortc are imported on first use: at cold start they load
+# while the microphone is being opened (see client.main)
+
+
+class Backoff:
+    """
+    Exponential backoff with full jitter and a fast first retry.
+
+    The first retry waits at most ``first`` seconds (most drops are brief);
+    after that the delay is uniform in [0, min(cap, base * 2^n)] so rooms
+    that lost the same server don't all come back in lockstep.
+    """
+
+    def __init__(self, first: float = 0.25, base: float = 1.0, cap: float = 30.0):
+        self.first = first
+        self.base = base
+        self.cap = cap
+        self.attempt = 0
+
+    def next_delay(self) -> float:
+        if self.attempt == 0:
+            ceiling = self.first
+        else:
+            ceiling = min(self.cap, self.base * 2 ** (self.attempt - 1))
+        self.attempt += 1
+        return random.uniform(0, ceiling)
+
+    def reset(self):
+        self.attempt = 0
+
+
+# Raised by the room simulator, which signals for many rooms through one session
+MAX_CONNECTIONS_PER_HOST = 4
+
+_http_session = None
+
+
+def get_http_session() -> "aiohttp.ClientSession":
+    """Process-wide keep-alive HTTP session for signaling"""
+    import aiohttp
+
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=MAX_CONNECTIONS_PER_HOST, keepalive_timeout=60)
+        _http_session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10))
+    return _http_session
+
+
+async def post_offer(url: str, payload: dict) -> dict:
+    """POST an SDP offer on the pooled session and return the parsed answer"""
+    import aiohttp
+
+    for attempt in range(2):
+        try:
+            async with get_http_session().post(url, json=payload) as resp:
+                # If server returns non-JSON errors, we want to see them clearly
+                text = await resp.text()
+                if resp.status >= 400:
+                    raise RuntimeError(f"Offer failed ({resp.status}): {text}")
+                return json.loads(text)
+        except (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError):
+            # The server may have closed an idle keep-alive connection; retry once
+            if attempt:
+                raise
+
+
+class PreparedPeer:
+    """A peer connection whose offer is created and ICE candidates gathered"""
+
+    def __init__(self, pc: "RTCPeerConnection", dc, transceiver):
+        self.pc = pc
+        self.dc = dc
+        self.transceiver = transceiver
+        self.created = time.monotonic()
+
+
+async def prepare_peer() -> PreparedPeer:
+    """
+    Build a peer connection up to a local offer.
+
+    The audio transceiver has no track yet; the caller attaches one with
+    ``transceiver.sender.replaceTrack()`` when the peer is used.
+    """
+    from aiortc import RTCPeerConnection
+
+    import codec
+
+    pc = RTCPeerConnection()
+    try:
+        dc = pc.createDataChannel("meta")
+        transceiver = pc.addTransceiver("audio", direction="sendrecv")
+        if codec.customized():
+            codec.prefer_opus(transceiver)
+        offer = await pc.createOffer()
+        await pc.setLocalDescription(offer)  # gathers ICE candidates
+    except Exception:
+        await pc.close()
+        raise
+    return PreparedPeer(pc, dc, transceiver)
+
+
+class PeerPreparer:
+    """Keeps one speculative peer ready so a reconnect only costs signaling"""
+
+    def __init__(self, max_age: float = 600):
+        self.max_age = max_age
+        self._task = None
+
+    def prepare_next(self):
+        """Start building the next peer in the background (no-op if one is pending)"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(prepare_peer())
+
+    async def take(self) -> PreparedPeer:
+        """The prepared peer if there is a usable one, otherwise a fresh one"""
+        task, self._task = self._task, None
+        if task is not None:
+            try:
+                peer = await task
+                if time.monotonic() - peer.created < self.max_age:
+                    return peer
+                # Interfaces may have changed since the candidates were gathered
+                await peer.pc.close()
+            except Exception as e:
+                print(f"⚠️  Speculative peer failed: {e}")
+        return await prepare_peer()
+
+
+class RecoveryTimer:
+    """Time from detecting a dead connection to the next one being connected"""
+
+    def __init__(self):
+        self._since = None
+        self.samples_ms = []
+
+    def disconnected(self):
+        if self._since is None:
+            self._since = time.monotonic()
+
+    def connected(self):
+        """Returns the recovery time in ms, or None if nothing was lost"""
+        if self._since is None:
+            return None
+        ms = (time.monotonic() - self._since) * 1000
+        self._since = None
+        self.samples_ms.append(ms)
+        return ms
+
+    def stats(self) -> dict:
+        samples = self.samples_ms
+        if not samples:
+            return {"reconnects": 0}
+        return {
+            "reconnects": len(samples),
+            "last_ms": samples[-1],
+            "median_ms": statistics.median(samples),
+            "max_ms": max(samples),
+        }
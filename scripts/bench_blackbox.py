@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Cost of leaving the black-box recorder on: per-frame time, allocations and syscalls.
+
+Measures BlackBox.capture() on 20 ms mic frames and BlackBox.received() on
+20 ms 48 kHz stereo frames from the server, then CaptureTrack.recv() with
+and without a recorder attached (pre-filled ring, no pacing, as in
+bench_recv.py). With --strace the recording loop runs under strace to
+count the system calls it makes (there should be none per frame).
+
+Usage: python scripts/bench_blackbox.py [--frames 20000] [--path /dev/shm/bench-blackbox] [--strace]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from fractions import Fraction
+
+import numpy as np
+from av import AudioFrame
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_recv import PrefilledEngine  # noqa: E402
+from blackbox import BlackBox  # noqa: E402
+
+
+def bot_frame(i):
+    frame = AudioFrame(format="s16", layout="stereo", samples=960)
+    frame.planes[0].update(np.zeros(1920, dtype=np.int16).tobytes())
+    frame.sample_rate = 48000
+    frame.pts = i * 960
+    frame.time_base = Fraction(1, 48000)
+    return frame
+
+
+def time_calls(fn, frames):
+    """ns per call and transient Python allocation per call"""
+    start = time.perf_counter_ns()
+    for i in range(frames):
+        fn(i)
+    ns = (time.perf_counter_ns() - start) / frames
+
+    tracemalloc.start()
+    peak = 0
+    for i in range(min(frames, 2000)):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn(i)
+        peak += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return ns, peak / min(frames, 2000)
+
+
+async def time_recv(frames, recorder):
+    engine = PrefilledEngine(frames + 1)
+    engine.recorder = recorder
+    track = engine.track()
+    await track.recv()
+    track._start_time = 0.0  # Every frame is "late": no pacing sleeps
+    start = time.perf_counter_ns()
+    for _ in range(frames):
+        await track.recv()
+    return (time.perf_counter_ns() - start) / frames
+
+
+def count_syscalls(path, frames):
+    """System calls made while recording ``frames`` mic + bot frames (needs strace)"""
+    code = (f"import sys; sys.path.insert(0, {ROOT!r}); sys.path.insert(0, {os.path.dirname(__file__)!r})\n"
+            "import numpy as np, os\n"
+            "from bench_blackbox import bot_frame\n"
+            "from blackbox import BlackBox\n"
+            f"box = BlackBox({path!r}, minutes=1)\n"
+            "mic = np.zeros(320, dtype=np.int16); bot = [bot_frame(i) for i in range(8)]\n"
+            "os.write(2, b'--start--')\n"
+            f"for i in range({frames}):\n"
+            "    box.capture(mic, i * 320); box.received(bot[i % 8])\n"
+            "os.write(2, b'--end--')\n")
+    result = subprocess.run(["strace", "-f", "-e", "trace=all", sys.executable, "-c", code],
+                            capture_output=True, text=True)
+    trace = result.stderr
+    window = trace[trace.index("--start--"):trace.index("--end--")]
+    return window.count("\n") - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--path", default="/dev/shm/bench-blackbox" if os.path.isdir("/dev/shm") else "bench-blackbox")
+    parser.add_argument("--minutes", type=float, default=5.0)
+    parser.add_argument("--strace", action="store_true", help="count system calls per frame with strace")
+    args = parser.parse_args()
+
+    box = BlackBox(args.path, minutes=args.minutes)
+    print(f"📼 {args.minutes:g} min black box, {box.size / 2 ** 20:.1f}MB at {args.path}")
+    mic = np.random.default_rng(0).integers(-3000, 3000, 320, dtype=np.int16)
+    bots = [bot_frame(i) for i in range(16)]
+
+    ns, alloc = time_calls(lambda i: box.capture(mic, i * 320), args.frames)
+    print(f"🎤 capture():  {ns:>7,.0f} ns per 20ms frame ({ns / 20e6:.3%}), {alloc:,.0f} bytes transient")
+    ns, alloc = time_calls(lambda i: box.received(bots[i % 16]), args.frames)
+    print(f"🔊 received(): {ns:>7,.0f} ns per 20ms frame ({ns / 20e6:.3%}), {alloc:,.0f} bytes transient")
+    box.mark("bench")
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        without = asyncio.run(time_recv(args.frames, None))
+        with_box = asyncio.run(time_recv(args.frames, box))
+    print(f"⏱️  recv(): {without:,.0f} ns without, {with_box:,.0f} ns with the recorder "
+          f"({with_box - without:+,.0f} ns per frame)")
+    box.close()
+
+    if args.strace:
+        if shutil.which("strace") is None:
+            print("⚠️  strace not installed, skipping the syscall count")
+        else:
+            calls = count_syscalls(args.path + ".strace", 1000)
+            print(f"🔍 {calls} system calls while recording 1000 mic + 1000 bot frames")
+            os.unlink(args.path + ".strace")
+    os.unlink(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Head-to-head benchmark of the ffmpeg-pipe and in-process PyAV capture backends.
+
+Both backends read the same WAV file (paced to real time, like a device) and
+we report time-to-first-frame and CPU seconds spent per second of audio,
+including the ffmpeg child process for the pipe backend.
+
+Usage: python scripts/bench_capture.py [input.wav] [--seconds 10]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from audio_linux import FFmpegAlsaCapture, PyAVAlsaCapture  # noqa: E402
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+def write_test_wav(path, seconds, sample_rate=48000):
+    """Speech-band noise bursts at the device-native rate, so both backends resample"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    envelope = (np.sin(2 * np.pi * 0.5 * t) > 0).astype(np.float32)
+    audio = (rng.standard_normal(t.size) * 3000 * envelope).astype(np.int16)
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(audio.tobytes())
+
+
+def child_cpu_seconds(pid):
+    """utime + stime of a still-running child, from /proc"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLK_TCK
+    except (FileNotFoundError, IndexError):
+        return 0.0
+
+
+async def run_backend(name, factory, seconds):
+    cpu_start = time.process_time()
+    t0 = time.perf_counter()
+    engine = factory()
+    track = engine.track()
+    await track.recv()
+    first_frame = time.perf_counter() - t0
+
+    frames = 1
+    needed = int(seconds * track.sample_rate / track.frame_samples)
+    while frames < needed:
+        await track.recv()
+        frames += 1
+
+    cpu = time.process_time() - cpu_start
+    if hasattr(engine, "proc"):
+        cpu += child_cpu_seconds(engine.proc.pid)
+    audio_seconds = frames * track.frame_samples / track.sample_rate
+    track.stop()
+    engine.stop()
+
+    return {
+        "backend": name,
+        "first_frame_ms": first_frame * 1000,
+        "cpu_ms_per_audio_s": cpu * 1000 / audio_seconds,
+        "audio_s": audio_seconds,
+        **track.stats(),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("wav", nargs="?", help="input WAV (default: generated)")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--backend", choices=["ffmpeg", "pyav", "both"], default="both")
+    args = parser.parse_args()
+
+    wav = args.wav
+    if wav is None:
+        wav = os.path.join(tempfile.mkdtemp(), "bench_capture.wav")
+        write_test_wav(wav, args.seconds + 2)
+        print(f"🎵 Generated {wav}")
+
+    backends = {
+        "ffmpeg": lambda: FFmpegAlsaCapture(wav, input_format="wav"),
+        "pyav": lambda: PyAVAlsaCapture(wav, input_format="wav"),
+    }
+    names = list(backends) if args.backend == "both" else [args.backend]
+
+    results = []
+    for name in names:
+        print(f"\n=== {name} ===")
+        results.append(await run_backend(name, backends[name], args.seconds))
+
+    print(f"\n{'backend':<8} {'first frame':>12} {'CPU/audio-s':>12} {'overruns':>9} {'underruns':>10}")
+    for r in results:
+        print(f"{r['backend']:<8} {r['first_frame_ms']:>10.1f}ms {r['cpu_ms_per_audio_s']:>10.1f}ms "
+              f"{r['overruns']:>9} {r['underruns']:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
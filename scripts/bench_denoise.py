@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Offline quality and timing check for noise suppression and AGC.
+
+A quiet talker (speech-like bursts around -40 dBFS) is mixed with HVAC-like
+noise (low rumble, mains hum and fan hiss) and run frame by frame through
+NoiseSuppressor and AutomaticGainControl exactly as the capture path would.
+Reports how much the noise drops between words, the segmental SNR against
+the clean speech before and after suppression, the speech level after AGC,
+clipped samples, and the per-frame cost at 16 and 48 kHz as a share of one
+core.
+
+Usage: python scripts/bench_denoise.py [--clean speech.wav] [--noise hvac.wav] [--snr-db 10] [--out denoised.wav]
+WAVs must be mono s16 at the same rate; synthetic signals are used if omitted.
+"""
+import argparse
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dsp import AutomaticGainControl, NoiseSuppressor  # noqa: E402
+
+SECONDS = 20
+SPEECH_SPANS = [(2.0, 5.0), (7.0, 9.5), (12.0, 16.0), (17.5, 19.5)]
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as wf:
+        if wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            raise SystemExit(f"{path}: expected mono s16")
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16).astype(np.float32)
+        return audio, wf.getframerate()
+
+
+def write_wav(path, audio, rate):
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(np.clip(audio, -32768, 32767).astype(np.int16).tobytes())
+
+
+def speech_like(rate, seed=0):
+    """Band-limited noise with a syllable-rate envelope in SPEECH_SPANS, RMS 1"""
+    rng = np.random.default_rng(seed)
+    n = SECONDS * rate
+    spectrum = np.fft.rfft(rng.standard_normal(n))
+    freqs = np.fft.rfftfreq(n, 1 / rate)
+    spectrum *= (freqs > 100) & (freqs < 4000)
+    voiced = np.fft.irfft(spectrum, n)
+    t = np.arange(n) / rate
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    gate = np.zeros(n)
+    for start, end in SPEECH_SPANS:
+        gate[int(start * rate):int(end * rate)] = 1
+    speech = voiced * envelope * gate
+    return (speech / np.sqrt(np.mean(speech[gate > 0] ** 2))).astype(np.float32)
+
+
+def hvac_like(rate, seed=1):
+    """Rumble (integrated noise), 60 Hz hum with harmonics and fan hiss, RMS 1"""
+    rng = np.random.default_rng(seed)
+    n = SECONDS * rate
+    rumble = np.cumsum(rng.standard_normal(n))
+    rumble -= np.convolve(rumble, np.ones(rate // 50) / (rate // 50), mode="same")  # Remove the drift
+    t = np.arange(n) / rate
+    hum = sum(np.sin(2 * np.pi * 60 * k * t) / k for k in (1, 2, 3))
+    hiss = rng.standard_normal(n)
+    noise = rumble / rumble.std() + 0.5 * hum + 0.7 * hiss
+    return (noise / noise.std()).astype(np.float32)
+
+
+def db(x):
+    """Level in dBFS"""
+    return 10 * np.log10(np.mean(np.asarray(x, dtype=np.float64) ** 2) / 32768 ** 2 + 1e-12)
+
+
+def segmental_snr(clean, estimate, frame, mask):
+    """Mean per-frame SNR (clamped to [-10, 35] dB) over the frames where ``mask`` holds"""
+    n = clean.size // frame * frame
+    c = clean[:n].reshape(-1, frame).astype(np.float64)
+    e = estimate[:n].reshape(-1, frame).astype(np.float64)
+    snr = 10 * np.log10(np.sum(c ** 2, axis=1) / (np.sum((c - e) ** 2, axis=1) + 1e-9) + 1e-9)
+    return float(np.mean(np.clip(snr, -10, 35)[mask[:n:frame]]))
+
+
+def run(stages, audio, frame):
+    out = np.empty_like(audio)
+    spent = 0.0
+    for start in range(0, audio.size - frame + 1, frame):
+        x = audio[start:start + frame].astype(np.int16)
+        t0 = time.perf_counter()
+        for stage in stages:
+            x = stage.process(x)
+        spent += time.perf_counter() - t0
+        out[start:start + frame] = x
+    return out, spent / (audio.size // frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clean", help="speech WAV (mono s16)")
+    parser.add_argument("--noise", help="noise WAV at the same rate")
+    parser.add_argument("--speech-dbfs", type=float, default=-40, help="level of the synthetic talker")
+    parser.add_argument("--snr-db", type=float, default=10)
+    parser.add_argument("--out", help="write the noisy input and the processed output as <out> and <out>.in.wav")
+    args = parser.parse_args()
+
+    rate = 16000
+    if args.clean:
+        clean, rate = read_wav(args.clean)
+    else:
+        clean = speech_like(rate) * 32768 * 10 ** (args.speech_dbfs / 20)
+    speech_mask = np.zeros(clean.size, dtype=bool)
+    for start, end in SPEECH_SPANS:
+        speech_mask[int(start * rate):int(end * rate)] = True
+    if args.noise:
+        noise, noise_rate = read_wav(args.noise)
+        if noise_rate != rate:
+            raise SystemExit("--noise must have the same rate as the speech")
+        noise = np.resize(noise, clean.size)
+    else:
+        noise = hvac_like(rate)[:clean.size]
+    speech_db = db(clean[speech_mask]) if speech_mask[:clean.size].any() else db(clean)
+    noise *= 10 ** ((speech_db - args.snr_db - db(noise)) / 20)
+    noisy = clean + noise
+    frame = rate // 50
+    quiet = ~speech_mask[:clean.size]
+    quiet[:2 * rate] = False  # Leave out the first seconds while the noise estimate settles
+
+    denoised, _ = run([NoiseSuppressor(rate, frame)], noisy, frame)
+    denoised = np.concatenate([denoised[frame:], np.zeros(frame, np.float32)])  # One frame of latency
+    agc = AutomaticGainControl(rate, frame)
+    leveled, _ = run([NoiseSuppressor(rate, frame), agc], noisy, frame)
+    leveled = np.concatenate([leveled[frame:], np.zeros(frame, np.float32)])
+    late_speech = speech_mask[:clean.size].copy()
+    late_speech[:12 * rate] = False  # Once AGC has had time to converge
+
+    print(f"🎙️  Talker at {speech_db:.0f} dBFS, HVAC noise at {db(noise):.0f} dBFS (SNR {args.snr_db:.0f} dB)")
+    print(f"🔇 Noise between words: {db(noisy[quiet]):.1f} → {db(denoised[quiet]):.1f} dBFS "
+          f"({db(noisy[quiet]) - db(denoised[quiet]):.1f} dB suppressed)")
+    print(f"📈 Segmental SNR in speech: {segmental_snr(clean, noisy, frame, speech_mask):.1f} → "
+          f"{segmental_snr(clean, denoised, frame, speech_mask):.1f} dB")
+    print(f"🔊 AGC: speech {db(denoised[late_speech]):.1f} → {db(leveled[late_speech]):.1f} dBFS "
+          f"(target {agc.target_dbfs:.0f}), noise between words {db(leveled[quiet]):.1f} dBFS, "
+          f"{int(np.sum(np.abs(leveled) >= 32767))} clipped samples, limiter engaged on {agc.limited} frames")
+
+    if args.out:
+        write_wav(args.out, leveled, rate)
+        write_wav(f"{args.out}.in.wav", noisy, rate)
+        print(f"💾 Wrote {args.out} (and the input as {args.out}.in.wav)")
+
+    print("\n⏱️  Per 20 ms frame (share of one core):")
+    for bench_rate in (16000, 48000):
+        n = bench_rate // 50
+        audio = (hvac_like(bench_rate)[:5 * bench_rate] * 300 + speech_like(bench_rate)[:5 * bench_rate] * 1000)
+        results = []
+        for name, stages in (("noise suppression", [NoiseSuppressor(bench_rate, n)]),
+                             ("AGC", [AutomaticGainControl(bench_rate, n)]),
+                             ("both", [NoiseSuppressor(bench_rate, n), AutomaticGainControl(bench_rate, n)])):
+            _, seconds = run(stages, audio, n)
+            results.append(f"{name} {seconds * 1e6:.0f}µs ({seconds / 0.02:.2%})")
+        print(f"   {bench_rate // 1000} kHz: " + ", ".join(results))
+
+
+if __name__ == "__main__":
+    main()
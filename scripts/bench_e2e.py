@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark: the real client against a local stand-in server.
+
+The client runs its normal reconnect loop (client.main) with a WAV file as
+the microphone (CAPTURE_BACKEND=file); standin_server.py runs in a separate
+process so the client's CPU and memory are measured on their own. No
+network or sound card is needed.
+
+Scenarios:
+  steady  one long connection: mouth-to-server latency, jitter, CPU per
+          audio-second and memory growth
+  storm   the server drops every connection in quick succession: reconnect time
+  stall   the server hangs (no pongs, no audio): detection and recovery time
+
+Latency is measured with the default click track (a 1 kHz burst at the start
+of every second); the stand-in server timestamps each burst's arrival.
+
+Usage: python scripts/bench_e2e.py [--scenario all] [--seconds 30] [--wav input.wav] [--json]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+RATE = 16000
+CLICK_PERIOD = 1.0
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def write_click_track(path, seconds=CLICK_PERIOD):
+    """100ms 1kHz burst at the start of each period over faint noise"""
+    rng = np.random.default_rng(0)
+    n = int(seconds * RATE)
+    audio = rng.standard_normal(n) * 30
+    t = np.arange(RATE // 10) / RATE
+    audio[:t.size] += np.sin(2 * np.pi * 1000 * t) * 12000
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(RATE)
+        wf.writeframes(audio.astype(np.int16).tobytes())
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, record=None):
+    args = ["--record", record] if record else []
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "standin_server.py"), "--port", str(port), *args],
+        stdout=subprocess.PIPE, text=True,
+    )
+    line = proc.stdout.readline()
+    if "Stand-in server" not in line:
+        proc.kill()
+        raise RuntimeError(f"stand-in server failed to start: {line!r}")
+    return proc
+
+
+def summarize(values):
+    if not values:
+        return {"n": 0}
+    values = sorted(values)
+    return {
+        "n": len(values),
+        "median": statistics.median(values),
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+    }
+
+
+class Bench:
+    def __init__(self, client, server_url):
+        self.client = client
+        self.server_url = server_url
+        self.http = None
+
+    async def control(self, action):
+        async with self.http.post(f"{self.server_url}/control/{action}") as resp:
+            return await resp.json()
+
+    async def server_stats(self):
+        async with self.http.get(f"{self.server_url}/stats") as resp:
+            return await resp.json()
+
+    async def wait_connected(self, timeout=15):
+        deadline = time.monotonic() + timeout
+        while self.client.metrics.CONNECTION_STATE.state != "connected":
+            if time.monotonic() > deadline:
+                raise TimeoutError("client did not connect")
+            await asyncio.sleep(0.01)
+
+    async def steady(self, seconds):
+        engine = self.client.get_capture_engine()
+        await self.wait_connected()
+        await asyncio.sleep(2)  # Let connection setup garbage settle before measuring memory
+        await self.control("reset")
+        rss = [rss_bytes()]
+        cpu_start = time.process_time()
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < seconds:
+            await asyncio.sleep(1)
+            rss.append(rss_bytes())
+        elapsed = time.monotonic() - t0
+        cpu = time.process_time() - cpu_start
+        stats = await self.server_stats()
+
+        latencies = []
+        for onset in stats["onsets"]:
+            burst = engine.started + (onset - engine.started) // CLICK_PERIOD * CLICK_PERIOD
+            latencies.append((onset - burst) * 1000)
+
+        minutes = np.arange(len(rss)) / 60
+        slope = float(np.polyfit(minutes, np.array(rss) / 1024, 1)[0]) if len(rss) > 2 else 0.0
+        return {
+            "latency_ms": summarize(latencies),
+            "jitter_ms": stats["jitter_ms"],
+            "max_jitter_ms": stats["max_jitter_ms"],
+            "gaps": stats["gaps"],
+            "frames_received": stats["frames"],
+            "cpu_ms_per_audio_s": cpu * 1000 / elapsed,
+            "rss_mb": rss[-1] / 2 ** 20,
+            "rss_growth_kb": (rss[-1] - rss[0]) / 1024,
+            "rss_growth_kb_per_min": slope,
+            "capture_overruns": engine.overruns,
+        }
+
+    async def storm(self, drops, interval):
+        recovery = self.client._recovery
+        await self.wait_connected()
+        before = len(recovery.samples_ms)
+        failed = 0
+        for _ in range(drops):
+            await self.control("drop")
+            deadline = time.monotonic() + 10
+            count = len(recovery.samples_ms)
+            while len(recovery.samples_ms) == count and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            if len(recovery.samples_ms) == count:
+                failed += 1
+            await asyncio.sleep(interval)
+        return {
+            "drops": drops,
+            "failed": failed,
+            "reconnect_ms": summarize(recovery.samples_ms[before:]),
+            "offers": (await self.server_stats())["offers"],
+        }
+
+    async def stall(self, stalls, interval):
+        recovery = self.client._recovery
+        trips = self.client.metrics.WATCHDOG_TRIPS
+        detection = []
+        before = len(recovery.samples_ms)
+        for _ in range(stalls):
+            await self.wait_connected()
+            await asyncio.sleep(interval)
+            count = trips.value
+            await self.control("freeze")
+            frozen = time.monotonic()
+            while trips.value == count and time.monotonic() - frozen < 60:
+                await asyncio.sleep(0.005)
+            detection.append((time.monotonic() - frozen) * 1000)
+            await self.control("thaw")
+        await self.wait_connected()
+        return {
+            "stalls": stalls,
+            "detection_ms": summarize(detection),
+            "recovery_ms": summarize(recovery.samples_ms[before:]),
+        }
+
+
+def print_report(results):
+    if "steady" in results:
+        r = results["steady"]
+        lat = r["latency_ms"]
+        print("\n=== steady ===")
+        if lat["n"]:
+            print(f"mouth-to-server  median {lat['median']:.1f}ms  p95 {lat['p95']:.1f}ms  "
+                  f"max {lat['max']:.1f}ms  ({lat['n']} clicks)")
+        print(f"jitter           {r['jitter_ms']:.2f}ms (max {r['max_jitter_ms']:.2f}ms), "
+              f"{r['gaps']} gaps >60ms, {r['frames_received']} frames")
+        print(f"CPU              {r['cpu_ms_per_audio_s']:.1f}ms per audio-second")
+        print(f"memory           {r['rss_mb']:.1f}MB RSS, {r['rss_growth_kb']:+.0f}KB "
+              f"({r['rss_growth_kb_per_min']:+.1f}KB/min)")
+    if "storm" in results:
+        r = results["storm"]
+        rec = r["reconnect_ms"]
+        print("\n=== storm ===")
+        print(f"{r['drops']} drops, {r['failed']} not recovered within 10s")
+        if rec["n"]:
+            print(f"reconnect        median {rec['median']:.0f}ms  p95 {rec['p95']:.0f}ms  "
+                  f"max {rec['max']:.0f}ms")
+    if "stall" in results:
+        r = results["stall"]
+        det, rec = r["detection_ms"], r["recovery_ms"]
+        print("\n=== stall ===")
+        print(f"detection        median {det['median']:.0f}ms  max {det['max']:.0f}ms  ({det['n']} stalls)")
+        if rec["n"]:
+            print(f"recovery         median {rec['median']:.0f}ms  max {rec['max']:.0f}ms")
+
+
+async def run(args, server_url):
+    import aiohttp
+    import client
+    import reconnect
+
+    bench = Bench(client, server_url)
+    bench.http = aiohttp.ClientSession()
+    client_task = asyncio.ensure_future(client.main())
+    results = {}
+    try:
+        if args.scenario in ("steady", "all"):
+            results["steady"] = await bench.steady(args.seconds)
+        if args.scenario in ("storm", "all"):
+            results["storm"] = await bench.storm(args.drops, args.interval)
+        if args.scenario in ("stall", "all"):
+            results["stall"] = await bench.stall(args.stalls, args.interval)
+    finally:
+        client_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await client_task
+        client.get_capture_engine().stop()
+        await bench.http.close()
+        await reconnect.get_http_session().close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenario", choices=["steady", "storm", "stall", "all"], default="all")
+    parser.add_argument("--seconds", type=float, default=30, help="length of the steady scenario")
+    parser.add_argument("--drops", type=int, default=10, help="connections dropped in the storm")
+    parser.add_argument("--stalls", type=int, default=3, help="server hangs in the stall scenario")
+    parser.add_argument("--interval", type=float, default=2, help="seconds between drops/stalls")
+    parser.add_argument("--wav", help="mic input (default: generated click track; latency needs clicks)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the client's log")
+    args = parser.parse_args()
+
+    wav = args.wav
+    if wav is None:
+        wav = os.path.join(tempfile.mkdtemp(), "clicks.wav")
+        write_click_track(wav)
+
+    port = free_port()
+    server = start_server(port)
+    server_url = f"http://127.0.0.1:{port}"
+    os.environ.update({
+        "CAPTURE_BACKEND": "file",
+        "CAPTURE_FILE": wav,
+        "PIPECAT_SERVER": server_url,
+        "PLAYBACK_SINK": os.environ.get("PLAYBACK_SINK", "null"),
+    })
+
+    log = sys.stdout if args.verbose else open(os.devnull, "w")
+    try:
+        with contextlib.redirect_stdout(log):
+            results = asyncio.run(run(args, server_url))
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Compare capture sample rates and frame durations: CPU and capture-to-packet latency.
+
+A 48 kHz WAV stands in for a 48 kHz device and is captured in-process with
+PyAV (libswresample, as ffmpeg would use) at each capture rate, then encoded
+with aiortc's Opus encoder exactly as the RTP sender does. At 16 kHz the
+audio is resampled twice (down on capture, back up in the encoder); at 48 kHz
+neither pass resamples. With CAPTURE_FRAME_MS the Opus packet duration
+follows the frame duration (see codec.py).
+
+Latency is the age of each packet's oldest sample when the packet comes out
+of the encoder, against the real-time clock the file is paced to.
+
+Usage: python scripts/bench_framing.py [--seconds 5] [--rates 16000 48000] [--frames 10 20 40]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from aiortc.codecs import get_encoder  # noqa: E402
+from aiortc.rtcrtpparameters import RTCRtpCodecParameters  # noqa: E402
+
+import codec  # noqa: E402
+from audio_linux import PyAVAlsaCapture  # noqa: E402
+from bench_capture import write_test_wav  # noqa: E402
+
+OPUS = RTCRtpCodecParameters(mimeType="audio/opus", clockRate=48000, channels=2)
+
+
+async def run_config(wav, rate, frame_ms, seconds):
+    codec.set_frame_duration(frame_ms)
+    encoder = get_encoder(OPUS)
+    engine = PyAVAlsaCapture(wav, sample_rate=rate, input_format="wav", frame_ms=frame_ms)
+    track = engine.track()
+    bytes_per_sample = engine.bytes_per_sample * engine.channels
+
+    await track.recv()  # Attach and start pacing
+    base = engine._ring.read_pos // bytes_per_sample - track.frame_samples
+    cpu_start = time.process_time()
+    t0 = time.monotonic()
+    packets = 0
+    ages = []
+    while time.monotonic() - t0 < seconds:
+        frame = await track.recv()
+        payloads, timestamp = encoder.encode(frame)
+        if not payloads:
+            continue
+        packets += len(payloads)
+        oldest = base + timestamp * rate / 48000
+        ages.append((time.monotonic() - engine.started - oldest / rate) * 1000)
+    elapsed = time.monotonic() - t0
+    cpu = time.process_time() - cpu_start
+    track.stop()
+    engine.stop()
+    return {
+        "rate": rate,
+        "frame_ms": frame_ms,
+        "cpu_ms_per_audio_s": cpu * 1000 / elapsed,
+        "packets_per_s": packets / elapsed,
+        "latency_ms": statistics.median(ages),
+        "latency_p95_ms": sorted(ages)[int(len(ages) * 0.95)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rates", type=int, nargs="+", default=[16000, 48000])
+    parser.add_argument("--frames", type=int, nargs="+", default=[10, 20, 40])
+    args = parser.parse_args()
+
+    wav = os.path.join(tempfile.mkdtemp(), "device48k.wav")
+    write_test_wav(wav, len(args.rates) * len(args.frames) * (args.seconds + 1) + 5, sample_rate=48000)
+
+    results = []
+    for rate in args.rates:
+        for frame_ms in args.frames:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                results.append(asyncio.run(run_config(wav, rate, frame_ms, args.seconds)))
+            r = results[-1]
+            print(f"{r['rate']:>6}Hz {r['frame_ms']:>3}ms  CPU {r['cpu_ms_per_audio_s']:>6.1f}ms/s  "
+                  f"{r['packets_per_s']:>5.1f} pkt/s  capture-to-packet {r['latency_ms']:>5.1f}ms "
+                  f"(p95 {r['latency_p95_ms']:.1f}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Cost of the metrics instrumentation on the capture hot path.
+
+Times the primitive updates and the per-frame bundle recv() performs
+(three histogram observations and a counter increment), and reports it as a
+share of the 20 ms frame budget.
+
+Usage: python scripts/bench_metrics.py [--iterations 200000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import metrics  # noqa: E402
+
+FRAME_BUDGET_NS = 20_000_000
+
+
+def per_call_ns(fn, iterations):
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    registry = metrics.Registry()
+    counter = registry.counter("bench_total", "bench")
+    histogram = registry.histogram("bench_seconds", "bench", metrics.FRAME_BUCKETS)
+
+    def per_frame():
+        t0 = time.perf_counter()
+        histogram.observe(time.perf_counter() - t0)
+        histogram.observe(0.0)
+        histogram.observe(time.perf_counter() - t0)
+        counter.inc()
+
+    baseline = per_call_ns(lambda: None, n)
+    results = {
+        "counter.inc": per_call_ns(counter.inc, n) - baseline,
+        "histogram.observe": per_call_ns(lambda: histogram.observe(0.003), n) - baseline,
+        "per frame": per_call_ns(per_frame, n) - baseline,
+    }
+    for name, ns in results.items():
+        print(f"{name:<18} {ns:>8.0f} ns")
+    print(f"\n📊 Per-frame overhead: {results['per frame'] / FRAME_BUDGET_NS:.4%} of the 20 ms budget")
+
+    start = time.perf_counter()
+    text = metrics.REGISTRY.render()
+    print(f"📈 Full scrape: {(time.perf_counter() - start) * 1e6:.0f} µs, {len(text)} bytes")
+
+
+if __name__ == "__main__":
+    main()
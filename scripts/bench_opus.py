@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Bytes per minute and received audio quality for each Opus setting.
+
+For every setting the real client (client.py, with a WAV file as the mic)
+streams a synthetic talker to standin_server.py, which records what it
+decodes. With --loss the server also drops that share of the RTP packets,
+like a lossy link. Reported per setting and loss rate: RTP bytes per minute
+on the wire, packets dropped, the share of speech that never arrived, and
+the log-spectral distance (LSD, dB; lower is closer) between what did
+arrive and the source. The stand-in, like an aiortc-based server, neither
+decodes FEC nor conceals a gap (its jitter buffer drops the frames queued
+behind one), so FEC shows its cost here but not its benefit.
+
+Usage: python scripts/bench_opus.py [--seconds 15] [--loss 0,0.05] [--only "32k mono,32k DTX"]
+"""
+import argparse
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import wave
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from bench_e2e import free_port, start_server  # noqa: E402
+
+RATE = 16000
+TALK_S, PAUSE_S = 1.6, 1.0
+SECONDS = 10 * (TALK_S + PAUSE_S)
+SETTINGS = [
+    ("aiortc default", {}),
+    ("32k mono", {"OPUS_PROFILE": "speech"}),
+    ("16k mono", {"OPUS_PROFILE": "speech", "OPUS_BITRATE": "16000"}),
+    ("32k DTX", {"OPUS_PROFILE": "speech", "OPUS_DTX": "1"}),
+    ("24k FEC", {"OPUS_PROFILE": "speech", "OPUS_BITRATE": "24000", "OPUS_FEC": "1"}),
+    ("32k adaptive", {"OPUS_PROFILE": "speech", "OPUS_ADAPTIVE": "1"}),
+]
+
+
+def write_talker(path):
+    """Voiced syllables (gliding pitch, three formants) with fricatives, in 1.6 s turns, at -26 dBFS"""
+    rng = np.random.default_rng(0)
+    n = int(SECONDS * RATE)
+    t = np.arange(n) / RATE
+    f0 = 120 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / RATE
+    voiced = np.zeros(n)
+    for k in range(1, 7000 // 150):
+        formants = sum(np.exp(-((k * 135 - f) / 200) ** 2) * g for f, g in ((500, 1.0), (1500, 0.5), (2500, 0.3)))
+        voiced += (formants + 0.02) * np.sin(k * phase)
+    fricative = np.diff(rng.standard_normal(n + 1)) * 0.3
+    syllable = np.sin(np.pi * ((t * 4) % 1)) ** 2
+    unvoiced = (t * 4).astype(int) % 3 == 2
+    talking = (t % (TALK_S + PAUSE_S)) < TALK_S
+    speech = np.where(unvoiced, fricative, voiced) * syllable * talking
+    speech *= 32768 * 10 ** (-26 / 20) / np.sqrt(np.mean(speech[talking] ** 2))
+    audio = speech + rng.standard_normal(n) * 6  # Faint room noise, about -75 dBFS
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(RATE)
+        wf.writeframes(np.clip(audio, -32768, 32767).astype(np.int16).tobytes())
+    return audio
+
+
+def read_received(path):
+    with wave.open(path, "rb") as wf:
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        return audio.reshape(-1, wf.getnchannels())[:, 0].astype(np.float64), wf.getframerate()
+
+
+def envelope(audio, block):
+    n = audio.size // block * block
+    return np.abs(audio[:n]).reshape(-1, block).mean(axis=1)
+
+
+def align(received, rate, source):
+    """Offset into the looped source (in source samples) where the recording starts, to 1 ms"""
+    rec = envelope(received, rate // 1000)
+    loops = int(np.ceil(rec.size / (source.size / RATE * 1000))) + 1
+    ref = envelope(np.tile(source, loops), RATE // 1000)
+    rec = rec - rec.mean()
+    ref = ref - ref.mean()
+    size = 1 << int(np.ceil(np.log2(ref.size + rec.size)))
+    corr = np.fft.irfft(np.fft.rfft(ref, size) * np.conj(np.fft.rfft(rec, size)), size)
+    period_ms = source.size * 1000 // RATE
+    return int(np.argmax(corr[:period_ms])) * RATE // 1000
+
+
+def spectrum_db(frame):
+    window = np.hanning(frame.size)
+    return 10 * np.log10(np.abs(np.fft.rfft(frame * window)) ** 2 / window.sum() ** 2 + 1e-12)
+
+
+def quality(received, rate, source, skip_s=2.0):
+    """(share of speech frames missing, LSD in dB over the speech frames that arrived)"""
+    offset = align(received, rate, source)
+    ref_frame, rec_frame = RATE // 50, rate // 50  # 20 ms: both spectra have 50 Hz bins
+    bins = slice(2, 141)  # 100 Hz to 7 kHz
+    missing = present = 0
+    distances = []
+    for i in range(int(skip_s * 50), received.size // rec_frame):
+        start = (offset + i * ref_frame) % source.size
+        ref = np.take(source, np.arange(start, start + ref_frame), mode="wrap")
+        ref_db = spectrum_db(ref)[bins]
+        if 10 * np.log10(np.mean(ref ** 2) / 32768 ** 2 + 1e-12) < -45:
+            continue  # Not speech
+        rec = received[i * rec_frame:(i + 1) * rec_frame]
+        if np.mean(rec ** 2) < np.mean(ref ** 2) / 100:
+            missing += 1
+            continue
+        present += 1
+        floor = ref_db.max() - 60
+        rec_db = np.maximum(spectrum_db(rec)[bins], floor)
+        distances.append(np.sqrt(np.mean((rec_db - np.maximum(ref_db, floor)) ** 2)))
+    return missing / max(missing + present, 1), float(np.mean(distances)) if distances else float("nan")
+
+
+def run(name, env, loss, seconds, wav, source, tmp):
+    port = free_port()
+    record = os.path.join(tmp, f"received-{port}.wav")
+    server = start_server(port, record=record)
+    url = f"http://127.0.0.1:{port}"
+    client = None
+    try:
+        urllib.request.urlopen(urllib.request.Request(f"{url}/control/loss?rate={loss}", method="POST")).read()
+        client_env = dict(os.environ, PIPECAT_SERVER=url, CAPTURE_BACKEND="file", CAPTURE_FILE=wav, **env)
+        log = os.path.join(tmp, f"client-{port}.log")
+        with open(log, "w") as out:
+            client = subprocess.Popen([sys.executable, os.path.join(ROOT, "client.py")], env=client_env,
+                                      stdout=out, stderr=subprocess.STDOUT)
+            time.sleep(seconds)
+        with urllib.request.urlopen(f"{url}/stats") as response:
+            rtp = json.load(response)["rtp"]
+    finally:
+        for proc, sig in ((client, signal.SIGTERM), (server, signal.SIGINT)):  # SIGINT: the WAV gets its header
+            if proc is not None:
+                proc.send_signal(sig)
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+    adapted = re.findall(r"Opus now (.*)", open(log).read())
+    missing, lsd = quality(*read_received(record), source)
+    return {
+        "setting": name, "loss": loss,
+        "kb_per_min": rtp["bytes"] / max(rtp["seconds"], 1e-9) * 60 / 1000,
+        "dropped": rtp["dropped"] / max(rtp["packets"], 1),
+        "missing": missing, "lsd_db": lsd,
+        "ended_at": adapted[-1] if adapted else "",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=15, help="streaming time per run")
+    parser.add_argument("--loss", default="0,0.05", help="comma-separated packet loss rates")
+    parser.add_argument("--only", help="comma-separated setting names")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    wav = os.path.join(tmp, "talker.wav")
+    source = write_talker(wav)
+    only = {name.strip() for name in args.only.split(",")} if args.only else None
+    results = []
+    for loss in (float(x) for x in args.loss.split(",")):
+        for name, env in SETTINGS:
+            if only is None or name in only:
+                results.append(run(name, env, loss, args.seconds, wav, source, tmp))
+                if not args.json:
+                    r = results[-1]
+                    if len(results) == 1:
+                        print(f"{'setting':<16}{'loss':>6}{'kB/min':>9}{'dropped':>9}{'missing':>9}{'LSD':>8}")
+                    print(f"{r['setting']:<16}{r['loss']:>6.0%}{r['kb_per_min']:>9.0f}{r['dropped']:>9.1%}"
+                          f"{r['missing']:>9.1%}{r['lsd_db']:>6.1f}dB"
+                          + (f"   (ended at {r['ended_at']})" if r["ended_at"] else ""))
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the capture hot path: CaptureTrack.recv() per frame.
+
+The ring is pre-filled and pacing is disabled, so this measures only the
+per-frame work: reading from the ring, processors, building the AudioFrame,
+metrics and diagnostics. Reports nanoseconds per frame and Python heap
+allocations per frame (tracemalloc; memory allocated inside FFmpeg for the
+frame's samples is not visible to it).
+
+``--baseline`` runs the per-frame path recv() had before it was trimmed
+(a new ndarray per read, AudioFrame.from_ndarray, the amplitude of every
+frame, several wall-clock reads) over the same engine, so the before and
+after numbers come from this one harness.
+
+Usage: python scripts/bench_recv.py [--frames 20000] [--baseline]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+from fractions import Fraction
+
+import numpy as np
+from av import AudioFrame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import metrics  # noqa: E402
+from audio_linux import CaptureEngine, CaptureTrack  # noqa: E402
+
+
+class PrefilledEngine(CaptureEngine):
+    """Engine whose ring already holds ``frames`` frames of noise (no reader thread)"""
+
+    def __init__(self, frames: int):
+        super().__init__(ring_ms=(frames + 1) * 20)
+        self._attach()  # Claim the first view so it reads from the start of the ring
+        noise = np.random.default_rng(0).integers(-3000, 3000, frames * self.frame_samples, dtype=np.int16)
+        self._write(noise)
+
+    def _fill(self):
+        pass  # Never started: the ring is filled up front
+
+
+class BaselineTrack(CaptureTrack):
+    """CaptureTrack with the per-frame work recv() did before it was trimmed"""
+
+    def __init__(self, engine):
+        super().__init__(engine)
+        self._recv_count = 0
+        self._last_recv_time = None
+
+    async def recv(self):
+        self._recv_count += 1
+        self._last_recv_time = time.time()
+        engine = self.engine
+        if self._pts == 0:
+            engine._attach()
+            print(f"🎤 Starting audio capture: {self.frame_samples} samples/frame, mono, {self.sample_rate}Hz")
+        if self._recv_count == 17:
+            print(f"🔍 About to read frame #{self._recv_count}, this should be frame #17...")
+
+        due = None
+        if self._start_time is not None:
+            due = self._start_time + (self._pts + self.frame_samples) / self.sample_rate
+
+        # Always through the wait coroutine, into a new array
+        read_start = time.perf_counter()
+        if due is not None and time.time() > due and engine._ring.available() < engine.frame_bytes:
+            engine.underruns += 1
+        await engine._wait_for_frame(engine.frame_bytes)
+        samples = engine._ring.read(engine.frame_bytes)
+        process_start = time.perf_counter()
+        metrics.CAPTURE_READ_SECONDS.observe(process_start - read_start)
+        if self._recv_count == 17:
+            print(f"🔍 Read completed for frame #17, got {samples.nbytes} bytes")
+
+        samples = engine.process(samples)
+        arr = samples.reshape(self.channels, -1)
+        frame = AudioFrame.from_ndarray(arr, format="s16", layout="mono" if self.channels == 1 else "stereo")
+        frame.sample_rate = self.sample_rate
+        frame.pts = self._pts
+        frame.time_base = Fraction(1, self.sample_rate)
+        num_samples = arr.shape[1]
+        metrics.CAPTURE_PROCESS_SECONDS.observe(time.perf_counter() - process_start)
+
+        if self._start_time is None:
+            self._start_time = time.time() - engine.occupancy / self.sample_rate
+        else:
+            wait_time = self._start_time + (self._pts / self.sample_rate) - time.time()
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+                metrics.CAPTURE_PACING_SECONDS.observe(wait_time)
+            else:
+                metrics.CAPTURE_PACING_SECONDS.observe(0.0)
+
+        # Amplitude of every frame, logged or not
+        frame_num = self._pts // self.frame_samples
+        avg_amplitude = np.abs(samples).mean()
+        if frame_num < 10 or frame_num % 500 == 0:
+            print(f"🎤 Frame #{frame_num}: pts={self._pts}, amp={avg_amplitude:.1f}, samples={num_samples}")
+            if frame_num % 500 == 0 and frame_num > 0:
+                stats = self.stats()
+                print(f"🎤 Ring: {stats['occupancy_ms']:.0f}ms buffered, "
+                      f"overruns={stats['overruns']}, underruns={stats['underruns']}")
+
+        self._pts += num_samples
+        metrics.CAPTURE_FRAMES.inc()
+        return frame
+
+
+async def run(frames, traced, baseline=False):
+    engine = PrefilledEngine(frames + 1)
+    track = BaselineTrack(engine) if baseline else engine.track()
+    await track.recv()
+    track._start_time = 0.0  # Every frame is "late": no pacing sleeps
+
+    if not traced:
+        start = time.perf_counter_ns()
+        for _ in range(frames):
+            await track.recv()
+        return (time.perf_counter_ns() - start) / frames
+
+    tracemalloc.start()
+    transient = 0
+    current_start = tracemalloc.get_traced_memory()[0]
+    for _ in range(frames):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        frame = await track.recv()
+        transient += tracemalloc.get_traced_memory()[1] - before
+        del frame
+    retained = tracemalloc.get_traced_memory()[0] - current_start
+    tracemalloc.stop()
+    return transient / frames, retained / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--baseline", action="store_true", help="measure the pre-trim recv() path")
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        ns = asyncio.run(run(args.frames, traced=False, baseline=args.baseline))
+        peak, retained = asyncio.run(run(min(args.frames, 5000), traced=True, baseline=args.baseline))
+
+    print(f"{'📏 Baseline' if args.baseline else '📏 Current'} recv() path")
+    print(f"⏱️  {ns:,.0f} ns per frame ({ns / 20e6:.3%} of the 20 ms budget)")
+    print(f"🧮 {peak:,.0f} bytes peak Python allocation per frame, {retained:+.1f} bytes retained per frame")
+
+
+if __name__ == "__main__":
+    main()
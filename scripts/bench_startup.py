@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: time from launching client.py until the room is streaming.
+
+Each run starts a fresh ``python client.py`` with STARTUP_PROFILE pointing
+at a temporary file against a local stand-in server (one server for all
+runs), and reads back the startup timeline written on the first pong:
+imports done, capture device open, first captured audio, offer answered,
+ICE connected and first pong, in ms since the process started.
+
+The default capture is a WAV file (no sound card needed); on a device use
+--backend ffmpeg or pyav to include opening the real microphone.
+
+Usage: python scripts/bench_startup.py [--runs 5] [--backend file] [--server URL]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from bench_e2e import free_port, start_server, write_click_track  # noqa: E402
+from startup import PHASES  # noqa: E402
+
+
+def run_client(env, profile, timeout):
+    """Start client.py, wait for its startup timeline, then stop it"""
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "client.py")], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    try:
+        while not os.path.exists(profile) or os.path.getsize(profile) == 0:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                return None
+            time.sleep(0.02)
+        time.sleep(0.01)  # Let the write finish
+        with open(profile) as f:
+            return json.load(f)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--backend", choices=["file", "ffmpeg", "pyav"], default="file")
+    parser.add_argument("--server", help="server base URL (default: start a local stand-in server)")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for each run")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    wav = os.path.join(tmp, "clicks.wav")
+    write_click_track(wav)
+
+    server = None
+    if args.server is None:
+        port = free_port()
+        server = start_server(port)
+        args.server = f"http://127.0.0.1:{port}"
+
+    runs = []
+    try:
+        for i in range(args.runs):
+            profile = os.path.join(tmp, f"startup-{i}.json")
+            env = dict(os.environ, STARTUP_PROFILE=profile, PIPECAT_SERVER=args.server,
+                       CAPTURE_BACKEND=args.backend, CAPTURE_FILE=wav, ROOM=f"startup-{i}")
+            timeline = run_client(env, profile, args.timeout)
+            if timeline is None:
+                print(f"❌ run {i + 1}: client did not stream within {args.timeout:.0f}s")
+                continue
+            runs.append(timeline)
+            print(f"run {i + 1}: streaming after {timeline['first_pong']:.0f}ms")
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    if not runs:
+        sys.exit(1)
+    print(f"\n=== boot to streaming, median of {len(runs)} runs (ms since process start) ===")
+    for phase in PHASES:
+        values = [run[phase] for run in runs if phase in run]
+        if values:
+            print(f"{phase:<14} {statistics.median(values):>7.0f}   (min {min(values):.0f}, max {max(values):.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Cost and bandwidth of the binary capture telemetry against per-frame JSON.
+
+Offline it times building the records (including the VAD that feeds them)
+and decoding them, next to the same fields sent as one JSON message per
+frame, and works out the data channel bandwidth of both. On the wire each
+message also pays roughly 85 bytes of SCTP, DTLS and UDP/IP headers, which
+is why the binary records are batched. With --live it runs client.py with
+TELEMETRY=1 against the stand-in server and reports what actually arrived.
+
+Usage: python scripts/bench_telemetry.py [--frames 20000] [--live --seconds 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from bench_e2e import free_port, start_server, write_click_track  # noqa: E402
+from telemetry import Telemetry, decode  # noqa: E402
+from vad import EnergyVad  # noqa: E402
+
+FRAME = 320
+FRAMES_PER_SECOND = 50
+WIRE_OVERHEAD = 12 + 16 + 29 + 28  # SCTP common header + DATA chunk, DTLS record, UDP/IPv4
+
+
+class NullChannel:
+    readyState = "open"
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+def speech_like(frames):
+    """Alternating 1 s of loud noise and 1 s of near silence"""
+    rng = np.random.default_rng(0)
+    out = []
+    for i in range(frames):
+        level = 6000 if (i // FRAMES_PER_SECOND) % 2 else 20
+        out.append(np.clip(rng.normal(0, level, FRAME), -32768, 32767).astype(np.int16))
+    return out
+
+
+def bench_binary(frames, audio):
+    telemetry = Telemetry(batch_ms=100)
+    channel = NullChannel()
+    telemetry.attach(channel)
+    start = time.perf_counter_ns()
+    for i in range(frames):
+        telemetry.record(audio[i % len(audio)], i * FRAME, 800)
+    encode = (time.perf_counter_ns() - start) / frames
+
+    start = time.perf_counter_ns()
+    decoded = sum(len(decode(message)) for message in channel.messages)
+    decode_ns = (time.perf_counter_ns() - start) / decoded
+    return encode, decode_ns, channel.messages
+
+
+def bench_json(frames, audio):
+    vad = EnergyVad()
+    messages = []
+    start = time.perf_counter_ns()
+    for i in range(frames):
+        samples = audio[i % len(audio)]
+        speech = vad.update(samples)
+        messages.append(json.dumps({
+            "type": "telemetry", "pts": i * FRAME, "energy_db": round(vad.energy_db, 1),
+            "vad": round(vad.probability, 3), "speech": speech,
+            "clipped": bool(samples.max() >= 32767 or samples.min() <= -32768), "queued_ms": 50,
+        }))
+    encode = (time.perf_counter_ns() - start) / frames
+
+    start = time.perf_counter_ns()
+    for message in messages:
+        json.loads(message)
+    decode_ns = (time.perf_counter_ns() - start) / frames
+    return encode, decode_ns, messages
+
+
+def bandwidth(messages, frames):
+    """Payload and estimated wire bytes per second of audio"""
+    seconds = frames / FRAMES_PER_SECOND
+    payload = sum(len(m) for m in messages)
+    return payload / seconds, (payload + WIRE_OVERHEAD * len(messages)) / seconds, len(messages) / seconds
+
+
+def live(seconds):
+    tmp = tempfile.mkdtemp()
+    wav = os.path.join(tmp, "clicks.wav")
+    write_click_track(wav)
+    port = free_port()
+    server = start_server(port)
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, PIPECAT_SERVER=url, CAPTURE_BACKEND="file", CAPTURE_FILE=wav, TELEMETRY="1")
+    client = subprocess.Popen([sys.executable, os.path.join(ROOT, "client.py")], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(seconds)
+        with urllib.request.urlopen(f"{url}/stats") as response:
+            stats = json.load(response)["telemetry"]
+    finally:
+        client.terminate()
+        client.wait()
+        server.terminate()
+        server.wait()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--live", action="store_true", help="also stream to a local stand-in server")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    audio = speech_like(1000)
+    binary = bench_binary(args.frames, audio)
+    as_json = bench_json(args.frames, audio)
+
+    print(f"{'':<16}{'encode/frame':>14}{'decode/frame':>14}{'payload':>12}{'on the wire':>14}{'messages':>10}")
+    for name, (encode, decode_ns, messages) in (("binary batched", binary), ("JSON per frame", as_json)):
+        payload, wire, rate = bandwidth(messages, args.frames)
+        print(f"{name:<16}{encode:>11,.0f} ns{decode_ns:>11,.0f} ns{payload:>8,.0f} B/s{wire:>10,.0f} B/s"
+              f"{rate:>8.1f}/s")
+    vad = EnergyVad()
+    start = time.perf_counter_ns()
+    for i in range(args.frames):
+        vad.update(audio[i % len(audio)])
+    print(f"\n(of the encode time, {(time.perf_counter_ns() - start) / args.frames:,.0f} ns per frame is the VAD "
+          f"both share; wire bytes assume ~{WIRE_OVERHEAD} bytes of headers per message)")
+
+    if args.live:
+        stats = live(args.seconds)
+        print(f"\n📡 Live, {args.seconds:.0f}s against the stand-in server: {stats['frames']} frames in "
+              f"{stats['messages']} messages, {stats['bytes'] / args.seconds:,.0f} B/s payload, "
+              f"{stats['speech_frames']} speech frames")
+
+
+if __name__ == "__main__":
+    main()
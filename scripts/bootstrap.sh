@@ -39,7 +39,7 @@ if [ ! -f "$ENV_FILE" ]; then
   sudo -n tee "$ENV_FILE" >/dev/null <<'EOF'
 ROOM=bedroom
 PIPECAT_SERVER=http://pi-voice.local:7860
-ALSA_DEVICE=plughw:1,0
+ALSA_DEVICE=auto
 EOF
   sudo -n chmod 0644 "$ENV_FILE"
   echo "⚠️  Please edit $ENV_FILE to set the correct ROOM name for this device"
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Offline harness for the playback-referenced echo suppressor.
+
+Mixes a reference (the assistant's voice) into a near-end mic recording
+through a simulated room (delay + decaying impulse response), runs the
+suppressor frame by frame exactly as the capture path would, and reports
+echo attenuation (ERLE), near-end preservation and per-frame processing time
+against the frame budget. In double talk the echo and the near-end speech
+are measured separately by applying each frame's suppression gains to each
+of them on its own.
+
+Usage: python scripts/echo_harness.py [--mic near.wav] [--ref far.wav] [--delay-ms 120]
+Both WAVs must be 16 kHz mono s16; synthetic speech-like signals are used if omitted.
+"""
+import argparse
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dsp import EchoSuppressor, StftBlock  # noqa: E402
+
+RATE = 16000
+FRAME = 320
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as wf:
+        if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getframerate() != RATE:
+            raise SystemExit(f"{path}: expected 16 kHz mono s16")
+        return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16).astype(np.float32)
+
+
+def speech_like(seconds, seed, active):
+    """Band-limited noise with a syllable-rate envelope, active in the given (start, end) spans"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * RATE)
+    noise = rng.standard_normal(n)
+    spectrum = np.fft.rfft(noise)
+    freqs = np.fft.rfftfreq(n, 1 / RATE)
+    spectrum *= (freqs > 100) & (freqs < 4000)
+    voiced = np.fft.irfft(spectrum, n)
+    t = np.arange(n) / RATE
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t + rng.uniform(0, np.pi))
+    gate = np.zeros(n)
+    for start, end in active:
+        gate[int(start * RATE):int(end * RATE)] = 1
+    return (voiced / voiced.std() * 4000 * envelope * gate).astype(np.float32)
+
+
+def room(ref, delay_ms, gain=0.5, seed=2):
+    """Delayed, attenuated reference through a short exponentially decaying impulse response"""
+    rng = np.random.default_rng(seed)
+    taps = int(0.03 * RATE)
+    ir = rng.standard_normal(taps) * np.exp(-np.arange(taps) / (0.005 * RATE))
+    ir[0] = 1.0
+    ir *= gain / np.sqrt(np.sum(ir ** 2))
+    echo = np.convolve(ref, ir)[:ref.size]
+    delay = int(delay_ms * RATE / 1000)
+    return np.concatenate([np.zeros(delay, np.float32), echo[:ref.size - delay]]).astype(np.float32)
+
+
+def power_db(x):
+    return 10 * np.log10(np.mean(x.astype(np.float64) ** 2) + 1e-9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mic", help="near-end speech WAV")
+    parser.add_argument("--ref", help="far-end (played) speech WAV")
+    parser.add_argument("--delay-ms", type=float, default=120)
+    args = parser.parse_args()
+
+    seconds = 12
+    # Far-end talks first, then near-end alone, then both (double talk)
+    far_spans = [(0.5, 5.0), (8.5, 11.5)]
+    near_spans = [(5.5, 11.5)]
+    ref = read_wav(args.ref) if args.ref else speech_like(seconds, 0, far_spans)
+    near = read_wav(args.mic) if args.mic else speech_like(seconds, 1, near_spans)
+    n = min(ref.size, near.size) // FRAME * FRAME
+    ref, near = ref[:n], near[:n]
+
+    echo = room(ref, args.delay_ms)
+    noise = np.random.default_rng(3).standard_normal(n).astype(np.float32) * 30
+    mic = np.clip(near + echo + noise, -32768, 32767).astype(np.int16)
+
+    es = EchoSuppressor(RATE, FRAME)
+    out = np.zeros(n, dtype=np.float32)
+    near_out = np.zeros(n, dtype=np.float32)
+    echo_out = np.zeros(n, dtype=np.float32)
+    near_stft, echo_stft = StftBlock(FRAME), StftBlock(FRAME)
+    double_talk = np.zeros(n // FRAME, dtype=bool)
+    times = []
+    for i in range(0, n, FRAME):
+        # The reference frame is "played" just before the matching mic frame is captured
+        es.add_reference(ref[i:i + FRAME].astype(np.int16), RATE)
+        t0 = time.perf_counter()
+        out[i:i + FRAME] = es.process(mic[i:i + FRAME])
+        times.append(time.perf_counter() - t0)
+        near_out[i:i + FRAME] = near_stft.synthesize(near_stft.analyze(near[i:i + FRAME]) * es.gain)
+        echo_out[i:i + FRAME] = echo_stft.synthesize(echo_stft.analyze(echo[i:i + FRAME]) * es.gain)
+        double_talk[i // FRAME] = es.double_talk
+
+    # Output lags by one frame
+    out, near_out, echo_out = out[FRAME:], near_out[FRAME:], echo_out[FRAME:]
+    mic_f, echo_f, near_f = mic[:-FRAME].astype(np.float32), echo[:-FRAME], near[:-FRAME]
+
+    def span(x, start, end):
+        return x[int(start * RATE):int(end * RATE)]
+
+    # Skip the first second of each span while the delay estimate converges
+    far_only = (1.5, 5.0)
+    near_only = (5.5, 8.5)
+    both = (9.0, 11.5)
+    erle = power_db(span(mic_f, *far_only)) - power_db(span(out, *far_only))
+    near_change = power_db(span(out, *near_only)) - power_db(span(near_f, *near_only))
+    dt_erle = power_db(span(echo_f, *both)) - power_db(span(echo_out, *both))
+    dt_near_change = power_db(span(near_out, *both)) - power_db(span(near_f, *both))
+    detected = double_talk[int(both[0] * RATE) // FRAME:int(both[1] * RATE) // FRAME].mean()
+    false_alarms = double_talk[int(far_only[0] * RATE) // FRAME:int(far_only[1] * RATE) // FRAME].mean()
+
+    times_ms = np.array(times) * 1000
+    budget_ms = 1000 * FRAME / RATE
+    print(f"Estimated delay:          {1000 * es.delay / RATE:.1f}ms (true {args.delay_ms:.1f}ms)")
+    print(f"Echo attenuation (ERLE):  {erle:.1f} dB (far-end only), {dt_erle:.1f} dB (double talk)")
+    print(f"Near-end level change:    {near_change:+.1f} dB (near-end only), {dt_near_change:+.1f} dB (double talk)")
+    print(f"Double talk detected:     {detected:.0%} of double-talk frames, {false_alarms:.0%} of far-end-only frames")
+    print(f"Per-frame time:           mean {times_ms.mean():.3f}ms, p99 {np.percentile(times_ms, 99):.3f}ms, "
+          f"max {times_ms.max():.3f}ms (budget {budget_ms:.0f}ms, "
+          f"{100 * times_ms.mean() / budget_ms:.1f}% of one core)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Load-test a voice server with many virtual rooms from one process.
+
+Every virtual room runs client.connect_to_server - the same offer, data
+channel room handshake and liveness pings as a real room - in one asyncio
+loop. All rooms stream from one memory-mapped WAV file, each from its own
+offset, so audio memory is shared rather than copied per room.
+
+Rooms are started evenly over --ramp seconds. With --churn each session
+lasts an exponentially distributed time with that mean before the room
+hangs up and reconnects. Every --report-every seconds a line shows the
+connected rooms, ping RTT percentiles and this process's CPU per room, so
+you can see at what room count the server's latency starts to degrade.
+
+Without --server a local stand-in server is started in a subprocess.
+
+Usage: python scripts/simulate_rooms.py --rooms 20 [--server URL] [--wav speech.wav]
+                                        [--ramp 10] [--duration 60] [--churn 30]
+"""
+import argparse
+import asyncio
+import contextlib
+import fractions
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+from aiortc import MediaStreamTrack
+from av import AudioFrame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from audio_linux import read_wav  # noqa: E402
+from bench_capture import write_test_wav  # noqa: E402
+from bench_e2e import free_port, start_server, summarize  # noqa: E402
+
+RATE = 16000
+FRAME = 320  # 20ms
+
+
+class LoopTrack(MediaStreamTrack):
+    """Real-time paced mic track reading a shared signal from ``offset``, looping"""
+
+    kind = "audio"
+
+    def __init__(self, signal: np.ndarray, offset: int = 0):
+        super().__init__()
+        self.signal = signal
+        self._pos = offset - offset % FRAME
+        self._pts = 0
+        self._start = None
+
+    async def recv(self):
+        if self._start is None:
+            self._start = time.monotonic()
+        else:
+            delay = self._start + self._pts / RATE - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if self._pos + FRAME > self.signal.size:
+            self._pos = 0
+        frame = AudioFrame.from_ndarray(self.signal[self._pos:self._pos + FRAME].reshape(1, -1),
+                                        format="s16", layout="mono")
+        frame.sample_rate = RATE
+        frame.pts = self._pts
+        frame.time_base = fractions.Fraction(1, RATE)
+        self._pos += FRAME
+        self._pts += FRAME
+        return frame
+
+
+class VirtualRoom:
+    def __init__(self, name: str, signal: np.ndarray, offset: int):
+        from reconnect import PeerPreparer, RecoveryTimer
+
+        self.name = name
+        self.signal = signal
+        self.offset = offset
+        self.peers = PeerPreparer()
+        self.recovery = RecoveryTimer()
+        self.connect_ms = []
+        self.sessions = 0
+        self.failures = 0
+        self.session = None  # session_stats of the live connection
+        self._rtt_seen = 0
+        self._stop = None
+
+    @property
+    def connected(self) -> bool:
+        return self.session is not None and "connect_ms" in self.session
+
+    def new_rtts(self):
+        """RTT samples since the last call"""
+        if self.session is None:
+            return []
+        rtts = self.session.get("rtt", [])
+        new, self._rtt_seen = rtts[self._rtt_seen:], len(rtts)
+        return new
+
+    def hang_up(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    async def run(self, client, churn: float, stopping: asyncio.Event):
+        from reconnect import Backoff
+
+        backoff = Backoff()
+        while not stopping.is_set():
+            self._stop = asyncio.Event()
+            self.session = {}
+            self._rtt_seen = 0
+            timer = None
+            if churn > 0:
+                timer = asyncio.get_running_loop().call_later(random.expovariate(1 / churn), self._stop.set)
+            self.sessions += 1
+            try:
+                ok = await client.connect_to_server(
+                    audio_track=LoopTrack(self.signal, self.offset),
+                    stop_event=self._stop,
+                    room=self.name,
+                    peers=self.peers,
+                    recovery=self.recovery,
+                    session_stats=self.session,
+                )
+            except Exception as e:
+                print(f"❌ {self.name}: {e}")
+                ok = False
+            finally:
+                if timer:
+                    timer.cancel()
+            if "connect_ms" in self.session:
+                self.connect_ms.append(self.session["connect_ms"])
+            self.session = None
+            if stopping.is_set():
+                break
+            if ok:
+                backoff.reset()
+                await asyncio.sleep(random.uniform(0.5, 2.0))  # Between hang-up and the next call
+            else:
+                self.failures += 1
+                await asyncio.sleep(backoff.next_delay())
+
+
+async def report(rooms, interval, out, all_rtts):
+    cpu_last, t_last = time.process_time(), time.monotonic()
+    start = t_last
+    print(f"{'time':>6} {'rooms':>6} {'rtt p50':>9} {'rtt p95':>9} {'CPU':>7} {'CPU/room':>10}", file=out)
+    while True:
+        await asyncio.sleep(interval)
+        now, cpu = time.monotonic(), time.process_time()
+        rtts = [rtt * 1000 for room in rooms for rtt in room.new_rtts()]
+        all_rtts.append((sum(room.connected for room in rooms), rtts))
+        connected = all_rtts[-1][0]
+        usage = (cpu - cpu_last) / (now - t_last)
+        stats = summarize(rtts)
+        p50 = f"{stats['median']:.1f}ms" if rtts else "-"
+        p95 = f"{stats['p95']:.1f}ms" if rtts else "-"
+        per_room = f"{usage * 1000 / connected:.1f}ms/s" if connected else "-"
+        print(f"{now - start:>5.0f}s {connected:>6} {p50:>9} {p95:>9} {usage:>6.0%} {per_room:>10}",
+              file=out, flush=True)
+        cpu_last, t_last = cpu, now
+
+
+async def simulate(args, signal, out):
+    import client
+    import reconnect
+
+    reconnect.MAX_CONNECTIONS_PER_HOST = max(reconnect.MAX_CONNECTIONS_PER_HOST, args.rooms)
+    stopping = asyncio.Event()
+    # Rooms start at different points of the file so they don't speak in unison
+    rooms = [VirtualRoom(f"{args.prefix}-{i}", signal, random.randrange(signal.size))
+             for i in range(args.rooms)]
+    samples = []
+    reporter = asyncio.ensure_future(report(rooms, args.report_every, out, samples))
+
+    cpu_start, t_start = time.process_time(), time.monotonic()
+    tasks = []
+    for i, room in enumerate(rooms):
+        tasks.append(asyncio.ensure_future(room.run(client, args.churn, stopping)))
+        if args.ramp and i < len(rooms) - 1:
+            await asyncio.sleep(args.ramp / len(rooms))
+    await asyncio.sleep(max(0.0, args.duration - (time.monotonic() - t_start)))
+    cpu = time.process_time() - cpu_start
+    elapsed = time.monotonic() - t_start
+
+    stopping.set()
+    for room in rooms:
+        room.hang_up()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    reporter.cancel()
+    for room in rooms:
+        with contextlib.suppress(Exception):
+            await (await room.peers.take()).pc.close()
+    await reconnect.get_http_session().close()
+
+    room_seconds = sum(active for active, _ in samples) * args.report_every
+    return rooms, samples, cpu, elapsed, room_seconds
+
+
+def print_summary(args, rooms, samples, cpu, elapsed, room_seconds, out):
+    connects = [ms for room in rooms for ms in room.connect_ms]
+    rtts = [rtt for _, batch in samples for rtt in batch]
+    c, r = summarize(connects), summarize(rtts)
+    print(f"\n=== {args.rooms} rooms, {elapsed:.0f}s ===", file=out)
+    print(f"sessions         {sum(room.sessions for room in rooms)} "
+          f"({sum(room.failures for room in rooms)} failed)", file=out)
+    if c["n"]:
+        print(f"connect          median {c['median']:.0f}ms  p95 {c['p95']:.0f}ms  max {c['max']:.0f}ms", file=out)
+    if r["n"]:
+        p99 = sorted(rtts)[min(len(rtts) - 1, int(len(rtts) * 0.99))]
+        print(f"ping RTT         median {r['median']:.1f}ms  p95 {r['p95']:.1f}ms  p99 {p99:.1f}ms", file=out)
+    if room_seconds:
+        print(f"client CPU       {cpu * 1000 / room_seconds:.1f}ms per room-second "
+              f"({cpu / elapsed:.0%} of a core in total)", file=out)
+
+    if args.per_room:
+        print(f"\n{'room':<16} {'sessions':>8} {'failed':>7} {'connect p50':>12} {'connect max':>12}", file=out)
+        for room in rooms:
+            s = summarize(room.connect_ms)
+            p50 = f"{s['median']:.0f}ms" if s["n"] else "-"
+            worst = f"{s['max']:.0f}ms" if s["n"] else "-"
+            print(f"{room.name:<16} {room.sessions:>8} {room.failures:>7} {p50:>12} {worst:>12}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--server", help="server base URL (default: start a local stand-in server)")
+    parser.add_argument("--wav", help="mic audio shared by all rooms (default: generated)")
+    parser.add_argument("--ramp", type=float, default=10, help="seconds over which rooms are started")
+    parser.add_argument("--duration", type=float, default=60, help="total run time in seconds")
+    parser.add_argument("--churn", type=float, default=0, help="mean session length in seconds (0: no churn)")
+    parser.add_argument("--report-every", type=float, default=5)
+    parser.add_argument("--prefix", default="sim", help="room name prefix")
+    parser.add_argument("--per-room", action="store_true", help="print a line per room")
+    parser.add_argument("--verbose", action="store_true", help="show the client's log")
+    args = parser.parse_args()
+
+    wav = args.wav
+    if wav is None:
+        wav = os.path.join(tempfile.mkdtemp(), "rooms.wav")
+        write_test_wav(wav, 30, sample_rate=RATE)
+    signal = read_wav(wav, RATE, 1)
+
+    server = None
+    if args.server is None:
+        port = free_port()
+        server = start_server(port)
+        args.server = f"http://127.0.0.1:{port}"
+
+    import client
+    client.OFFER_URL = f"{args.server.rstrip('/')}/api/offer"
+    print(f"🏘️  Simulating {args.rooms} rooms against {args.server}")
+
+    out = sys.stdout
+    log = sys.stdout if args.verbose else open(os.devnull, "w")
+    try:
+        with contextlib.redirect_stdout(log):
+            results = asyncio.run(simulate(args, signal, out))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    print_summary(args, *results, out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+A local stand-in for the voice server, for tests and benchmarks.
+
+It answers offers on ``/api/offer`` like the real server, echoes data
+channel pings as pongs, counts binary telemetry messages (telemetry.py),
+records the mic audio it receives and streams silence back as the bot's
+voice. ``loss`` drops that share of the mic's RTP packets on arrival, as a
+lossy link would, and the RTCP receiver reports tell the client. ``freeze()`` makes it behave like a hung
+server (no pongs, no audio, connection left open); ``drop()`` closes every
+peer connection.
+
+When run as a script the same controls are exposed over HTTP so a
+benchmark can drive it from another process:
+
+    POST /control/freeze, /control/thaw, /control/drop, /control/reset,
+         /control/slow?seconds=0.5 (delay every HTTP answer; 0 undoes it),
+         /control/loss?rate=0.05 (drop that share of incoming RTP)
+    GET  /stats
+
+Usage: python standin_server.py [--port 7860] [--record received.wav]
+"""
+import argparse
+import asyncio
+import fractions
+import json
+import random
+import time
+import wave
+
+import numpy as np
+from aiohttp import web
+from aiortc import MediaStreamTrack, RTCPeerConnection, RTCSessionDescription
+from aiortc.mediastreams import MediaStreamError
+from av import AudioFrame
+
+from telemetry import CLIPPED, SPEECH, decode
+
+
+class BotVoiceTrack(MediaStreamTrack):
+    """Real-time paced 20ms frames of silence; stalls while the server is frozen"""
+
+    kind = "audio"
+
+    def __init__(self, server, sample_rate: int = 48000):
+        super().__init__()
+        self.server = server
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate // 50
+        self._pts = 0
+        self._start = None
+        self._silence = np.zeros((1, self.frame_samples), dtype=np.int16)
+
+    async def recv(self):
+        await self.server.running.wait()
+        if self._start is None:
+            self._start = time.monotonic()
+        self._pts += self.frame_samples
+        delay = self._start + self._pts / self.sample_rate - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        frame = AudioFrame.from_ndarray(self._silence, format="s16", layout="mono")
+        frame.sample_rate = self.sample_rate
+        frame.pts = self._pts
+        frame.time_base = fractions.Fraction(1, self.sample_rate)
+        return frame
+
+
+class ReceivedAudio:
+    """
+    What the server heard: frame arrival jitter and the arrival times of
+    loud onsets (for mouth-to-server latency with a click-track source).
+
+    Jitter is the RFC 3550 interarrival jitter over decoded frames; times
+    are ``time.monotonic()``, which is shared by processes on one machine.
+    """
+
+    def __init__(self, onset_threshold: int = 3000, quiet_ms: int = 200, record_path: str = None):
+        self.onset_threshold = onset_threshold
+        self.quiet_ms = quiet_ms
+        self.record_path = record_path
+        self._wav = None
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.streams = 0
+        self.onsets = []
+        self.jitter = 0.0
+        self.max_jitter = 0.0
+        self.gaps = 0
+        self._last = None
+        self._quiet_since = None
+        self._next_pts = None
+
+    def new_stream(self):
+        self.streams += 1
+        self._last = None
+        self._next_pts = None
+
+    def add(self, frame, arrival: float):
+        self.frames += 1
+        seconds = float(frame.pts * frame.time_base) if frame.pts is not None else None
+        if self._last is not None and seconds is not None:
+            last_arrival, last_seconds = self._last
+            spacing = arrival - last_arrival
+            transit_change = spacing - (seconds - last_seconds)
+            self.jitter += (abs(transit_change) - self.jitter) / 16
+            self.max_jitter = max(self.max_jitter, self.jitter)
+            if spacing > 0.06:
+                self.gaps += 1
+        self._last = (arrival, seconds)
+
+        samples = frame.to_ndarray()
+        peak = int(np.abs(samples).max()) if samples.size else 0
+        if peak >= self.onset_threshold:
+            if self._quiet_since is not None and arrival - self._quiet_since >= self.quiet_ms / 1000:
+                self.onsets.append(arrival)
+            self._quiet_since = None
+        elif self._quiet_since is None:
+            self._quiet_since = arrival
+
+        if self.record_path:
+            self._record(frame, samples)
+
+    def _record(self, frame, samples):
+        if self._wav is None:
+            self._wav = wave.open(self.record_path, "wb")
+            self._wav.setnchannels(len(frame.layout.channels))
+            self._wav.setsampwidth(2)
+            self._wav.setframerate(frame.sample_rate)
+        if frame.pts is not None:
+            # Lost or DTX-suppressed packets are written as silence so the recording keeps time
+            if self._next_pts is not None and 0 < frame.pts - self._next_pts <= frame.sample_rate:
+                self._wav.writeframes(bytes(2 * len(frame.layout.channels) * (frame.pts - self._next_pts)))
+            self._next_pts = frame.pts + frame.samples
+        self._wav.writeframes(samples.astype(np.int16).tobytes())
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "streams": self.streams,
+            "onsets": self.onsets,
+            "jitter_ms": self.jitter * 1000,
+            "max_jitter_ms": self.max_jitter * 1000,
+            "gaps": self.gaps,
+        }
+
+
+class StandinServer:
+    def __init__(self, record_path: str = None):
+        self.pcs = set()
+        self.running = asyncio.Event()
+        self.running.set()
+        self.received = ReceivedAudio(record_path=record_path)
+        self.offers = 0
+        self.pings = 0
+        self.http_delay = 0.0  # Added to every HTTP request, like an overloaded server
+        self.loss = 0.0  # Share of incoming RTP packets dropped
+        self.rtp = {"packets": 0, "bytes": 0, "dropped": 0, "seconds": 0.0}
+        self._rtp_first = None
+        self.telemetry = {"messages": 0, "bytes": 0, "frames": 0, "speech_frames": 0, "clipped_frames": 0}
+        self._runner = None
+        self.url = None
+
+    def freeze(self):
+        """Stop answering pings and sending audio, without closing anything"""
+        self.running.clear()
+
+    def thaw(self):
+        self.running.set()
+
+    async def drop(self):
+        for pc in list(self.pcs):
+            await pc.close()
+        self.pcs.clear()
+
+    def stats(self) -> dict:
+        return {"offers": self.offers, "pings": self.pings, "peers": len(self.pcs),
+                "telemetry": self.telemetry, "rtp": self.rtp, **self.received.stats()}
+
+    def _lossy(self, receiver):
+        """Count the receiver's RTP and drop ``loss`` of it before the jitter buffer"""
+        handle = receiver._handle_rtp_packet
+
+        async def handle_rtp_packet(packet, arrival_time_ms):
+            now = time.monotonic()
+            if self._rtp_first is None:
+                self._rtp_first = now
+            self.rtp["seconds"] = now - self._rtp_first
+            self.rtp["packets"] += 1
+            self.rtp["bytes"] += len(packet.serialize())
+            if self.loss and random.random() < self.loss:
+                self.rtp["dropped"] += 1
+                return
+            await handle(packet, arrival_time_ms)
+
+        receiver._handle_rtp_packet = handle_rtp_packet
+
+    def _telemetry(self, message: bytes):
+        records = decode(message)
+        stats = self.telemetry
+        stats["messages"] += 1
+        stats["bytes"] += len(message)
+        stats["frames"] += len(records)
+        stats["speech_frames"] += int(np.count_nonzero(records["flags"] & SPEECH))
+        stats["clipped_frames"] += int(np.count_nonzero(records["flags"] & CLIPPED))
+
+    async def _consume(self, track):
+        self.received.new_stream()
+        try:
+            while True:
+                frame = await track.recv()
+                self.received.add(frame, time.monotonic())
+        except MediaStreamError:
+            pass
+
+    async def handle_offer(self, request):
+        params = await request.json()
+        self.offers += 1
+        pc = RTCPeerConnection()
+        self.pcs.add(pc)
+
+        @pc.on("track")
+        def on_track(track):
+            asyncio.ensure_future(self._consume(track))
+
+        @pc.on("datachannel")
+        def on_datachannel(channel):
+            @channel.on("message")
+            def on_message(message):
+                if isinstance(message, bytes):
+                    self._telemetry(message)
+                    return
+                try:
+                    data = json.loads(message)
+                except (json.JSONDecodeError, TypeError):
+                    return
+                if data.get("type") == "ping" and self.running.is_set():
+                    self.pings += 1
+                    channel.send(json.dumps({"type": "pong", "timestamp": data.get("timestamp")}))
+
+        @pc.on("connectionstatechange")
+        async def on_connectionstatechange():
+            if pc.connectionState in ("failed", "closed"):
+                self.pcs.discard(pc)
+
+        await pc.setRemoteDescription(RTCSessionDescription(params["sdp"], params["type"]))
+        for transceiver in pc.getTransceivers():
+            self._lossy(transceiver.receiver)
+        pc.addTrack(BotVoiceTrack(self))  # Reuses the offered audio transceiver
+        await pc.setLocalDescription(await pc.createAnswer())
+        return web.json_response({"sdp": pc.localDescription.sdp, "type": pc.localDescription.type})
+
+    async def handle_control(self, request):
+        action = request.match_info["action"]
+        if action == "freeze":
+            self.freeze()
+        elif action == "thaw":
+            self.thaw()
+        elif action == "drop":
+            await self.drop()
+        elif action == "reset":
+            self.received.reset()
+            self.rtp = {"packets": 0, "bytes": 0, "dropped": 0, "seconds": 0.0}
+            self._rtp_first = None
+        elif action == "slow":
+            self.http_delay = float(request.query.get("seconds", "0.5"))
+        elif action == "loss":
+            self.loss = float(request.query.get("rate", "0.05"))
+        else:
+            raise web.HTTPNotFound()
+        return web.json_response(self.stats())
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats())
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving; returns the base URL (port 0 picks a free port)"""
+        @web.middleware
+        async def delay(request, handler):
+            if self.http_delay and not request.path.startswith("/control/"):
+                await asyncio.sleep(self.http_delay)
+            return await handler(request)
+
+        app = web.Application(middlewares=[delay])
+        app.router.add_post("/api/offer", self.handle_offer)
+        app.router.add_post("/control/{action}", self.handle_control)
+        app.router.add_get("/stats", self.handle_stats)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        self.thaw()
+        await self.drop()
+        self.received.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local stand-in voice server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument("--record", help="write the received mic audio to this WAV file")
+    args = parser.parse_args()
+
+    server = StandinServer(record_path=args.record)
+    url = await server.start(args.host, args.port)
+    print(f"🧪 Stand-in server on {url}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,61 @@
+"""
+Boot-to-streaming timeline.
+
+``mark(phase)`` records when each startup phase first completes, measured
+from the start of the process, so interpreter startup and imports count.
+With ``STARTUP_PROFILE`` set the timeline is printed when the first pong
+arrives, i.e. once the room is streaming and the server answers; if
+``STARTUP_PROFILE`` is a file path the timeline is also written there as JSON.
+
+Only the standard library is imported here: this module is loaded before
+anything heavy.
+"""
+import json
+import os
+import time
+
+PHASES = ("imports", "device_open", "first_frame", "offer_posted", "ice_connected", "first_pong")
+PROFILE = os.environ.get("STARTUP_PROFILE", "")
+
+
+def _process_start() -> float:
+    """Monotonic time this process was started (Linux), else now"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        age = uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+        return time.monotonic() - max(0.0, age)
+    except (OSError, ValueError, IndexError):
+        return time.monotonic()
+
+
+STARTED = _process_start()
+_marks = {}
+
+
+def mark(phase: str):
+    """Record the first time ``phase`` is reached"""
+    if phase in _marks:
+        return
+    _marks[phase] = time.monotonic()
+    if PROFILE and phase == PHASES[-1]:
+        report()
+
+
+def timeline() -> dict:
+    """Milliseconds from process start to each phase reached so far"""
+    return {phase: (_marks[phase] - STARTED) * 1000 for phase in PHASES if phase in _marks}
+
+
+def report():
+    ms = timeline()
+    print("🚀 Startup timeline (ms since process start):")
+    previous = 0.0
+    for phase, at in sorted(ms.items(), key=lambda item: item[1]):
+        print(f"   {phase:<14} {at:>7.0f}  (+{at - previous:.0f})")
+        previous = at
+    if PROFILE != "1":
+        with open(PROFILE, "w") as f:
+            json.dump(ms, f)
@@ -0,0 +1,159 @@
+"""
+Per-frame capture telemetry sent to the server as binary data channel messages.
+
+For each captured frame the client reports its energy, a VAD speech
+probability, whether it clipped and how long it waited in the capture
+queue, so the server can endpoint turns without waiting for its own VAD
+and skip work on silent frames. Records are fixed-size (8 bytes) and
+written into a preallocated numpy buffer; a message goes out every
+``batch_ms`` and immediately when speech starts or stops. No JSON is
+encoded per frame.
+
+Message layout (little-endian)::
+
+    header  "VT", version (u8), record count (u8)
+    record  pts (u32)      pts of the frame as sent on the mic track (capture-rate samples), low 32 bits
+            energy (u8)    frame level in -0.5 dBFS steps (0 = full scale, 255 = -127.5 dBFS or below)
+            vad (u8)       speech probability * 255
+            flags (u8)     SPEECH | CLIPPED | SILENT
+            queued (u8)    capture queue latency in 4 ms steps (255 = 1020 ms or more)
+
+Records are made by ``TelemetryTrack``, the last track before the sender,
+so they carry the pts each frame is sent with, even when a VAD gate or an
+on-demand replay renumbers the frames. They are not RTP timestamps: aiortc
+starts each session's RTP timestamps at a random offset and counts them at
+Opus's 48 kHz. A server maps a record to RTP as
+``rtp = offset + pts * 48000 / sample_rate`` (mod 2**32), where ``offset``
+is fixed for the session and found from the first packet, which carries
+the audio of the first record. SPEECH is the gate's decision when there is
+one. The room announcement
+carries ``describe()`` so the server knows the capture rate and frame size
+the pts count in. Servers that ignore binary messages are unaffected.
+"""
+import struct
+
+import numpy as np
+from aiortc import MediaStreamTrack
+
+from vad import EnergyVad
+
+MAGIC = b"VT"
+VERSION = 1
+HEADER = struct.Struct("<2sBB")
+RECORD = np.dtype([("pts", "<u4"), ("energy", "u1"), ("vad", "u1"), ("flags", "u1"), ("queued", "u1")])
+
+SPEECH = 1   # VAD gate open
+CLIPPED = 2  # A sample hit full scale
+SILENT = 4   # At the noise floor: nothing worth transcribing
+
+
+def decode(message: bytes) -> np.ndarray:
+    """Records of one telemetry message, as a structured array with RECORD fields"""
+    magic, version, count = HEADER.unpack_from(message)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"not a v{VERSION} telemetry message")
+    return np.frombuffer(message, dtype=RECORD, count=count, offset=HEADER.size)
+
+
+class Telemetry:
+    """
+    Builds and sends the telemetry for the frames sent upstream. A
+    ``TelemetryTrack`` calls ``record()`` for each of them; a connection
+    ``attach()``es its data channel once it is open.
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_samples: int = 320, batch_ms: int = 100, vad=None):
+        self.sample_rate = sample_rate
+        self.frame_samples = frame_samples
+        frame_ms = frame_samples * 1000 // sample_rate
+        self.batch = max(1, min(255, batch_ms // frame_ms))
+        self.vad = vad or EnergyVad()
+        self.channel = None
+        self.messages = 0
+        self.bytes = 0
+
+        self._message = bytearray(HEADER.size + self.batch * RECORD.itemsize)
+        HEADER.pack_into(self._message, 0, MAGIC, VERSION, 0)
+        self._records = np.frombuffer(self._message, dtype=RECORD, offset=HEADER.size)
+        self._count = 0
+        self._speech = False
+        self._queued_step = sample_rate * 4 // 1000  # Samples per 4 ms step
+
+    def describe(self) -> dict:
+        """For the room announcement"""
+        return {"version": VERSION, "sample_rate": self.sample_rate, "frame_samples": self.frame_samples}
+
+    def attach(self, channel):
+        self.channel = channel
+        self._count = 0
+
+    def detach(self, channel):
+        if self.channel is channel:
+            self.channel = None
+
+    def record(self, samples: np.ndarray, pts: int, queued: int, speech: bool = None):
+        """
+        One frame of int16 mono samples as sent, with ``queued`` samples still
+        waiting behind it. ``speech`` is the VAD gate's decision for the frame;
+        without a gate our own VAD decides.
+        """
+        if self.channel is None:
+            return
+        vad = self.vad
+        gated = vad.update(samples)
+        if speech is None:
+            speech = gated
+        probability = vad.probability
+        flags = SPEECH if speech else 0
+        if probability == 0.0:
+            flags |= SILENT
+        if samples.max() >= 32767 or samples.min() <= -32768:
+            flags |= CLIPPED
+        self._records[self._count] = (
+            pts & 0xFFFFFFFF,
+            min(255, int(-2 * vad.energy_db)),
+            int(probability * 255),
+            flags,
+            min(255, queued // self._queued_step),
+        )
+        self._count += 1
+        # Speech onsets and ends go out straight away: they are what the server waits for
+        if self._count == self.batch or speech != self._speech:
+            self._speech = speech
+            self.flush()
+
+    def flush(self):
+        count, self._count = self._count, 0
+        channel = self.channel
+        if not count or channel is None or channel.readyState != "open":
+            return
+        self._message[3] = count
+        message = bytes(self._message[:HEADER.size + count * RECORD.itemsize])
+        channel.send(message)
+        self.messages += 1
+        self.bytes += len(message)
+
+
+class TelemetryTrack(MediaStreamTrack):
+    """
+    Passes ``source``'s frames through to the sender and records each one as
+    it goes out. A source with a ``speaking`` attribute (a VAD gate) supplies
+    the SPEECH flag; ``queued()`` returns the capture backlog in samples.
+    """
+    kind = "audio"
+
+    def __init__(self, source: MediaStreamTrack, telemetry: Telemetry, queued=lambda: 0):
+        super().__init__()
+        self.source = source
+        self.telemetry = telemetry
+        self.queued = queued
+
+    async def recv(self):
+        frame = await self.source.recv()
+        samples = frame.to_ndarray().reshape(-1)[::len(frame.layout.channels)]
+        self.telemetry.record(samples, frame.pts, self.queued(), getattr(self.source, "speaking", None))
+        return frame
+
+    def stop(self):
+        super().stop()
+        self.source.stop()
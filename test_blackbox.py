@@ -0,0 +1,85 @@
+"""
+Check the black-box recorder: wraparound, reopening after a restart and cutting a window out
+"""
+import os
+import tempfile
+import time
+from fractions import Fraction
+
+import numpy as np
+from av import AudioFrame
+
+from blackbox import BlackBox
+
+RATE = 16000
+FRAME = 320
+
+
+def make_box(minutes=1 / 60):
+    path = os.path.join(tempfile.mkdtemp(), "blackbox")
+    return path, BlackBox(path, minutes=minutes)
+
+
+def test_ring_keeps_the_latest_audio():
+    _, box = make_box()  # 1s ring = 50 frames
+    for i in range(120):
+        box.capture(np.full(FRAME, i, dtype=np.int16), i * FRAME)
+    entries = box.mic.entries()
+    assert len(entries) == 50 and entries["pts"][0] == 70 * FRAME
+    values = [box.mic.read(int(e["pos"]), int(e["pos"]) + FRAME)[0] for e in entries]
+    assert values == list(range(70, 120))
+    print("✅ Ring wraps around and keeps the last second")
+
+
+def test_reopen_keeps_recording():
+    path, box = make_box()
+    box.capture(np.full(FRAME, 7, dtype=np.int16), 0)
+    box.mark("connection connected")
+    box.close()
+    box = BlackBox(path, minutes=1 / 60)
+    box.capture(np.full(FRAME, 8, dtype=np.int16), FRAME)
+    assert box.mic.frames == 2 and box.mic.position == 2 * FRAME
+    assert [e["label"] for e in box.events()] == [b"connection connected"]
+    box.close()
+    reader = BlackBox(path, readonly=True)
+    assert reader.mic.frames == 2
+    reader.close()
+    print("✅ Recording survives a restart")
+
+
+def test_dump_window_lines_up_with_the_clock():
+    _, box = make_box(minutes=0.1)
+    base = time.time() - 10
+    # Two 1-second bursts with a 2-second gap (e.g. while reconnecting)
+    for i in range(100):
+        wall = base + (i + 1) * FRAME / RATE + (2.0 if i >= 50 else 0.0)
+        box.mic.write(np.full(FRAME, 1000 + i, dtype=np.int16), i * FRAME, wall)
+    audio = box.dump("mic", base, base + 4.0)
+    assert abs(audio.size - 4 * RATE) <= FRAME, audio.size
+    assert np.all(audio[RATE + FRAME:3 * RATE - FRAME] == 0)  # The gap is silence
+    assert audio[0] == 1000 and audio[-1] == 1099
+    # A window in the middle starts at the right frame
+    middle = box.dump("mic", base + 0.5, base + 1.0)
+    assert middle[0] == 1000 + 24, middle[0]
+    print(f"✅ Dump of a 4s window: {audio.size / RATE:.2f}s with the 2s gap as silence")
+
+
+def test_received_frames_are_decimated():
+    _, box = make_box()
+    frame = AudioFrame(format="s16", layout="stereo", samples=960)
+    frame.planes[0].update(np.repeat(np.arange(960, dtype=np.int16), 2).tobytes())
+    frame.sample_rate = 48000
+    frame.pts = 960
+    frame.time_base = Fraction(1, 48000)
+    box.received(frame)
+    samples = box.bot.read(0, box.bot.position)
+    assert samples.size == 320 and samples[0] == 1 and samples[-1] == 958
+    assert box.bot.entries()["pts"][0] == 320
+    print("✅ 48kHz stereo bot audio recorded as 16kHz mono")
+
+
+if __name__ == "__main__":
+    test_ring_keeps_the_latest_audio()
+    test_reopen_keeps_recording()
+    test_dump_window_lines_up_with_the_clock()
+    test_received_frames_are_decimated()
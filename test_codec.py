@@ -0,0 +1,137 @@
+"""
+Check the per-room Opus settings: the offer, the encoder and loss adaptation
+"""
+import asyncio
+import fractions
+
+import numpy as np
+from aiortc import RTCPeerConnection, RTCSessionDescription
+from av import AudioFrame
+
+import codec
+
+RATE = 16000
+FRAME = 320
+
+
+def frames(start, count, level):
+    """A 180 Hz voice at ``level`` talking 0.4 s and pausing 0.1 s, over faint noise"""
+    rng = np.random.default_rng(start)
+    for i in range(start, start + count):
+        t = (np.arange(FRAME) + i * FRAME) / RATE
+        talking = i % 25 < 20
+        samples = np.sin(2 * np.pi * 180 * t) * level * talking + rng.standard_normal(FRAME) * 10
+        frame = AudioFrame.from_ndarray(samples.astype(np.int16)[None], format="s16", layout="mono")
+        frame.sample_rate = RATE
+        frame.pts = i * FRAME
+        frame.time_base = fractions.Fraction(1, RATE)
+        yield frame
+
+
+def test_offer_carries_the_room_settings():
+    async def run():
+        settings = codec.OpusSettings(bitrate=24000, channels=1, ptime=40, fec=True, dtx=True)
+        client, server = RTCPeerConnection(), RTCPeerConnection()
+        try:
+            transceiver = client.addTransceiver("audio", direction="sendrecv")
+            codec.prefer_opus(transceiver)
+            await client.setLocalDescription(await client.createOffer())
+            offer = codec.munge_offer(client.localDescription.sdp, settings)
+            # A server still accepts the munged offer
+            await server.setRemoteDescription(RTCSessionDescription(offer, "offer"))
+            await server.setLocalDescription(await server.createAnswer())
+            assert "opus/48000" in server.localDescription.sdp
+        finally:
+            await client.close()
+            await server.close()
+        return offer
+
+    offer = asyncio.run(run())
+    lines = offer.split("\r\n")
+    audio = next(line for line in lines if line.startswith("m=audio"))
+    assert audio.split()[3:] == ["96"], audio  # Opus only
+    assert "a=fmtp:96 minptime=10;useinbandfec=1;usedtx=1;maxaveragebitrate=24000;stereo=0;sprop-stereo=0" in lines
+    assert "a=ptime:40" in lines
+    print("✅ Offer is Opus only, with the room's fmtp and ptime")
+
+
+def test_rooms_without_opus_settings_keep_aiortc_defaults():
+    default = codec.profile("default", ptime=10)
+    assert (default.bitrate, default.channels) == (96000, 2) and not codec.customized(default)
+    speech = codec.profile("speech", bitrate=None, dtx=True)
+    assert (speech.bitrate, speech.channels, speech.dtx) == (32000, 1, True) and codec.customized(speech)
+    assert codec.customized(codec.profile("default", fec=True))
+    try:
+        codec.profile("loud")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown profile accepted")
+    print("✅ Without settings of its own a room keeps aiortc's 96 kbps stereo; the speech profile is opt-in")
+
+
+def test_encoder_bitrate_dtx_and_live_reconfigure():
+    sizes = {}
+    for bitrate in (16000, 64000):
+        codec.configure(codec.OpusSettings(bitrate=bitrate, channels=1))
+        encoder = codec.OpusEncoder()
+        sizes[bitrate] = sum(len(p) for frame in frames(0, 100, 6000) for p in encoder.encode(frame)[0])
+    assert 3 < sizes[64000] / sizes[16000] < 5, sizes
+
+    codec.configure(codec.OpusSettings(bitrate=32000, channels=1, dtx=True))
+    encoder = codec.OpusEncoder()
+    sent = [ts for frame in frames(0, 100, 6000) for ts in [encoder.encode(frame)[1]] if ts is not None]
+    assert len(sent) >= 98 and encoder.dropped == 0  # Speech is never dropped
+    quiet = [ts for frame in frames(100, 100, 0) for ts in [encoder.encode(frame)[1]] if ts is not None]
+    assert len(quiet) < 30 and encoder.dropped > 70, (len(quiet), encoder.dropped)
+
+    settings = codec.current()
+    settings.dtx = False
+    settings.bitrate = 12000
+    encoder.reconfigure(settings)
+    after = [encoder.encode(frame) for frame in frames(200, 20, 6000)]
+    timestamps = [ts for _, ts in after if ts is not None]
+    assert np.all(np.diff(timestamps) == 960), timestamps  # RTP timestamps carry on
+    assert np.mean([len(p[0]) for p, _ in after if p][5:]) < 40  # 12 kbps is 30 bytes per 20 ms
+    codec.configure(codec.OpusSettings())
+    print(f"✅ 16 vs 64 kbps: {sizes[16000]} vs {sizes[64000]} bytes; "
+          f"DTX sent {len(quiet)} of 100 silent packets; bitrate changed mid-stream")
+
+
+def test_aiortc_hooks_are_verified_on_other_versions():
+    tested = codec.TESTED_AIORTC
+    try:
+        codec.TESTED_AIORTC, codec._hooks_ok = "0.0.0", None  # Force the check the tested version skips
+        assert codec._aiortc_hooks()
+    finally:
+        codec.TESTED_AIORTC, codec._hooks_ok = tested, None
+    print("✅ aiortc's encoder lookup and sender encoder slot are where codec.py expects them")
+
+
+def test_loss_adapter_steps_down_and_back():
+    adapter = codec.LossAdapter(codec.OpusSettings(bitrate=32000, channels=1), calm=2)
+    expected = lost = 0
+    assert not adapter.update(expected, lost)
+    for _ in range(3):
+        expected, lost = expected + 100, lost + 8
+        assert adapter.update(expected, lost)
+    assert adapter.settings.fec and adapter.settings.packet_loss == 8
+    assert adapter.settings.bitrate == 16384
+    for _ in range(3):
+        expected, lost = expected + 100, lost + 2  # Between the thresholds: hold
+        assert not adapter.update(expected, lost)
+    steps = 0
+    while adapter.settings.bitrate < 32000:
+        expected += 100
+        adapter.update(expected, lost)
+        steps += 1
+    assert not adapter.settings.fec and steps < 10
+    print(f"✅ 8% loss: FEC on and bitrate down to {16384 / 1000:.1f} kbps; back to 32 kbps after {steps} calm reports")
+
+
+if __name__ == "__main__":
+    test_offer_carries_the_room_settings()
+    test_rooms_without_opus_settings_keep_aiortc_defaults()
+    test_encoder_bitrate_dtx_and_live_reconfigure()
+    test_aiortc_hooks_are_verified_on_other_versions()
+    test_loss_adapter_steps_down_and_back()
@@ -0,0 +1,73 @@
+"""
+Check noise suppression and AGC on synthetic speech bursts in steady noise
+"""
+import numpy as np
+
+from dsp import AutomaticGainControl, NoiseSuppressor
+
+RATE = 16000
+FRAME = 320
+
+
+def db(x):
+    return 10 * np.log10(np.mean(np.asarray(x, dtype=np.float64) ** 2) / 32768 ** 2 + 1e-12)
+
+
+def run(stage, audio):
+    return np.concatenate([stage.process(audio[i:i + FRAME].astype(np.int16))
+                           for i in range(0, audio.size - FRAME + 1, FRAME)]).astype(np.float64)
+
+
+def bursts(seconds=8, level=1000, noise=100):
+    """A 440 Hz tone for 1 s in every 2, over white noise"""
+    rng = np.random.default_rng(0)
+    t = np.arange(seconds * RATE) / RATE
+    tone = level * np.sqrt(2) * np.sin(2 * np.pi * 440 * t) * ((t.astype(int) % 2) == 1)
+    return tone, tone + rng.standard_normal(t.size) * noise
+
+
+def test_noise_is_removed_between_words():
+    tone, noisy = bursts()
+    out = run(NoiseSuppressor(RATE, FRAME), noisy)[FRAME:]  # One frame of latency
+    settled = np.arange(out.size) > 2 * RATE
+    gaps = settled & (np.arange(out.size) // RATE % 2 == 0)
+    words = settled & ~gaps
+    suppressed = db(noisy[:out.size][gaps]) - db(out[gaps])
+    kept = db(out[words]) - db(tone[:out.size][words])
+    assert suppressed > 12, suppressed
+    assert abs(kept) < 1.5, kept
+    print(f"✅ Noise between words down {suppressed:.1f} dB, tone level within {abs(kept):.1f} dB")
+
+
+def test_agc_levels_quiet_speech_and_limits_a_shout():
+    _, quiet = bursts(seconds=16, level=150, noise=5)  # Speech about -47 dBFS
+    shout = 32000 * np.sign(np.sin(2 * np.pi * 200 * np.arange(RATE) / RATE))
+    agc = AutomaticGainControl(RATE, FRAME)
+    out = run(agc, np.concatenate([quiet, shout]))
+    late_speech = (np.arange(quiet.size) > 12 * RATE) & (np.arange(quiet.size) // RATE % 2 == 1)
+    level = db(out[:quiet.size][late_speech])
+    assert abs(level - agc.target_dbfs) < 4, level
+    assert np.max(np.abs(out)) <= agc.limit + 1 and agc.limited > 0
+    print(f"✅ Quiet speech raised to {level:.1f} dBFS, a sudden shout limited on {agc.limited} frames")
+
+
+def test_agc_does_not_pump_up_room_noise():
+    for noise_dbfs in (-50, -45):
+        noise = 32768 * 10 ** (noise_dbfs / 20)
+        _, noisy = bursts(seconds=16, level=1000, noise=noise)  # Speech about -30 dBFS
+        agc = AutomaticGainControl(RATE, FRAME)
+        out = run(agc, noisy)
+        late = np.arange(noisy.size) > 12 * RATE
+        gaps = late & (np.arange(noisy.size) // RATE % 2 == 0)
+        words = late & ~gaps
+        assert abs(agc.noise_dbfs - noise_dbfs) < 3, agc.noise_dbfs
+        assert db(out[gaps]) <= agc.target_dbfs - agc.min_snr_db + 1, db(out[gaps])
+        assert db(out[words]) >= db(noisy[words]) - 0.5  # Speech is not turned down either
+        print(f"✅ {noise_dbfs} dBFS room: noise measured at {agc.noise_dbfs:.1f} dBFS, "
+              f"gain {agc.gain_db:.1f} dB, noise out at {db(out[gaps]):.1f} dBFS")
+
+
+if __name__ == "__main__":
+    test_noise_is_removed_between_words()
+    test_agc_levels_quiet_speech_and_limits_a_shout()
+    test_agc_does_not_pump_up_room_noise()
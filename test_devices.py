@@ -0,0 +1,117 @@
+"""
+Check capture device discovery against a fake /proc/asound: parsing, selection and the cache
+"""
+import os
+import tempfile
+import time
+
+from devices import discover, enumerate_devices, forget
+
+RESPEAKER_STREAM = """SEEED ReSpeaker 4 Mic Array (UAC1.0) at usb-3f980000.usb-1.3, full speed : USB Audio
+
+Playback:
+  Status: Stop
+  Interface 2
+    Altset 1
+    Format: S16_LE
+    Channels: 2
+    Rates: 16000
+
+Capture:
+  Status: Stop
+  Interface 1
+    Altset 1
+    Format: S16_LE
+    Channels: 6
+    Endpoint: 2 IN (ASYNC)
+    Rates: 16000
+    Bits: 16
+"""
+
+
+def write_asound(root, respeaker_card=1):
+    """bcm2835 headphones (playback only), a ReSpeaker array and an I2S mic HAT"""
+    cards = {
+        0: ("Headphones", "bcm2835_headpho", "bcm2835 Headphones", "bcm2835 Headphones", None),
+        respeaker_card: ("ArrayUAC10", "USB-Audio", "ReSpeaker 4 Mic Array (UAC1.0)",
+                         "SEEED ReSpeaker 4 Mic Array (UAC1.0) at usb-3f980000.usb-1.3, full speed", "2886:0018"),
+        3 - respeaker_card: ("sndrpii2scard", "snd_rpi_i2s_car", "snd_rpi_i2s_card", "snd_rpi_i2s_card", None),
+    }
+    lines = []
+    for number in sorted(cards):
+        card_id, driver, name, long_name, usbid = cards[number]
+        lines += [f"{number:2d} [{card_id:<15}]: {driver} - {name}", f"                      {long_name}"]
+        card = os.path.join(root, f"card{number}")
+        os.makedirs(os.path.join(card, "pcm0p" if number == 0 else "pcm0c"), exist_ok=True)
+        if usbid:
+            with open(os.path.join(card, "usbid"), "w") as f:
+                f.write(usbid + "\n")
+            with open(os.path.join(card, "stream0"), "w") as f:
+                f.write(RESPEAKER_STREAM)
+    with open(os.path.join(root, "cards"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+class FakeProbe:
+    def __init__(self, silent=(), failing=()):
+        self.probed = []
+        self.silent = silent
+        self.failing = failing
+
+    def __call__(self, devices, sample_rate, channels):
+        self.probed.extend(device["card_id"] for device in devices)
+        return {device["identity"]: {"ok": device["card_id"] not in self.failing,
+                                     "peak": 0 if device["card_id"] in self.silent else 900}
+                for device in devices}
+
+
+def test_enumerate_reads_capture_devices():
+    root = tempfile.mkdtemp()
+    write_asound(root)
+    devices = enumerate_devices(root)
+    assert [d["card_id"] for d in devices] == ["ArrayUAC10", "sndrpii2scard"]  # Headphones have no capture
+    respeaker = devices[0]
+    assert respeaker["identity"] == "usb:2886:0018@usb-3f980000.usb-1.3/0"
+    assert respeaker["device"] == "plughw:CARD=ArrayUAC10,DEV=0"
+    assert respeaker["channels"] == [6] and respeaker["rates"] == [16000] and respeaker["formats"] == ["S16_LE"]
+    assert devices[1]["identity"] == "snd_rpi_i2s_car:sndrpii2scard/0" and devices[1]["channels"] == []
+    print("✅ /proc/asound parsed: 2 capture devices with stable identities")
+
+
+def test_cached_choice_survives_renumbering():
+    root, cache = tempfile.mkdtemp(), os.path.join(tempfile.mkdtemp(), "devices.json")
+    write_asound(root, respeaker_card=1)
+    probe = FakeProbe()
+    first = discover(16000, 6, cache_path=cache, root=root, probe=probe)
+    assert first["card_id"] == "ArrayUAC10" and sorted(probe.probed) == ["ArrayUAC10", "sndrpii2scard"]
+
+    # Next boot the USB array enumerates as card 2: picked from the cache, nothing probed
+    root = tempfile.mkdtemp()
+    write_asound(root, respeaker_card=2)
+    probe = FakeProbe()
+    started = time.perf_counter()
+    again = discover(16000, 6, cache_path=cache, root=root, probe=probe)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    assert again["card"] == 2 and again["device"] == "plughw:CARD=ArrayUAC10,DEV=0"
+    assert probe.probed == []
+    print(f"✅ Cached device found again as card 2 in {elapsed_ms:.1f}ms without probing")
+
+
+def test_selection_and_forget():
+    root, cache = tempfile.mkdtemp(), os.path.join(tempfile.mkdtemp(), "devices.json")
+    write_asound(root)
+    # A silent (unplugged) array loses to a mic that hears something
+    best = discover(16000, 1, cache_path=cache, root=root, probe=FakeProbe(silent=("ArrayUAC10",)))
+    assert best["card_id"] == "sndrpii2scard"
+    # After the chosen device fails to open it is probed again, and now fails the probe too
+    forget(cache)
+    probe = FakeProbe(failing=("sndrpii2scard",))
+    best = discover(16000, 1, cache_path=cache, root=root, probe=probe)
+    assert probe.probed == ["sndrpii2scard"] and best["card_id"] == "ArrayUAC10"
+    print("✅ Silent devices lose, and a device that failed to open is probed again")
+
+
+if __name__ == "__main__":
+    test_enumerate_reads_capture_devices()
+    test_cached_choice_survives_renumbering()
+    test_selection_and_forget()
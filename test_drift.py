@@ -0,0 +1,90 @@
+"""
+Check capture drift correction against simulated devices with ±0.1% clock skew
+"""
+import numpy as np
+
+from drift import DriftCompensator, stretch
+
+RATE = 16000
+FRAME = 320
+PERIOD = 80  # The device delivers 5ms periods, like an ALSA capture
+
+
+def simulate(skew, minutes=10.0, compensate=True, backlog_ms=20, silence_every=0):
+    """
+    Send frames at the host rate from a device running at ``1 + skew`` times
+    the nominal rate, in virtual time. Returns the compensator, the backlog
+    in ms after each second, and how late the last frame went out (ms).
+    """
+    drift = DriftCompensator(RATE, FRAME)
+    start = RATE * backlog_ms // 1000
+    consumed = 0
+    late = 0.0
+    queued_ms = []
+    frames = int(minutes * 60 * RATE / FRAME)
+    for i in range(frames):
+        now = i * FRAME / RATE + late
+        extra = drift.step() if compensate else 0
+        produced = start + int(now * RATE * (1 + skew)) // PERIOD * PERIOD
+        on_schedule = produced - consumed >= FRAME + extra
+        if not on_schedule:
+            # Device is behind: wait for the periods this frame still needs
+            missing = FRAME + extra - (produced - consumed)
+            waited = -(-missing // PERIOD) * PERIOD / (RATE * (1 + skew))
+            late += waited
+            now += waited
+            produced = start + int(now * RATE * (1 + skew)) // PERIOD * PERIOD
+        consumed += FRAME + extra
+        if silence_every:
+            drift.check_quiet(np.zeros(FRAME) if (i // silence_every) % 2 else np.full(FRAME, 5000))
+        drift.observe(now, produced, produced - consumed, on_schedule)
+        if i % (RATE // FRAME) == 0:
+            queued_ms.append((produced - consumed) * 1000 / RATE)
+    return drift, np.array(queued_ms), late * 1000
+
+
+def test_fast_device_latency_stays_bounded():
+    drift, queued, _ = simulate(+0.001)
+    assert abs(drift.skew * 1e6 - 1000) < 50, drift.skew
+    assert queued[60:].max() < 80, queued.max()  # Past the first minute: under the 60ms target + a frame
+    _, uncorrected, _ = simulate(+0.001, compensate=False)
+    assert uncorrected[-1] > 550  # 0.1% of 10 minutes
+    print(f"✅ +0.1% device: skew {drift.skew * 1e6:+.0f}ppm, backlog ≤ {queued[60:].max():.0f}ms "
+          f"(uncorrected: {uncorrected[-1]:.0f}ms after 10 minutes)")
+
+
+def test_slow_device_does_not_starve():
+    drift, _, late_ms = simulate(-0.001)
+    assert abs(drift.skew * 1e6 + 1000) < 50, drift.skew
+    assert late_ms < 30, late_ms
+    _, _, uncorrected = simulate(-0.001, compensate=False)
+    assert uncorrected > 550
+    print(f"✅ -0.1% device: skew {drift.skew * 1e6:+.0f}ppm, frames at most {late_ms:.0f}ms late "
+          f"(uncorrected: {uncorrected:.0f}ms)")
+
+
+def test_backlog_over_ceiling_is_worked_off():
+    # 500ms queued, alternating 1s of speech and silence
+    drift, queued, _ = simulate(+0.001, minutes=1, backlog_ms=500, silence_every=50)
+    assert queued[0] > 400
+    assert queued[20:].max() < 200, queued
+    assert drift.adjusted > 0
+    print(f"✅ 500ms backlog brought to {queued[-1]:.0f}ms within 20s")
+
+
+def test_stretch_is_continuous():
+    ramp = np.arange(0, 3210, 10, dtype=np.int16)  # 321 samples
+    out = np.empty(FRAME, dtype=np.int16)
+    stretch(ramp, out, 1)
+    assert out[0] == 0 and np.all(np.diff(out) > 0) and out[-1] >= 3180
+    stereo = np.empty(2 * FRAME, dtype=np.int16)
+    stretch(np.repeat(ramp[:319], 2), stereo, 2)
+    assert np.array_equal(stereo[0::2], stereo[1::2])
+    print("✅ Stretched frames stay continuous")
+
+
+if __name__ == "__main__":
+    test_fast_device_latency_stays_bounded()
+    test_slow_device_does_not_starve()
+    test_backlog_over_ceiling_is_worked_off()
+    test_stretch_is_continuous()
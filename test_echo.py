@@ -0,0 +1,84 @@
+"""
+Check echo suppression on a simulated room: far-end alone, then double talk
+"""
+import numpy as np
+
+from dsp import EchoSuppressor, StftBlock
+
+RATE = 16000
+FRAME = 320
+
+
+def talker(seconds, seed, start, end):
+    """Band-limited noise at a syllable rate, talking from ``start`` to ``end`` s"""
+    rng = np.random.default_rng(seed)
+    n = seconds * RATE
+    spectrum = np.fft.rfft(rng.standard_normal(n))
+    freqs = np.fft.rfftfreq(n, 1 / RATE)
+    voiced = np.fft.irfft(spectrum * ((freqs > 100) & (freqs < 4000)), n)
+    t = np.arange(n) / RATE
+    envelope = (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t + seed)) * ((t >= start) & (t < end))
+    return (voiced / voiced.std() * 4000 * envelope).astype(np.float32)
+
+
+def room(ref, delay_ms):
+    rng = np.random.default_rng(2)
+    ir = rng.standard_normal(480) * np.exp(-np.arange(480) / 80)
+    ir[0] = 1.0
+    ir *= 0.5 / np.sqrt(np.sum(ir ** 2))
+    delay = delay_ms * RATE // 1000
+    return np.concatenate([np.zeros(delay), np.convolve(ref, ir)[:ref.size - delay]]).astype(np.float32)
+
+
+def db(x):
+    return 10 * np.log10(np.mean(np.asarray(x, dtype=np.float64) ** 2) + 1e-9)
+
+
+def run(es, ref, near, echo):
+    """Suppressor output, and its gains applied to the near speech and the echo on their own"""
+    mic = np.clip(near + echo + np.random.default_rng(3).standard_normal(near.size) * 30, -32768, 32767)
+    outputs = [np.zeros(near.size, dtype=np.float32) for _ in range(3)]
+    near_stft, echo_stft = StftBlock(FRAME), StftBlock(FRAME)
+    double_talk = []
+    for i in range(0, near.size, FRAME):
+        es.add_reference(ref[i:i + FRAME].astype(np.int16), RATE)
+        outputs[0][i:i + FRAME] = es.process(mic[i:i + FRAME].astype(np.int16))
+        outputs[1][i:i + FRAME] = near_stft.synthesize(near_stft.analyze(near[i:i + FRAME]) * es.gain)
+        outputs[2][i:i + FRAME] = echo_stft.synthesize(echo_stft.analyze(echo[i:i + FRAME]) * es.gain)
+        double_talk.append(es.double_talk)
+    mic = mic.astype(np.float32)
+    return [x[FRAME:] for x in outputs] + [mic[:-FRAME], np.array(double_talk)]  # One frame of latency
+
+
+def span(x, start, end):
+    return x[int(start * RATE):int(end * RATE)]
+
+
+def test_double_talk_keeps_the_near_speaker():
+    ref = talker(8, 0, 0.5, 7.5)
+    near = talker(8, 1, 4.5, 7.5)  # Far end alone until 4.5 s, then both
+    echo = room(ref, 120)
+    out, near_out, echo_out, mic, double_talk = run(EchoSuppressor(RATE, FRAME), ref, near, echo)
+
+    erle = db(span(mic, 1.5, 4.5)) - db(span(out, 1.5, 4.5))
+    dt_erle = db(span(echo, 5.0, 7.5)) - db(span(echo_out, 5.0, 7.5))
+    dt_near = db(span(near_out, 5.0, 7.5)) - db(span(near, 5.0, 7.5))
+    assert erle > 20, erle
+    assert dt_erle > 4, dt_erle
+    assert dt_near > -2.5, dt_near  # Full suppression took about 5 dB off the near speaker
+    assert not double_talk[75:225].any() and double_talk[250:375].mean() > 0.9
+    print(f"✅ ERLE {erle:.1f} dB far end alone; in double talk {dt_erle:.1f} dB with the near speaker {dt_near:+.1f} dB")
+
+
+def test_delay_search_covers_the_playout_buffer():
+    ref = talker(4, 0, 0.0, 4.0)
+    es = EchoSuppressor(RATE, FRAME, max_delay_ms=300, playout_delay_ms=200)
+    run(es, ref, np.zeros_like(ref), room(ref, 450))
+    assert abs(es.delay - 450 * RATE // 1000) < RATE // 1000, es.delay
+    print(f"✅ Echo 450ms after the sink write found at {1000 * es.delay / RATE:.1f}ms "
+          f"(300ms search on top of a 200ms playout buffer)")
+
+
+if __name__ == "__main__":
+    test_double_talk_keeps_the_near_speaker()
+    test_delay_search_covers_the_playout_buffer()
@@ -0,0 +1,139 @@
+"""
+Check server selection and failover against two local stand-in servers
+"""
+import asyncio
+import time
+
+from aiortc.mediastreams import AudioStreamTrack
+
+import client
+import metrics
+from failover import ServerPool
+from reconnect import PeerPreparer, get_http_session
+from standin_server import StandinServer
+
+
+async def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+        await asyncio.sleep(0.01)
+
+
+def connected_peers(server):
+    return [pc for pc in server.pcs if pc.connectionState == "connected"]
+
+
+def test_probe_prefers_the_fastest_healthy_server():
+    async def run():
+        fast, slow = StandinServer(), StandinServer()
+        await fast.start()
+        await slow.start()
+        slow.http_delay = 0.2
+        dead = "http://127.0.0.1:9"  # Nothing listens on the discard port
+        pool = ServerPool([dead, slow.url, fast.url], probe_timeout=0.5)
+        try:
+            started = time.monotonic()
+            await pool.probe()
+            probe_ms = (time.monotonic() - started) * 1000
+            assert pool.healthy == {dead: False, slow.url: True, fast.url: True}
+            assert pool.rtt[slow.url] > 0.2 > pool.rtt[fast.url]
+            assert pool.pick() == fast.url
+            assert pool.standby(fast.url) == slow.url
+            # Once on the slow server the client stays there while it works
+            pool.lost(fast.url)
+            assert pool.pick() == slow.url
+            fast.http_delay = 0.0
+            assert pool.pick() == slow.url
+        finally:
+            await fast.stop()
+            await slow.stop()
+            await get_http_session().close()
+        print(f"✅ Probed 3 servers concurrently in {probe_ms:.0f}ms: {pool.describe()}")
+
+    asyncio.run(run())
+
+
+def test_only_failed_or_dead_sessions_hold_a_server_down():
+    fast, slow = "http://fast", "http://slow"
+    pool = ServerPool([fast, slow])
+    pool.healthy = {fast: True, slow: True}
+    pool.rtt = {fast: 0.01, slow: 0.1}
+    assert pool.pick() == fast
+    assert not client.settle_session(pool, fast, True, {})  # Hung up normally
+    assert pool.pick() == fast
+    assert client.settle_session(pool, fast, True, {"dead": "no pong after 2 probes and no inbound audio"})
+    assert pool.pick() == slow
+    assert client.settle_session(pool, slow, False, {})  # Could not connect
+    assert pool.standby(slow) is None
+    pool.ok(fast)
+    assert pool.pick() == fast
+    print("✅ Normal hang-ups keep the server; failed connects and liveness timeouts hold it down")
+
+
+def test_killed_server_fails_over_to_the_standby():
+    async def run():
+        primary, standby = StandinServer(), StandinServer()
+        await primary.start()
+        await standby.start()
+        standby.http_delay = 0.05
+        pool = ServerPool([standby.url, primary.url])
+        await pool.probe()
+        peers = PeerPreparer()
+
+        async def connect(server, session_stats):
+            return await client.connect_to_server(audio_track=AudioStreamTrack(), peers=peers, server=server,
+                                                  session_stats=session_stats)
+
+        loop = asyncio.ensure_future(client.stay_connected(pool, connect))
+        try:
+            await wait_for(lambda: connected_peers(primary))
+            await asyncio.sleep(0.5)  # Let the standby peer be prepared, as on a long-running client
+            killed = time.monotonic()
+            await primary.stop()
+            await wait_for(lambda: connected_peers(standby))
+            failover_ms = (time.monotonic() - killed) * 1000
+            assert pool.current == standby.url
+            assert failover_ms < 1000, failover_ms
+        finally:
+            await standby.stop()
+            loop.cancel()
+            await asyncio.gather(loop, return_exceptions=True)
+            await get_http_session().close()
+        print(f"✅ Primary killed: streaming to the standby {failover_ms:.0f}ms later")
+
+    asyncio.run(run())
+
+
+def test_failed_offer_releases_the_peer():
+    async def run():
+        taken = []
+
+        class Peers(PeerPreparer):
+            async def take(self):
+                taken.append(await super().take())
+                return taken[-1]
+
+        track, error = AudioStreamTrack(), None
+        try:
+            await client.connect_to_server(audio_track=track, peers=Peers(), room="failed-offer",
+                                           server="http://127.0.0.1:9")
+        except Exception as e:
+            error = e
+        finally:
+            await get_http_session().close()
+        assert error is not None
+        assert taken[0].pc.connectionState == "closed"
+        assert track.readyState == "ended"
+        assert 'room="failed-offer"' not in metrics.REGISTRY.render()
+        print(f"✅ Offer failed ({type(error).__name__}): peer closed, track stopped, no gauges left behind")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_probe_prefers_the_fastest_healthy_server()
+    test_only_failed_or_dead_sessions_hold_a_server_down()
+    test_killed_server_fails_over_to_the_standby()
+    test_failed_offer_releases_the_peer()
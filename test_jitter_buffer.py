@@ -0,0 +1,130 @@
+"""
+Drive the playout jitter buffer with simulated arrival times (no sound card needed)
+"""
+import asyncio
+import fractions
+import sys
+import time
+
+import numpy as np
+from av import AudioFrame
+
+from playback import AudioPlayer, JitterBuffer, NullSink, PipeSink
+
+RATE = 48000
+FRAME = 960  # 20ms
+
+
+def frame(i):
+    return np.full(FRAME, i, dtype=np.int16)
+
+
+def run(arrivals, ticks):
+    """Interleave frame arrivals (index -> time) with 20ms playout ticks"""
+    jb = JitterBuffer(RATE, FRAME)
+    sink = NullSink(RATE)
+    events = sorted([(t, 0, i) for i, t in arrivals.items()] + [(k * 0.02, 1, None) for k in range(ticks)])
+    played = []
+    for t, kind, i in events:
+        if kind == 0:
+            jb.put(i * FRAME, frame(i), t)
+        else:
+            samples = jb.pop()
+            sink.write(samples if samples is not None else np.zeros(FRAME, np.int16), silent=samples is None)
+            if samples is not None:
+                played.append(int(samples[0]))
+    return jb, played
+
+
+def test_steady_stream_plays_in_order():
+    jb, played = run({i: i * 0.02 + 0.001 for i in range(100)}, 110)
+    assert played == sorted(played)
+    assert jb.late_drops == 0 and jb.concealed == 0
+    assert jb.target_delay_ms <= 40
+    print(f"✅ Steady stream: {len(played)} frames, target delay {jb.target_delay_ms:.0f}ms")
+
+
+def test_jitter_grows_delay_instead_of_dropping():
+    rng = np.random.default_rng(0)
+    arrivals = {i: i * 0.02 + rng.uniform(0, 0.06) for i in range(300)}
+    jb, played = run(arrivals, 320)
+    assert jb.target_delay_ms > 40
+    # Once adapted, nearly everything is played rather than dropped late
+    assert jb.late_drops + jb.concealed < 30, jb.__dict__
+    print(f"✅ Jittery stream: target {jb.target_delay_ms:.0f}ms, "
+          f"late={jb.late_drops}, concealed={jb.concealed}, underruns={jb.underruns}")
+
+
+def test_late_frame_is_dropped():
+    arrivals = {i: i * 0.02 for i in range(20)}
+    arrivals[10] = 1.0  # Arrives long after its playout slot
+    jb, played = run(arrivals, 60)
+    assert 10 not in played
+    assert jb.late_drops == 1
+    assert jb.concealed == 1
+    print("✅ Late frame dropped and concealed")
+
+
+def test_stuck_player_does_not_block_playout():
+    # A player that never reads: its pipe fills after about 30 frames
+    sink = PipeSink([sys.executable, "-c", "import time; time.sleep(30)"], RATE, max_pending=20)
+    try:
+        started = time.perf_counter()
+        for i in range(200):
+            sink.write(frame(i))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    finally:
+        sink.close()
+    assert elapsed_ms < 100, elapsed_ms
+    assert sink.dropped > 100 and sink.samples_written == 200 * FRAME
+    assert sink.proc.poll() is not None and not any(t.is_alive() for t in sink._writer._threads)
+    print(f"✅ 200 writes to a stuck player took {elapsed_ms:.1f}ms; {sink.dropped} frames dropped; "
+          f"player and writer gone on close")
+
+
+class RecordingSink(NullSink):
+    def __init__(self, sample_rate):
+        super().__init__(sample_rate)
+        self.writes = []
+
+    def write(self, samples, silent=False):
+        super().write(samples, silent)
+        self.writes.append((time.monotonic(), samples.size))
+
+
+def test_new_stream_with_another_frame_size_keeps_cadence():
+    async def stream(player, frame_samples, frames):
+        player.new_stream()
+        for i in range(frames):
+            f = AudioFrame.from_ndarray(np.full((1, frame_samples), 100, np.int16), format="s16", layout="mono")
+            f.sample_rate = RATE
+            f.pts = i * frame_samples
+            f.time_base = fractions.Fraction(1, RATE)
+            player.feed(f)
+            await asyncio.sleep(frame_samples / RATE)
+
+    async def run():
+        sink = RecordingSink(RATE)
+        player = AudioPlayer(sink)
+        started = time.monotonic()
+        try:
+            await stream(player, FRAME, 25)
+            switched = time.monotonic()
+            await stream(player, FRAME // 2, 50)  # 10ms frames from the next stream
+        finally:
+            player.close()
+        elapsed = time.monotonic() - started
+        return [n for t, n in sink.writes if t > switched + 0.1], sink.samples_written / RATE, elapsed
+
+    sizes, played, elapsed = asyncio.run(run())
+    assert sizes and set(sizes) == {FRAME // 2}, set(sizes)
+    assert abs(played - elapsed) < 0.1, (played, elapsed)  # Real time, not twice as fast
+    print(f"✅ Second stream with 10ms frames played in 10ms writes, {played:.2f}s of audio in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    test_steady_stream_plays_in_order()
+    test_jitter_grows_delay_instead_of_dropping()
+    test_late_frame_is_dropped()
+    test_stuck_player_does_not_block_playout()
+    test_new_stream_with_another_frame_size_keeps_cadence()
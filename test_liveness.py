@@ -0,0 +1,121 @@
+"""
+RTT-driven liveness: the RTO estimator, and how fast a hung server is detected
+"""
+import asyncio
+import time
+
+from aiortc.mediastreams import AudioStreamTrack
+
+import client
+import metrics
+import reconnect
+from liveness import LivenessMonitor, RttEstimator
+from standin_server import StandinServer
+
+
+def test_rto_tracks_rtt():
+    rtt = RttEstimator(min_rto=0.2, max_rto=30)
+    assert rtt.rto == 1.0  # Nothing measured yet
+    for _ in range(20):
+        rtt.sample(0.005)
+    assert abs(rtt.srtt - 0.005) < 1e-3
+    assert rtt.rto == 0.2  # Clamped to the floor on a fast, steady link
+
+    for sample in (0.05, 0.4, 0.1, 0.6, 0.08):
+        rtt.sample(sample)
+    assert rtt.rto > 0.5  # Variance widens the timeout
+    print(f"✅ RTO follows RTT (srtt={rtt.srtt * 1000:.0f}ms, rto={rtt.rto * 1000:.0f}ms)")
+
+    for _ in range(5):
+        rtt.sample(100)
+    assert rtt.rto == 30
+
+
+async def detect_frozen_server():
+    server = StandinServer()
+    url = await server.start()
+    offer_url, client.OFFER_URL = client.OFFER_URL, f"{url}/api/offer"
+    try:
+        session = asyncio.ensure_future(client.connect_to_server(audio_track=AudioStreamTrack()))
+        while server.pings < 3:
+            assert not session.done(), "connection ended before it was healthy"
+            await asyncio.sleep(0.05)
+
+        series = f'voice_ping_srtt_seconds{{room="{client.ROOM}"}}'
+        assert series in metrics.REGISTRY.render()  # One series per room, not whichever connected last
+
+        server.freeze()
+        frozen_at = time.monotonic()
+        was_connected = await asyncio.wait_for(session, 10)
+        assert series not in metrics.REGISTRY.render()
+        return was_connected, time.monotonic() - frozen_at
+    finally:
+        client.OFFER_URL = offer_url
+        await server.stop()
+        await (await client._peers.take()).pc.close()
+        await reconnect.get_http_session().close()
+
+
+def test_frozen_server_detected_within_a_second():
+    was_connected, detection = asyncio.run(detect_frozen_server())
+    assert was_connected
+    assert detection < 1.2, f"took {detection:.2f}s"
+    print(f"✅ Hung server detected {detection * 1000:.0f}ms after it stopped answering")
+
+
+async def lose_pongs_while_audio_flows():
+    dead = []
+    monitor = LivenessMonitor(lambda timestamp: None, dead.append, interval=0.2, audio_timeout=0.1,
+                              estimator=RttEstimator(min_rto=0.05, initial=0.05))
+    monitor.ready.set()
+    monitor.start()
+    try:
+        # The pongs are lost, but the server's audio keeps coming
+        for _ in range(50):
+            monitor.audio_activity()
+            await asyncio.sleep(0.02)
+        alive_misses = monitor.missed
+        assert not dead and alive_misses >= 2, (dead, alive_misses)
+        # Then the audio stops too
+        stopped = time.monotonic()
+        while not dead and time.monotonic() - stopped < 2:
+            await asyncio.sleep(0.01)
+        return alive_misses, dead, time.monotonic() - stopped
+    finally:
+        await monitor.stop()
+
+
+def test_missed_pongs_alone_do_not_end_a_live_session():
+    misses, dead, detection = asyncio.run(lose_pongs_while_audio_flows())
+    assert len(dead) == 1 and "no inbound audio" in dead[0], dead
+    print(f"✅ {misses} missed pongs tolerated while audio flowed; dead {detection * 1000:.0f}ms after it stopped")
+
+
+async def echo_one_ping():
+    sent = []
+    monitor = LivenessMonitor(sent.append, lambda reason: None, interval=10)
+    monitor.ready.set()
+    monitor.start()
+    try:
+        while not sent:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.05)
+        rtt = monitor.pong(sent[0])
+        await asyncio.sleep(0.01)  # Let the probe see its pong before stopping
+        return sent[0], rtt
+    finally:
+        await monitor.stop()
+
+
+def test_ping_carries_wall_clock_time():
+    timestamp, rtt = asyncio.run(echo_one_ping())
+    assert abs(timestamp - time.time()) < 5, timestamp  # Wall clock on the wire, for the server
+    assert 0.05 <= rtt < 0.1, rtt  # Timed on the monotonic clock
+    print(f"✅ Ping timestamp is wall-clock time; echoed back it gave an RTT of {rtt * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    test_rto_tracks_rtt()
+    test_frozen_server_detected_within_a_second()
+    test_missed_pongs_alone_do_not_end_a_live_session()
+    test_ping_carries_wall_clock_time()
@@ -0,0 +1,108 @@
+"""
+Check on-demand sessions: they do not outlive the speech that opened them,
+and a failed one is retried while the user keeps talking
+"""
+import asyncio
+import fractions
+
+import numpy as np
+from aiortc import MediaStreamTrack
+from av import AudioFrame
+
+from on_demand import run_on_demand
+
+RATE = 16000
+FRAME = 320
+
+
+class NoiseMic(MediaStreamTrack):
+    """Quiet room at -65 dBFS, then a fan at -45 dBFS; frames come 10x faster than real time"""
+    kind = "audio"
+
+    def __init__(self, quiet_frames=100):
+        super().__init__()
+        self.rng = np.random.default_rng(0)
+        self.quiet_frames = quiet_frames
+        self.frames = 0
+
+    async def recv(self):
+        await asyncio.sleep(FRAME / RATE / 10)
+        dbfs = -65 if self.frames < self.quiet_frames else -45
+        samples = self.rng.standard_normal(FRAME) * 32768 * 10 ** (dbfs / 20)
+        frame = AudioFrame.from_ndarray(samples.astype(np.int16)[None], format="s16", layout="mono")
+        frame.sample_rate = RATE
+        frame.pts = self.frames * FRAME
+        frame.time_base = fractions.Fraction(1, RATE)
+        self.frames += 1
+        return frame
+
+
+def test_noise_alone_closes_the_session():
+    async def run():
+        mic = NoiseMic()
+        sessions = []
+        closed = asyncio.Event()
+
+        async def connect(audio_track, stop_event, session_stats):
+            sessions.append(mic.frames)
+            await stop_event.wait()
+            sessions.append(mic.frames)
+            closed.set()
+
+        task = asyncio.create_task(run_on_demand(mic, connect, idle_timeout=0.5, buffer_ms=1000, preroll_ms=300))
+        try:
+            await asyncio.wait_for(closed.wait(), 10)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return sessions
+
+    opened, closed = asyncio.run(run())
+    noise_s = (closed - opened) * FRAME / RATE
+    assert noise_s < 15, noise_s  # Floor catches up in a few seconds, plus the 5 s (scaled) idle timeout
+    print(f"✅ A fan switching on opened a session, closed again after {noise_s:.1f}s of its noise")
+
+
+class TalkerMic(NoiseMic):
+    """Quiet room, then someone talking without a break (4 Hz syllables), 10x faster than real time"""
+
+    async def recv(self):
+        frame = await super().recv()
+        if self.frames > self.quiet_frames:
+            t = (np.arange(FRAME) + frame.pts) / RATE
+            voice = np.sin(2 * np.pi * 180 * t) * 6000 * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+            frame = AudioFrame.from_ndarray(voice.astype(np.int16)[None], format="s16", layout="mono")
+            frame.sample_rate = RATE
+        return frame
+
+
+def test_failed_session_is_retried_while_talking():
+    async def run():
+        mic = TalkerMic()
+        attempts = []
+        retried = asyncio.Event()
+
+        async def connect(audio_track, stop_event, session_stats):
+            attempts.append((mic.frames, audio_track.backlog))
+            if len(attempts) == 1:
+                raise ConnectionError("server unreachable")
+            retried.set()
+
+        task = asyncio.create_task(run_on_demand(mic, connect, idle_timeout=5, buffer_ms=20000, preroll_ms=300))
+        try:
+            await asyncio.wait_for(retried.wait(), 10)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return attempts
+
+    (failed_at, _), (retried_at, backlog) = asyncio.run(run())
+    gap_s = (retried_at - failed_at) * FRAME / RATE
+    # The retry carries what was said during the failed attempt and its 1 s backoff
+    assert backlog * FRAME / RATE > 0.8 * gap_s, (backlog, gap_s)
+    print(f"✅ Failed session retried while still talking, {backlog * FRAME / RATE:.1f}s of speech carried over")
+
+
+if __name__ == "__main__":
+    test_noise_alone_closes_the_session()
+    test_failed_session_is_retried_while_talking()
@@ -0,0 +1,56 @@
+"""
+Check the capture ring buffer: wrap-around, overrun recovery and occupancy
+"""
+import numpy as np
+
+from audio_linux import SampleRing
+
+
+def write(ring, samples):
+    data = memoryview(samples.astype(np.int16)).cast("B")
+    while len(data):
+        slot = ring.write_slot(len(data))
+        slot[:] = data[:len(slot)]
+        ring.commit(len(slot))
+        data = data[len(slot):]
+
+
+def test_wraparound():
+    ring = SampleRing(capacity_samples=8)
+    write(ring, np.arange(6))
+    assert np.array_equal(ring.read(8), np.arange(4))
+    write(ring, np.arange(6, 12))  # wraps past the end of the buffer
+    assert ring.available() == 16
+    assert np.array_equal(ring.read(16), np.arange(4, 12))
+    assert ring.available() == 0
+    assert ring.overruns == 0
+    print("✅ Wrap-around works")
+
+
+def test_overrun_keeps_newest():
+    ring = SampleRing(capacity_samples=8)
+    write(ring, np.arange(20))
+    assert ring.available() == 16
+    assert np.array_equal(ring.read(8), np.arange(12, 16))
+    assert ring.overruns == 1
+    assert np.array_equal(ring.read(8), np.arange(16, 20))
+    print("✅ Overrun drops oldest audio")
+
+
+def test_open_write_slot_is_not_read():
+    ring = SampleRing(capacity_samples=8)
+    write(ring, np.arange(8))
+    # The writer is filling the slot over samples 0 and 1 but hasn't committed yet
+    slot = ring.write_slot(4)
+    slot[:] = memoryview(np.array([-1, -1], dtype=np.int16)).cast("B")
+    assert np.array_equal(ring.read(8), np.arange(2, 6))
+    assert ring.overruns == 1
+    ring.commit(4)
+    assert np.array_equal(ring.read(8), [6, 7, -1, -1])
+    print("✅ A half-written slot is never returned")
+
+
+if __name__ == "__main__":
+    test_wraparound()
+    test_overrun_keeps_newest()
+    test_open_write_slot_is_not_read()
@@ -0,0 +1,125 @@
+"""
+Check the binary telemetry: record layout, batching and speech-change flushes
+"""
+import asyncio
+import fractions
+
+import numpy as np
+from aiortc import MediaStreamTrack
+from av import AudioFrame
+
+from telemetry import CLIPPED, HEADER, RECORD, SILENT, SPEECH, Telemetry, TelemetryTrack, decode
+from vad import VadGatedTrack
+
+FRAME = 320
+
+
+class FakeChannel:
+    readyState = "open"
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+def test_records_round_trip():
+    telemetry = Telemetry(batch_ms=100)
+    channel = FakeChannel()
+    telemetry.attach(channel)
+    quiet = np.zeros(FRAME, dtype=np.int16)
+    for i in range(5):
+        telemetry.record(quiet, i * FRAME, queued=16 * 48)  # 48ms queued
+    assert len(channel.sent) == 1
+    message = channel.sent[0]
+    assert len(message) == HEADER.size + 5 * RECORD.itemsize == 44
+    records = decode(message)
+    assert list(records["pts"]) == [0, 320, 640, 960, 1280]
+    assert np.all(records["queued"] == 12) and np.all(records["flags"] == SILENT)
+    assert np.all(records["energy"] == 240)  # -120 dBFS
+    print(f"✅ 5 frames in one {len(message)}-byte message")
+
+
+def test_speech_changes_flush_at_once():
+    telemetry = Telemetry(batch_ms=100)
+    channel = FakeChannel()
+    telemetry.attach(channel)
+    rng = np.random.default_rng(0)
+    for i in range(20):
+        telemetry.record(rng.integers(-30, 30, FRAME, dtype=np.int16), i * FRAME, 0)
+    quiet_messages = len(channel.sent)
+    loud = np.clip(rng.normal(0, 12000, FRAME), -32768, 32767).astype(np.int16)
+    loud[0] = 32767
+    telemetry.record(loud, 20 * FRAME, 0)
+    telemetry.record(loud, 21 * FRAME, 0)  # Second frame over the threshold opens the gate
+    assert len(channel.sent) == quiet_messages + 1
+    onset = decode(channel.sent[-1])
+    assert onset["flags"][-1] & SPEECH and onset["flags"][-1] & CLIPPED and onset["vad"][-1] == 255
+    assert onset["pts"][-1] == 21 * FRAME
+    print(f"✅ Speech onset sent with frame {onset['pts'][-1] // FRAME}, not held for the batch")
+
+
+def test_nothing_sent_without_an_open_channel():
+    telemetry = Telemetry()
+    channel = FakeChannel()
+    channel.readyState = "connecting"
+    telemetry.record(np.zeros(FRAME, dtype=np.int16), 0, 0)  # Not attached: ignored
+    telemetry.attach(channel)
+    for i in range(10):
+        telemetry.record(np.zeros(FRAME, dtype=np.int16), i * FRAME, 0)
+    telemetry.detach(channel)
+    assert channel.sent == [] and telemetry.messages == 0
+    print("✅ No telemetry before the data channel is open")
+
+
+class Talker(MediaStreamTrack):
+    """1 s of quiet, then 1 s of a loud tone, repeated; pts count capture samples"""
+    kind = "audio"
+
+    def __init__(self):
+        super().__init__()
+        self.frames = 0
+
+    async def recv(self):
+        loud = self.frames // 50 % 2 == 1
+        t = (np.arange(FRAME) + self.frames * FRAME) / 16000
+        samples = np.sin(2 * np.pi * 200 * t) * (8000 if loud else 20)
+        frame = AudioFrame.from_ndarray(samples.astype(np.int16)[None], format="s16", layout="mono")
+        frame.sample_rate = 16000
+        frame.pts = self.frames * FRAME
+        frame.time_base = fractions.Fraction(1, 16000)
+        self.frames += 1
+        return frame
+
+
+def test_records_follow_the_gated_track():
+    telemetry = Telemetry(batch_ms=100)
+    channel = FakeChannel()
+    telemetry.attach(channel)
+    gate = VadGatedTrack(Talker(), mode="silence")
+    track = TelemetryTrack(gate, telemetry)
+
+    async def run():
+        sent = []
+        for _ in range(120):
+            frame = await track.recv()
+            sent.append((frame.pts, gate.speaking))
+        return sent
+
+    sent = asyncio.run(run())
+    telemetry.flush()
+    records = np.concatenate([decode(message) for message in channel.sent])
+    assert list(records["pts"]) == [pts for pts, _ in sent]  # The renumbered pts, not the capture ones
+    assert [bool(flags & SPEECH) for flags in records["flags"]] == [speaking for _, speaking in sent]
+    # The gate sends its pre-roll ahead of time, so capture pts would jump back at each onset
+    assert np.all(records["pts"] == np.arange(120) * FRAME)
+    assert 0 < np.count_nonzero(records["flags"] & SPEECH) < 120
+    print(f"✅ {len(records)} records carry the pts and speech decision of the gated track")
+
+
+if __name__ == "__main__":
+    test_records_round_trip()
+    test_speech_changes_flush_at_once()
+    test_nothing_sent_without_an_open_channel()
+    test_records_follow_the_gated_track()
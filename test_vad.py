@@ -0,0 +1,53 @@
+"""
+Check the VAD gate opens on speech and closes again in steady or rising noise
+"""
+import numpy as np
+
+from vad import EnergyVad
+
+RATE = 16000
+FRAME = 320
+
+
+def noise(dbfs, frames, seed=0):
+    rng = np.random.default_rng(seed)
+    level = 32768 * 10 ** (dbfs / 20)
+    return [np.clip(rng.standard_normal(FRAME) * level, -32768, 32767).astype(np.int16) for _ in range(frames)]
+
+
+def talk(dbfs, frames, noise_dbfs, seed=1):
+    """Voiced bursts (150 Hz and harmonics) 0.4 s on, 0.2 s off, over noise"""
+    t = np.arange(FRAME) / RATE
+    tone = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in (1, 2, 3))
+    tone *= 32768 * 10 ** (dbfs / 20) / np.sqrt(np.mean(tone ** 2))
+    background = noise(noise_dbfs, frames, seed)
+    return [(b + (tone if i % 30 < 20 else 0)).astype(np.int16) for i, b in enumerate(background)]
+
+
+def run(vad, frames):
+    return np.array([vad.update(frame) for frame in frames])
+
+
+def test_steady_noise_does_not_latch_the_gate():
+    vad = EnergyVad()
+    gate = run(vad, noise(-45, 3000))
+    assert gate[-2500:].sum() == 0, gate.sum()
+    assert abs(vad.noise_floor_db + 45) < 3, vad.noise_floor_db
+    # Speech well above that noise still opens it
+    speech = run(vad, talk(-25, 300, -45))
+    assert speech.mean() > 0.6, speech.mean()
+    print(f"✅ -45 dBFS noise: gate open on {gate.sum()} of 3000 frames, then speech on {speech.mean():.0%}")
+
+
+def test_noise_step_closes_the_gate():
+    vad = EnergyVad()
+    gate = run(vad, noise(-65, 500) + noise(-45, 1000, seed=2))
+    closed_after = np.flatnonzero(gate)[-1] - 500 + 1
+    assert closed_after * FRAME / RATE < 5, closed_after
+    assert gate[-500:].sum() == 0
+    print(f"✅ Noise step -65 → -45 dBFS: gate closed again {closed_after * FRAME / RATE:.1f}s later")
+
+
+if __name__ == "__main__":
+    test_steady_noise_does_not_latch_the_gate()
+    test_noise_step_closes_the_gate()
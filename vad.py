@@ -0,0 +1,209 @@
+import collections
+from fractions import Fraction
+
+import av
+import numpy as np
+from aiortc import MediaStreamTrack
+
+
+class EnergyVad:
+    """
+    Energy + zero-crossing voice activity detector with hysteresis.
+
+    The noise floor follows the energy while the gate is closed. While it is
+    open the floor rises towards the quietest frame of roughly the last
+    ``min_window_frames`` (minimum statistics): the pauses between words
+    keep that minimum at the noise, while a fan switched on, or steady noise
+    that opened the gate, lifts it and lets the gate close again. Speech
+    starts after ``attack_frames`` consecutive frames at least ``start_db``
+    above the floor (or ``unvoiced_db`` above it with a high zero-crossing
+    rate, so fricative onsets like "s"/"f" count), and ends after
+    ``hangover_frames`` frames below ``stop_db``. Any object with
+    ``update(samples) -> bool`` can replace it.
+    """
+
+    def __init__(self, start_db: float = 12.0, stop_db: float = 6.0, unvoiced_db: float = 6.0,
+                 zcr_threshold: float = 0.25, attack_frames: int = 2, hangover_frames: int = 15,
+                 floor_db: float = -60.0, min_window_frames: int = 150, floor_rise: float = 0.05):
+        self.start_db = start_db
+        self.stop_db = stop_db
+        self.unvoiced_db = unvoiced_db
+        self.zcr_threshold = zcr_threshold
+        self.attack_frames = attack_frames
+        self.hangover_frames = hangover_frames
+        self.floor_rise = floor_rise
+        # Running minimum over min_window_frames, kept as the minima of 6 blocks
+        self._block_frames = max(1, min_window_frames // 6)
+        self._block_min = np.inf
+        self._block_count = 0
+        self._minima = collections.deque(maxlen=6)
+
+        self.noise_floor_db = floor_db
+        self.energy_db = floor_db
+        self.zcr = 0.0
+        self.speech = False
+        self._above = 0
+        self._below = 0
+
+    def update(self, samples: np.ndarray) -> bool:
+        """Classify one frame of int16 mono samples; returns the gated decision"""
+        x = samples.astype(np.float32)
+        power = float(np.dot(x, x)) / max(x.size, 1)
+        self.energy_db = 10 * np.log10(power / (32768.0 ** 2) + 1e-12)
+        self.zcr = np.count_nonzero(np.signbit(samples[1:]) != np.signbit(samples[:-1])) / max(samples.size - 1, 1)
+
+        self._block_min = min(self._block_min, self.energy_db)
+        self._block_count += 1
+        if self._block_count == self._block_frames:
+            self._minima.append(self._block_min)
+            self._block_min = np.inf
+            self._block_count = 0
+
+        snr = self.energy_db - self.noise_floor_db
+        if self.speech:
+            recent_min = min(self._block_min, min(self._minima, default=np.inf))
+            if recent_min > self.noise_floor_db:
+                self.noise_floor_db += self.floor_rise * (recent_min - self.noise_floor_db)
+                snr = self.energy_db - self.noise_floor_db
+            if snr > self.stop_db:
+                self._below = 0
+            else:
+                self._below += 1
+                if self._below > self.hangover_frames:
+                    self.speech = False
+                    self._above = 0
+        else:
+            onset = snr > self.start_db or (snr > self.unvoiced_db and self.zcr > self.zcr_threshold)
+            self._above = self._above + 1 if onset else 0
+            if self._above >= self.attack_frames:
+                self.speech = True
+                self._below = 0
+            else:
+                # Follow the floor down quickly and up slowly
+                rate = 0.2 if self.energy_db < self.noise_floor_db else 0.01
+                self.noise_floor_db += rate * (self.energy_db - self.noise_floor_db)
+
+        return self.speech
+
+    @property
+    def probability(self) -> float:
+        """Soft speech score in [0, 1] from the SNR against the start threshold"""
+        snr = self.energy_db - self.noise_floor_db
+        return float(min(max(snr / (2 * self.start_db), 0.0), 1.0))
+
+
+class VadGatedTrack(MediaStreamTrack):
+    """
+    Wraps a capture track and only forwards audio while speech is detected.
+
+    In ``silence`` mode non-speech frames are replaced with digital silence
+    (which Opus encodes in a few bytes); in ``hold`` mode they are not sent
+    at all. The last ``preroll_ms`` of non-speech audio is kept and flushed
+    ahead of the first speech frame so onsets aren't clipped. ``speaking``
+    tells whether the frame ``recv()`` last returned was part of an
+    utterance (pre-roll included) rather than gated silence.
+    """
+    kind = "audio"
+
+    def __init__(self, source: MediaStreamTrack, vad=None, mode: str = "silence", preroll_ms: int = 300):
+        super().__init__()
+        if mode not in ("silence", "hold"):
+            raise ValueError(f"Unknown VAD mode: {mode}")
+        self.source = source
+        self.vad = vad or EnergyVad()
+        self.mode = mode
+        self.preroll_ms = preroll_ms
+
+        self._preroll = collections.deque()
+        self._preroll_samples = 0
+        self._pending = collections.deque()
+        self._open = False
+        self._out_pts = 0
+        self._lead = 0  # samples sent ahead of the source by pre-roll bursts
+        self._held = 0  # samples not sent while holding
+        self.speaking = False
+
+        self.speech_frames = 0
+        self.silence_frames = 0
+        self.onsets = 0
+
+    def stats(self) -> dict:
+        """Speech/silence counts for estimating the upstream savings"""
+        total = self.speech_frames + self.silence_frames
+        return {
+            "mode": self.mode,
+            "speech_frames": self.speech_frames,
+            "silence_frames": self.silence_frames,
+            "speech_ratio": self.speech_frames / total if total else 0.0,
+            "onsets": self.onsets,
+        }
+
+    def _emit(self, frame, speech: bool = True):
+        self.speaking = speech
+        frame.pts = self._out_pts
+        self._out_pts += frame.samples
+        return frame
+
+    def _silence(self, like):
+        zeros = np.zeros((1, like.samples), dtype=np.int16)
+        frame = av.AudioFrame.from_ndarray(zeros, format="s16", layout="mono")
+        frame.sample_rate = like.sample_rate
+        frame.time_base = Fraction(1, like.sample_rate)
+        return self._emit(frame, speech=False)
+
+    def _keep_preroll(self, frame):
+        self._preroll.append(frame)
+        self._preroll_samples += frame.samples
+        limit = frame.sample_rate * self.preroll_ms // 1000
+        while self._preroll and self._preroll_samples - self._preroll[0].samples >= limit:
+            self._preroll_samples -= self._preroll.popleft().samples
+
+    async def recv(self):
+        if self._pending:
+            return self._emit(self._pending.popleft())
+
+        while True:
+            frame = await self.source.recv()
+            samples = frame.to_ndarray().reshape(-1)
+
+            if self.vad.update(samples):
+                self.speech_frames += 1
+                if self._open:
+                    return self._emit(frame)
+
+                # Speech onset: flush the pre-roll ahead of this frame
+                self._open = True
+                self.onsets += 1
+                if self.mode == "hold":
+                    # Keep RTP time continuous across the held gap
+                    self._out_pts += max(self._held - self._preroll_samples, 0)
+                    self._held = 0
+                else:
+                    self._lead += self._preroll_samples
+                self._pending.extend(self._preroll)
+                self._pending.append(frame)
+                self._preroll.clear()
+                self._preroll_samples = 0
+                return self._emit(self._pending.popleft())
+
+            self.silence_frames += 1
+            self._open = False
+            self._keep_preroll(frame)
+
+            total = self.speech_frames + self.silence_frames
+            if total % 500 == 0:
+                print(f"🗣️  VAD: {100 * self.speech_frames / total:.1f}% speech over {total} frames, "
+                      f"{self.onsets} onsets")
+
+            if self.mode == "hold":
+                self._held += frame.samples
+                continue
+            if self._lead > 0:
+                # Swallow silence until the pre-roll burst is paid back
+                self._lead -= frame.samples
+                continue
+            return self._silence(frame)
+
+    def stop(self):
+        super().stop()
+        self.source.stop()